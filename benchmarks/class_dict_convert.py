@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark `ClassDict.convert` against the converting of previous versions, which walked and copied the whole tree on each call.
+
+Lazy converting defers the cost to the first access of each value, so each conversion is measured with the payload accessed afterward
+not at all, partially (one path from the root down to a leaf), and fully (every value), to show what is actually saved.
+
+Run from the repository root: `python -m benchmarks.class_dict_convert`
+"""
+
+import time
+import random
+import argparse
+
+from typing import Any, Callable, Sequence, Mapping
+
+from concopilot.util import ClassDict
+
+
+def legacy_convert(obj: Any) -> Any:
+    """
+    `ClassDict.convert` of previous versions.
+    """
+    if isinstance(obj, Mapping):
+        _obj=obj if isinstance(obj, ClassDict) else ClassDict()
+        items=[x for x in obj.items()] if isinstance(obj, ClassDict) else obj.items()
+        for k, v in items:
+            _obj[k]=legacy_convert(v)
+        return _obj
+    elif isinstance(obj, Sequence) and not isinstance(obj, str) and not isinstance(obj, bytes):
+        return [legacy_convert(x) for x in obj]
+    elif isinstance(obj, set):
+        return {legacy_convert(x) for x in obj}
+    else:
+        return obj
+
+
+def deep_config(depth: int, width: int) -> dict:
+    if depth==0:
+        return {'name': 'leaf', 'value': 1.0, 'tags': ['a', 'b', 'c']}
+    config={f'node{i}': deep_config(depth-1, width) for i in range(width)}
+    config['items']=[deep_config(depth-1, 1) for _ in range(2)]
+    return config
+
+
+def plugin_response(size_mb: float) -> dict:
+    """
+    :return: a plugin response of about `size_mb` MB as JSON, e.g. search results with embeddings.
+    """
+    rng=random.Random(0)
+    count=max(1, int(size_mb*1024*1024/2600))
+    return {
+        'status': 'ok',
+        'results': [{
+            'id': i,
+            'title': f'result {i}',
+            'meta': {'source': 'web', 'score': rng.random()},
+            'embedding': [rng.random() for _ in range(128)]
+        } for i in range(count)]
+    }
+
+
+def no_access(obj: Any):
+    pass
+
+
+def partial_access(obj: Any):
+    """
+    Read one path from the root down to a leaf, following the first key or item at each level.
+    """
+    while True:
+        if isinstance(obj, Mapping):
+            if not obj:
+                return
+            obj=obj[next(iter(obj))]
+        elif isinstance(obj, list):
+            if not obj:
+                return
+            obj=obj[0]
+        else:
+            return
+
+
+def full_access(obj: Any):
+    """
+    Read every value, through `__getitem__` as components do.
+    """
+    if isinstance(obj, Mapping):
+        for k in obj:
+            full_access(obj[k])
+    elif isinstance(obj, list):
+        for x in obj:
+            full_access(x)
+
+
+accesses=[('none', no_access), ('partial', partial_access), ('full', full_access)]
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> float:
+    best=float('inf')
+    for _ in range(repeat):
+        start=time.perf_counter()
+        fn()
+        best=min(best, time.perf_counter()-start)
+    return best
+
+
+def run_case(name: str, make: Callable[[], Any], repeat: int, times: int):
+    """
+    Convert a fresh payload `times` times in a row, as a payload is converted by each constructor it passes through in a turn,
+    then access it.
+    """
+    def chain(convert, access):
+        def fn():
+            obj=make()
+            for _ in range(times):
+                obj=convert(obj)
+            access(obj)
+            return obj
+        return fn
+
+    build=measure(make, repeat)
+    converts=[
+        ('legacy', legacy_convert),
+        ('eager', ClassDict.convert),
+        ('lazy', lambda obj: ClassDict.convert(obj, lazy=True))
+    ]
+    print(f'{name} (converted {times} times, best of {repeat}), by access afterward:')
+    print(f'  {"":>6}'+''.join(f'{label:>10}' for label, _ in accesses))
+    for label, convert in converts:
+        seconds=[max(measure(chain(convert, access), repeat)-build, 0.0) for _, access in accesses]
+        print(f'  {label:>6}'+''.join(f'{x:>9.4f}s' for x in seconds))
+
+
+if __name__=='__main__':
+    parser=argparse.ArgumentParser(description='Benchmark ClassDict.convert.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--times', type=int, default=3)
+    parser.add_argument('--response-mb', type=float, default=10.0)
+    parser.add_argument('--depth', type=int, default=6)
+    args=parser.parse_args()
+    run_case(f'deep config (depth {args.depth}, width 4)', lambda: deep_config(args.depth, 4), args.repeat, args.times)
+    run_case(f'plugin response ({args.response_mb} MB)', lambda: plugin_response(args.response_mb), args.repeat, args.times)
@@ -1,10 +1,21 @@
 # -*- coding: utf-8 -*-
 
-from .package.config import Settings
-from .package.conpack import execute as conpack
-
-
 __all__=[
     'Settings',
     'conpack',
 ]
+
+
+def __getattr__(name):
+    # imported on first use, so that `import concopilot` does not pull in the `conpack` dependencies
+    if name=='Settings':
+        from .package.config import Settings
+        return Settings
+    elif name=='conpack':
+        from .package.conpack import execute as conpack
+        return conpack
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals().keys())+__all__)
@@ -1,13 +1,13 @@
 # -*- coding: utf-8 -*-
 
-import json
+import sys
 
 from typing import Dict, Optional
 
 from ....framework.interface import AgentDrivenSimplexUserInterface
 from ....framework.message import Message
 from ....package.config import Settings
-from ....util.jsons import JsonEncoder
+from ....util import jsons
 
 
 settings=Settings()
@@ -31,7 +31,8 @@ class CmdUserInterface(AgentDrivenSimplexUserInterface):
             if isinstance(msg.content, str):
                 print(msg.content)
             else:
-                print(json.dumps(msg, cls=JsonEncoder, ensure_ascii=False, indent=4))
+                jsons.dump(msg, sys.stdout, ensure_ascii=False, indent=4)
+                print('')
         else:
             print('')
         print(self.non_user_msg_suffix)
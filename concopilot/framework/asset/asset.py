@@ -42,7 +42,7 @@ class Asset(ClassDict):
             if not isinstance(v, Mapping):
                 raise ValueError(f'assets contains non-mapping objects!')
             if not isinstance(v, Asset):
-                update[k]=Asset(**ClassDict.convert(v))
+                update[k]=Asset(**ClassDict.convert(v, lazy=True))
         assets.update(update)
         return assets
 
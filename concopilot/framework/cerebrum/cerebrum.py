@@ -50,7 +50,7 @@ class InteractResponse(ClassDict):
             super(InteractResponse.PluginCall, self).__init__(**kwargs)
             self.plugin_name: str = plugin_name
             self.command: str = command
-            self.param: Any = ClassDict.convert(param) if isinstance(param, Mapping) else param
+            self.param: Any = ClassDict.convert(param, lazy=True) if isinstance(param, Mapping) else param
             self.id: Union[uuid.UUID, str, int] = id
 
     def __init__(
@@ -65,7 +65,7 @@ class InteractResponse(ClassDict):
     ):
         super(InteractResponse, self).__init__(**kwargs)
         self.content: str = content
-        self.plugin_calls: List[InteractResponse.PluginCall] = [InteractResponse.PluginCall(**ClassDict.convert(call)) for call in plugin_calls] if plugin_calls else None
+        self.plugin_calls: List[InteractResponse.PluginCall] = [InteractResponse.PluginCall(**ClassDict.convert(call, lazy=True)) for call in plugin_calls] if plugin_calls else None
 
         self.input_token_len: int = input_token_len
         self.output_token_len: int = output_token_len
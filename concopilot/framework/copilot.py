@@ -15,6 +15,7 @@ from .interactor import Interactor
 from .resource import Resource
 from .context import Context
 from ..util.initializer import component
+from ..package import profiler
 from ..util import ClassDict
 
 
@@ -165,21 +166,27 @@ class BasicCopilot(Copilot):
         return self._copilot_context
 
     def initialize_copilot(self):
+        name=f'{self.group_id}/{self.artifact_id}/{self.version}'
         if self.resource_manager:
-            self.resource_manager.initialize()
+            with profiler.span('resource_manager.initialize', name):
+                self.resource_manager.initialize()
             if self.config.config.inherit_resources and self._outer_resources is not None:
                 for resource in self._outer_resources:
                     self.resource_manager.add_resource(resource)
             elif self.config.config.inherit_self_resources:
                 for resource in self.resources:
                     self.resource_manager.add_resource(resource)
-            self.config_copilot_resources()
+            with profiler.span('config_copilot_resources', name):
+                self.config_copilot_resources()
         self.config_copilot_context()
         if self.plugin_manager:
-            self.plugin_manager.initialize()
+            with profiler.span('plugin_manager.initialize', name):
+                self.plugin_manager.initialize()
         if self.interactor:
-            self.interactor.setup_prompts()
-            self.interactor.setup_plugins()
+            with profiler.span('interactor.setup_prompts', name):
+                self.interactor.setup_prompts()
+            with profiler.span('interactor.setup_plugins', name):
+                self.interactor.setup_plugins()
 
     def finalize_copilot(self):
         if self.plugin_manager:
@@ -210,7 +217,9 @@ class BasicCopilot(Copilot):
         super(BasicCopilot, self).finalize()
 
     def run(self):
-        self.initialize_copilot()
+        with profiler.span('initialize_copilot', f'{self.group_id}/{self.artifact_id}/{self.version}'):
+            self.initialize_copilot()
+        profiler.ready(self)
         self.run_interaction()
         self.finalize_copilot()
 
@@ -35,9 +35,9 @@ class Message(ClassDict):
             if command is not None:
                 self.command: str = command
             if param is not None:
-                self.param: Any = ClassDict.convert(param) if isinstance(param, Mapping) else param
+                self.param: Any = ClassDict.convert(param, lazy=True) if isinstance(param, Mapping) else param
             if response is not None:
-                self.response: Any = ClassDict.convert(response) if isinstance(response, Mapping) else param
+                self.response: Any = ClassDict.convert(response, lazy=True) if isinstance(response, Mapping) else response
             if id is not None:
                 self.id: Union[uuid.UUID, str, int] = id
 
@@ -74,14 +74,14 @@ class Message(ClassDict):
 
         super(Message, self).__init__(**kwargs)
         if sender is not None:
-            self.sender: Union[Identity, str] = sender if isinstance(sender, Identity) else (Identity(role=sender) if isinstance(sender, str) else Identity(**ClassDict.convert(sender)))
+            self.sender: Union[Identity, str] = sender if isinstance(sender, Identity) else (Identity(role=sender) if isinstance(sender, str) else Identity(**ClassDict.convert(sender, lazy=True)))
         if receiver is not None:
-            self.receiver: Union[Identity, str] = receiver if isinstance(receiver, Identity) else (Identity(role=receiver) if isinstance(receiver, str) else Identity(**ClassDict.convert(receiver)))
+            self.receiver: Union[Identity, str] = receiver if isinstance(receiver, Identity) else (Identity(role=receiver) if isinstance(receiver, str) else Identity(**ClassDict.convert(receiver, lazy=True)))
         if content_type is not None:
             self.content_type: str = content_type
         if content is not None:
             if isinstance(content, Mapping):
-                content=ClassDict.convert(content)
+                content=ClassDict.convert(content, lazy=True)
                 if content.command:
                     content=Message.Command(**content)
             self.content: Any = content
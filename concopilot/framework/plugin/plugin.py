@@ -12,7 +12,7 @@ if TYPE_CHECKING:
 
 from ..message import Message
 from ...framework.identity import Identity
-from ...util import ClassDict
+from ...util import ClassDict, FrozenClassDict
 from ...package.config import Settings
 
 
@@ -291,6 +291,7 @@ class AbstractPlugin(Plugin, metaclass=abc.ABCMeta):
     def __init__(self, config: Dict):
         super(AbstractPlugin, self).__init__(config)
         self._config=ClassDict.convert(config)
+        self._frozen_config: FrozenClassDict = None
         self._group_id=str(self.config.group_id).lower()
         self._artifact_id=str(self.config.artifact_id).lower()
         self._version=str(self.config.version).lower()
@@ -381,6 +382,23 @@ class AbstractPlugin(Plugin, metaclass=abc.ABCMeta):
     def config(self) -> ClassDict:
         return self._config
 
+    @property
+    def frozen_config(self) -> FrozenClassDict:
+        """
+        An immutable and hashable snapshot of the current plugin `config`, to be used as a cache key.
+        Identical config fragments are shared across all plugins, so that it can be hashed in O(1) once hashed.
+
+        The snapshot is kept, and taken again only if the config has been modified since.
+        Checking it walks the whole config on each access, without creating any object, by `FrozenClassDict.matches`.
+
+        :return: the frozen plugin config.
+        """
+        frozen=self._frozen_config
+        if frozen is None or not FrozenClassDict.matches(frozen, self.config):
+            frozen=FrozenClassDict.freeze(self.config)
+            self._frozen_config=frozen
+        return frozen
+
     @property
     def group_id(self) -> str:
         return self._group_id
@@ -36,7 +36,7 @@ class LLM(Model):
         def __init__(self, content: str = None, calls: List[ClassDict] = None, input_token_len: int = None, output_token_len: int = None, cost: float = None, **kwargs):
             super(LLM.LLMResponse, self).__init__(**kwargs)
             self.content: str = content
-            self.calls: List[ClassDict] = [ClassDict.convert(call) for call in calls] if calls else None
+            self.calls: List[ClassDict] = [ClassDict.convert(call, lazy=True) for call in calls] if calls else None
 
             self.input_token_len: int = input_token_len
             self.output_token_len: int = output_token_len
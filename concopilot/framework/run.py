@@ -1,15 +1,21 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import requests
+import logging
 
 from typing import Tuple, List
 
 from .plugin import Plugin
 from .copilot import Copilot
-from ..util.initializer import component
+from ..util.initializer import component, requirement
+from ..util.config.tool import config_load_stats, read_config_file
 from ..util import ClassDict
 from ..package.config import Settings
+from ..package import transfer
+from ..package import profiler
+
+
+logger=logging.getLogger('[ConCopilot]')
 
 
 settings=Settings()
@@ -27,14 +33,26 @@ def get_args(args=None) -> Tuple[ClassDict, List[str]]:
 
 
 def build(param: ClassDict, *args, **kwargs) -> Plugin:
+    with profiler.span('build'):
+        return _build(param, *args, **kwargs)
+
+
+def _build(param: ClassDict, *args, **kwargs) -> Plugin:
     if param.group_id and param.artifact_id and param.version:
-        with requests.Session() as s:
+        with transfer.new_session(max(settings.prefetch_workers, 1)*max(settings.download_workers, 1)) as s:
             settings.network_session=s
+            with profiler.span('prefetch'):
+                configs=component.prefetch_components([param])
+            requirement.setup_components(configs)
             plugin: Plugin = component.create_component(param, *args, **kwargs)
             settings.network_session=None
     elif param.config_file:
-        with requests.Session() as s:
+        with transfer.new_session(max(settings.prefetch_workers, 1)*max(settings.download_workers, 1)) as s:
             settings.network_session=s
+            config=read_config_file(param.config_file, cache_folder=component.get_config_cache_folder())
+            with profiler.span('prefetch'):
+                configs=component.prefetch_components(component.iter_component_references(config.config))
+            requirement.setup_components([config]+configs)
             plugin: Plugin = component.create(config_file_path=param.config_file, *args, **kwargs)
             settings.network_session=None
     else:
@@ -43,13 +61,43 @@ def build(param: ClassDict, *args, **kwargs) -> Plugin:
                          '          --group-id=<group_id> --artifact-id=<artifact_id> --version=<version> *argv\n'
                          '      or\n'
                          '          --config-file=<config_file> *argv')
+    if settings.profile_config:
+        logger.info(f'Config loading: {config_load_stats}')
     return plugin
 
 
+def collect_component_configs(param: ClassDict) -> List[ClassDict]:
+    """
+    Retrieve the configs of the whole component tree of a copilot, without setting up or constructing any component.
+
+    :return: the component configs, the root one first.
+    """
+    with transfer.new_session(max(settings.prefetch_workers, 1)*max(settings.download_workers, 1)) as s:
+        settings.network_session=s
+        try:
+            if param.group_id and param.artifact_id and param.version:
+                return component.prefetch_components([param], max_workers=max(settings.prefetch_workers, 1))
+            elif param.config_file:
+                config=read_config_file(param.config_file, cache_folder=component.get_config_cache_folder())
+                return [config]+component.prefetch_components(component.iter_component_references(config.config), max_workers=max(settings.prefetch_workers, 1))
+            else:
+                raise ValueError('Either a ("group-id", "artifact-id", "version") combination or a config file path should be provided.')
+        finally:
+            settings.network_session=None
+
+
 def run(param: ClassDict, *args, **kwargs):
     plugin: Plugin = build(param, *args, **kwargs)
     if isinstance(plugin, Copilot):
-        plugin.run()
+        if settings.startup_profiler is not None:
+            # reported by `profiler.ready` when the interaction begins, or when a copilot not calling it has finished
+            settings.startup_profiler.root_plugin=plugin
+            try:
+                plugin.run()
+            finally:
+                settings.startup_profiler.finish()
+        else:
+            plugin.run()
     else:
         raise ValueError('The specific component is not a Copilot object, and cannot be run.')
 
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import logging
+import concurrent.futures
+
+from typing import Callable, Dict, List, Set, Tuple, Iterable, Optional
+
+from .error import PackageException
+from ..util.config import versions
+from ..util.config.tool import read_config_file
+
+
+logger=logging.getLogger('[ConCopilot]')
+
+
+class ComponentTask:
+    """
+    A component source folder to be built and installed, with the other source folders it depends on.
+    """
+
+    def __init__(self, src_config_folder: str, src_config_file: str, group_id: str, artifact_id: str, version: str, references: List[Tuple[str, str, str]]):
+        self.src_config_folder: str = src_config_folder
+        self.src_config_file: str = src_config_file
+        self.group_id: str = group_id
+        self.artifact_id: str = artifact_id
+        self.version: str = version
+        # the (group_id, artifact_id, version) of all components referenced by this one
+        self.references: List[Tuple[str, str, str]] = references
+        self.dependencies: Set['ComponentTask'] = set()
+        # seconds of each step, e.g. "build", "install", and "deploy"
+        self.timings: Dict[str, float] = {}
+
+    @property
+    def name(self) -> str:
+        return f'{self.group_id}/{self.artifact_id}/{self.version}'
+
+    def depends_on(self, other: 'ComponentTask') -> bool:
+        for group_id, artifact_id, version in self.references:
+            if group_id==other.group_id and artifact_id==other.artifact_id:
+                if version==other.version or (versions.is_version_specifier(version) and versions.version_specifier(version).contains(other.version)):
+                    return True
+        return False
+
+
+def plan(configs: Iterable[Tuple[str, str]]) -> List[ComponentTask]:
+    """
+    Find the dependencies between the component source folders, by the component references in their configs.
+
+    :param configs: the (src_config_folder, src_config_file) pairs, as `conpack.get_valid_configs` yields.
+    :return: the tasks in a dependency order.
+    """
+    from ..util.initializer.component import iter_component_references
+
+    tasks=[]
+    for src_config_folder, src_config_file in configs:
+        config=read_config_file(src_config_file)
+        references=[(str(ref.group_id), str(ref.artifact_id), str(ref.version)) for ref in iter_component_references(config.config)]
+        tasks.append(ComponentTask(src_config_folder, src_config_file, config.group_id, config.artifact_id, str(config.version), references))
+    for task in tasks:
+        task.dependencies={other for other in tasks if other is not task and task.depends_on(other)}
+
+    ordered=[]
+    visiting=set()
+    visited=set()
+
+    def visit(task: ComponentTask, path: List[ComponentTask]):
+        if task in visited:
+            return
+        if task in visiting:
+            raise PackageException('Circular dependency found: '+' -> '.join(t.name for t in path[path.index(task):]+[task]))
+        visiting.add(task)
+        for dependency in task.dependencies:
+            visit(dependency, path+[task])
+        visiting.discard(task)
+        visited.add(task)
+        ordered.append(task)
+
+    for task in tasks:
+        visit(task, [])
+    return ordered
+
+
+def build_and_install(settings_kwargs: Dict, sys_path: List[str], src_config_folder: str, src_config_file: str, argv: List[str]) -> Dict[str, float]:
+    """
+    Build and install a component source folder in a worker process.
+
+    :return: the seconds of each step.
+    """
+    from . import config
+    from .conpack import install
+    from ..framework import run
+    from ..util import ClassDict
+
+    for path in sys_path:
+        if path not in sys.path:
+            sys.path.append(path)
+    settings=config.load_settings(**settings_kwargs)
+
+    timings={}
+    if not settings.skip_setup:
+        start=time.perf_counter()
+        run.build(ClassDict(config_file=src_config_file), argv)
+        timings['build']=time.perf_counter()-start
+    start=time.perf_counter()
+    install(src_config_folder, src_config_file)
+    timings['install']=time.perf_counter()-start
+    return timings
+
+
+def run_tasks(tasks: List[ComponentTask], jobs: int, settings_kwargs: Dict, argv: List[str], on_installed: Callable[[ComponentTask], None] = None):
+    """
+    Build and install the component source folders in a pool of `jobs` processes, each one after all its dependencies.
+
+    :param tasks: the tasks, as `plan` returns.
+    :param settings_kwargs: the arguments of `config.load_settings` for the worker processes.
+    :param on_installed: called in this process after each component is installed, in a dependency order, e.g. to deploy it.
+    """
+    remaining=list(tasks)
+    installed: Set[ComponentTask] = set()
+    # tasks installed but waiting for their dependencies to be passed to `on_installed`
+    finished: List[ComponentTask] = []
+    reported: Set[ComponentTask] = set()
+    error: Optional[BaseException] = None
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures: Dict[concurrent.futures.Future, ComponentTask] = {}
+
+        def submit_ready():
+            for task in [task for task in remaining if task.dependencies<=installed]:
+                remaining.remove(task)
+                futures[executor.submit(build_and_install, settings_kwargs, list(sys.path), task.src_config_folder, task.src_config_file, argv)]=task
+                logger.info(f'---------------- building and installing {task.src_config_folder} ----------------')
+
+        submit_ready()
+        while futures:
+            done, _=concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                task=futures.pop(future)
+                try:
+                    task.timings.update(future.result())
+                except Exception as e:
+                    logger.error(f'Failed to build and install {task.src_config_folder}: {e}')
+                    error=error if error is not None else e
+                    continue
+                logger.info(f'{task.src_config_folder} successfully installed into local repository.\n')
+                installed.add(task)
+                finished.append(task)
+            while on_installed is not None and (ready:=[task for task in finished if task.dependencies<=reported]):
+                for task in ready:
+                    finished.remove(task)
+                    start=time.perf_counter()
+                    try:
+                        on_installed(task)
+                    except Exception as e:
+                        # the tasks depending on it are left unreported, while the running ones are still collected
+                        logger.error(f'Failed to deploy {task.src_config_folder}: {e}')
+                        error=error if error is not None else e
+                        continue
+                    task.timings['deploy']=time.perf_counter()-start
+                    reported.add(task)
+            if error is None:
+                submit_ready()
+
+    if error is not None:
+        if on_installed is not None and len(installed)==len(tasks):
+            raise PackageException(f'{len(tasks)-len(reported)} of {len(tasks)} components are not deployed.') from error
+        raise PackageException(f'{len(tasks)-len(installed)} of {len(tasks)} components are not installed.') from error
+
+
+def report(tasks: List[ComponentTask], seconds: float) -> str:
+    steps=[step for step in ('build', 'install', 'deploy') if any(step in task.timings for task in tasks)]
+    width=max([len(task.name) for task in tasks]+[len('component')])
+    lines=['component'.ljust(width)+''.join(f'{step:>10}' for step in steps)]
+    for task in sorted(tasks, key=lambda task: -sum(task.timings.values())):
+        lines.append(task.name.ljust(width)+''.join(f'{task.timings[step]:>9.2f}s' if step in task.timings else f'{"-":>10}' for step in steps))
+    lines.append(f'{len(tasks)} components in {seconds:.2f}s')
+    return '\n'.join(lines)
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import mmap
+import shutil
+import hashlib
+import logging
+import zipfile
+import tempfile
+import py_compile
+import importlib.util
+import importlib.machinery
+
+from typing import Dict, List, Tuple, Iterator, Optional
+
+from .config import Settings, default_config_folder, component_meta_files
+from .error import PackageException
+from .lock import ComponentLock
+from ..util import ClassDict, jsons
+
+
+logger=logging.getLogger('[ConCopilot]')
+
+
+settings=Settings()
+
+
+default_bundle_file='copilot.conpack'
+bundle_index_file='__BUNDLE.json'
+bundle_format_version=2
+
+# folders of the archive
+components_folder='components'
+root_folder='root'
+python_folder='python'
+wheelhouse_folder='wheelhouse'
+
+# the framework itself is required to open a bundle, so it is never bundled
+framework_package=__name__.split('.')[0]
+
+
+def get_bundle_path(bundle_path: str = None) -> str:
+    return bundle_path if bundle_path else os.path.join(settings.working_directory, default_bundle_file)
+
+
+def _iter_files(folder: str, recursive: bool = True) -> Iterator[Tuple[str, str]]:
+    """
+    :return: the (file path, path relative to `folder` in POSIX format) of the files in `folder`, without the component meta files and bytecode caches.
+    """
+    for root, dir_names, file_names in os.walk(folder):
+        dir_names[:]=sorted(name for name in dir_names if recursive and name!='__pycache__')
+        for name in sorted(file_names):
+            if name in component_meta_files or name.endswith(('.pyc', '.tmp', '.part', '.validator')):
+                continue
+            file_path=os.path.join(root, name)
+            yield file_path, os.path.relpath(file_path, folder).replace(os.sep, '/')
+
+
+def _compile(file_path: str, name: str) -> Optional[bytes]:
+    """
+    :return: the bytecode of a Python source file, as an unchecked hash-based pyc so that zipimport never compares it with the source, or None if it does not compile.
+    """
+    with tempfile.TemporaryDirectory() as tmp_folder:
+        cfile=os.path.join(tmp_folder, 'module.pyc')
+        try:
+            py_compile.compile(file_path, cfile=cfile, dfile=name, doraise=True, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+        except py_compile.PyCompileError as e:
+            logger.warning(f'Cannot compile "{file_path}", bundled as source only: {e.msg}')
+            return None
+        with open(cfile, 'rb') as file:
+            return file.read()
+
+
+def find_package_folder(package: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Find the files of the top-level Python package of `package` (e.g. "pkg" of "pkg.sub.module").
+
+    :return: (folder, None) for a regular package, (None, file path) for a single module, or (None, None) if it cannot be bundled.
+    """
+    top_level=package.split('.')[0]
+    spec=importlib.util.find_spec(top_level)
+    if spec is None or spec.origin is None or spec.origin in ('built-in', 'frozen'):
+        logger.warning(f'Python package `{top_level}` is not found or is a namespace package, not bundled.')
+        return None, None
+    if spec.submodule_search_locations:
+        folder=os.path.dirname(spec.origin)
+        for file_path, _ in _iter_files(folder):
+            if file_path.endswith(tuple(importlib.machinery.EXTENSION_SUFFIXES)):
+                logger.warning(f'Python package `{top_level}` has extension modules that cannot be imported from an archive, not bundled.')
+                return None, None
+        return folder, None
+    if spec.origin.endswith('.py'):
+        return None, spec.origin
+    logger.warning(f'Python module `{top_level}` is not a source file, not bundled.')
+    return None, None
+
+
+class BundleWriter:
+    def __init__(self, archive: zipfile.ZipFile):
+        self.archive: zipfile.ZipFile = archive
+        self.digest=hashlib.sha256()
+        self.count: int = 0
+
+    def write(self, file_path: str, name: str):
+        with open(file_path, 'rb') as file:
+            self.write_bytes(file.read(), name, compress=True)
+
+    def write_bytes(self, data: bytes, name: str, compress: bool):
+        # bytecode is stored uncompressed, to be read by zipimport straight from the mapped pages
+        self.archive.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED)
+        self.digest.update(name.encode('utf8')+b'\0'+hashlib.sha256(data).digest())
+        self.count+=1
+
+    def write_python(self, file_path: str, name: str):
+        self.write(file_path, name)
+        if name.endswith('.py'):
+            bytecode=_compile(file_path, name)
+            if bytecode is not None:
+                self.write_bytes(bytecode, name+'c', compress=False)
+
+
+def create(param: ClassDict, lock: ComponentLock, bundle_path: str) -> str:
+    """
+    Pack a copilot built with `lock` recording into a single archive:
+    the config folder of every locked component, the root config, the Python packages of the components with their bytecode,
+    and a wheelhouse of the `setup.pip` requirements of the components, to be installed from without any index where the bundle runs.
+
+    :param param: the `run.get_args` parameters the copilot was built with.
+    :param lock: the component lock recorded while building.
+    :param bundle_path: the archive path.
+    :return: the archive path.
+    """
+    from ..util.config.tool import read_config_file
+    from ..util.initializer import requirement
+
+    index=ClassDict(version=bundle_format_version, cache_tag=sys.implementation.cache_tag, root=None, nodes=[], packages=[], wheels=[])
+    packages: Dict[str, None] = {}
+    component_configs: List[ClassDict] = []
+    tmp_bundle_path=f'{bundle_path}.{os.getpid()}.tmp'
+    os.makedirs(os.path.dirname(os.path.abspath(bundle_path)), exist_ok=True)
+    try:
+        with zipfile.ZipFile(tmp_bundle_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            writer=BundleWriter(archive)
+
+            if param.group_id and param.artifact_id and param.version:
+                index.root=ClassDict(group_id=param.group_id, artifact_id=param.artifact_id, version=param.version)
+            else:
+                config_folder, config_file=os.path.split(os.path.abspath(param.config_file))
+                # a ".config" folder is bundled as a whole, otherwise the config file alone
+                if os.path.basename(config_folder)==default_config_folder:
+                    for file_path, name in _iter_files(config_folder):
+                        writer.write(file_path, f'{root_folder}/{name}')
+                else:
+                    writer.write(os.path.join(config_folder, config_file), f'{root_folder}/{config_file}')
+                index.root=ClassDict(config_file=config_file)
+                root_config=read_config_file(param.config_file)
+                component_configs.append(root_config)
+                if root_config.setup and root_config.setup.package:
+                    packages[root_config.setup.package]=None
+
+            folders: Dict[str, str] = {}
+            for node in lock.nodes.values():
+                if node.config_folder not in folders:
+                    folders[node.config_folder]=f'{components_folder}/{len(folders)}'
+                    for file_path, name in _iter_files(node.config_folder):
+                        writer.write(file_path, f'{folders[node.config_folder]}/{name}')
+                component_configs.append(read_config_file(os.path.join(node.config_folder, node.config_file)))
+                node=ClassDict(**node)
+                node.config_folder=folders[node.config_folder]
+                index.nodes.append(node)
+                if node.package:
+                    packages[node.package]=None
+
+            top_levels=list(dict.fromkeys(package.split('.')[0] for package in packages))
+            for top_level in top_levels:
+                if top_level==framework_package:
+                    continue
+                folder, module_path=find_package_folder(top_level)
+                if folder is not None:
+                    for file_path, name in _iter_files(folder):
+                        writer.write_python(file_path, f'{python_folder}/{top_level}/{name}')
+                elif module_path is not None:
+                    writer.write_python(module_path, f'{python_folder}/{top_level}.py')
+                else:
+                    continue
+                index.packages.append(top_level)
+
+            # third-party requirements are not importable from the archive, their wheels are installed from where the bundle runs
+            if any(requirement.get_pip_entries(component_config) for component_config in component_configs):
+                with tempfile.TemporaryDirectory() as wheelhouse:
+                    requirement.build_wheelhouse(component_configs, wheelhouse)
+                    for file_path, name in _iter_files(wheelhouse, recursive=False):
+                        with open(file_path, 'rb') as file:
+                            # wheels are compressed already
+                            writer.write_bytes(file.read(), f'{wheelhouse_folder}/{name}', compress=name.endswith('.txt'))
+                        index.wheels.append(name)
+
+            index.digest=writer.digest.hexdigest()
+            archive.writestr(bundle_index_file, jsons.dumps(index, indent=2))
+    except BaseException:
+        if os.path.exists(tmp_bundle_path):
+            os.remove(tmp_bundle_path)
+        raise
+    os.replace(tmp_bundle_path, bundle_path)
+    logger.info(f'{len(index.nodes)} components, {len(index.packages)} Python packages, {len(index.wheels)} wheelhouse files, and {writer.count} files bundled into "{bundle_path}".')
+    return bundle_path
+
+
+class _MappedFile:
+    """
+    A read-only file object over a memory map, which has no `seekable` before Python 3.13 as `zipfile` requires.
+    """
+
+    def __init__(self, mapped: mmap.mmap):
+        self.mapped: mmap.mmap = mapped
+
+    def read(self, size: int = -1) -> bytes:
+        return self.mapped.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self.mapped.seek(offset, whence)
+        return self.mapped.tell()
+
+    def tell(self) -> int:
+        return self.mapped.tell()
+
+    def seekable(self) -> bool:
+        return True
+
+
+class Bundle:
+    """
+    A bundle archive opened through a memory map, so that its index and files are read without copying the whole archive.
+    """
+
+    def __init__(self, bundle_path: str):
+        self.bundle_path: str = os.path.abspath(bundle_path)
+        if not os.path.isfile(self.bundle_path):
+            raise PackageException(f'Bundle "{bundle_path}" not found. Please create it by `conpack bundle` first.')
+        with open(self.bundle_path, 'rb') as file:
+            self._mmap=mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.archive=zipfile.ZipFile(_MappedFile(self._mmap))
+            self.index=ClassDict.convert(jsons.loads(self.archive.read(bundle_index_file)))
+        except (zipfile.BadZipFile, KeyError, ValueError) as e:
+            self.close()
+            raise PackageException(f'"{bundle_path}" is not a valid bundle: {e}')
+        if self.index.version!=bundle_format_version:
+            self.close()
+            raise PackageException(f'Unsupported bundle version: {self.index.version}. Please run `conpack bundle` again.')
+        if self.index.cache_tag!=sys.implementation.cache_tag:
+            logger.warning(f'Bundle "{bundle_path}" was compiled for `{self.index.cache_tag}`, modules will be compiled from source on import.')
+
+    def close(self):
+        if getattr(self, 'archive', None) is not None:
+            self.archive.close()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def extract(self, folder: str) -> str:
+        """
+        Extract the config folders and the wheelhouse of the bundle into `<folder>/<digest>`, where the components read their config and prompt files,
+        unless a previous run has extracted them already.
+        The files are extracted into a staging folder renamed into place, so that a partial extraction is never used.
+
+        :return: the extracted folder.
+        """
+        target=os.path.join(folder, self.index.digest)
+        if os.path.isdir(target):
+            return target
+        os.makedirs(folder, exist_ok=True)
+        staging=tempfile.mkdtemp(prefix=f'.{self.index.digest[:16]}.', dir=folder)
+        try:
+            for info in self.archive.infolist():
+                if info.filename.startswith((f'{components_folder}/', f'{root_folder}/', f'{wheelhouse_folder}/')) and not info.is_dir():
+                    self.archive.extract(info, staging)
+            try:
+                os.rename(staging, target)
+            except OSError:
+                # extracted by another process meanwhile
+                if not os.path.isdir(target):
+                    raise
+        finally:
+            if os.path.isdir(staging):
+                shutil.rmtree(staging, ignore_errors=True)
+        return target
+
+    def get_lock(self, folder: str) -> ComponentLock:
+        nodes=[]
+        for node in self.index.nodes:
+            node=ClassDict(**node)
+            node.config_folder=os.path.join(folder, *node.config_folder.split('/'))
+            nodes.append(node)
+        return ComponentLock(nodes=nodes, locked=True)
+
+    def get_run_param(self, folder: str) -> ClassDict:
+        if self.index.root.config_file:
+            return ClassDict(config_file=os.path.join(folder, root_folder, self.index.root.config_file))
+        return ClassDict(group_id=self.index.root.group_id, artifact_id=self.index.root.artifact_id, version=self.index.root.version)
+
+    @property
+    def python_path(self) -> str:
+        # zipimport imports from a folder inside an archive given as "<archive path>/<folder>"
+        return os.path.join(self.bundle_path, python_folder)
+
+
+def prepare(bundle_path: str) -> ClassDict:
+    """
+    Prepare running the copilot in a bundle:
+    its config folders are extracted once into ".runtime/.bundle", its components are locked to them,
+    and its Python packages are imported straight from the archive by zipimport.
+    The pip requirements of the components are set up from the wheelhouse in the bundle only, without any index,
+    and setting up is skipped if the components have no pip requirements.
+
+    :return: the `run.get_args` parameters to build the copilot with.
+    """
+    with Bundle(bundle_path) as bundle:
+        folder=bundle.extract(os.path.join(settings.working_directory, '.runtime', '.bundle'))
+        settings.component_lock=bundle.get_lock(folder)
+        if bundle.index.packages and bundle.python_path not in sys.path:
+            sys.path.insert(0, bundle.python_path)
+            importlib.invalidate_caches()
+        if bundle.index.wheels:
+            settings.wheelhouse=os.path.join(folder, wheelhouse_folder)
+        else:
+            settings.skip_setup=True
+        return bundle.get_run_param(folder)
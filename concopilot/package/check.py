@@ -2,16 +2,67 @@
 
 import os
 import pathlib
+import shutil
 import hashlib
-import gnupg
+
+from typing import Dict, Iterable
+
+
+chunk_size=1024*1024
+
+
+def new_hashes(algorithms: Iterable[str]) -> Dict[str, 'hashlib._Hash']:
+    return {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+
+
+def hexdigests(hashes: Dict[str, 'hashlib._Hash']) -> Dict[str, str]:
+    return {algorithm: h.hexdigest() for algorithm, h in hashes.items()}
+
+
+def hash_file(input_path, algorithms: Iterable[str] = ('sha256',)) -> Dict[str, str]:
+    """
+    Hash a file chunk by chunk, with all `algorithms` in one read.
+
+    :return: the hex digests keyed by algorithm.
+    """
+    hashes=new_hashes(algorithms)
+    with open(input_path, 'rb') as file:
+        while chunk:=file.read(chunk_size):
+            for h in hashes.values():
+                h.update(chunk)
+    return hexdigests(hashes)
+
+
+def copy_file(src, dst, algorithms: Iterable[str] = ('sha256',)) -> Dict[str, str]:
+    """
+    Copy a file like `shutil.copy2`, and hash it while copying, so that no extra read is needed.
+
+    :return: the hex digests of the file keyed by algorithm.
+    """
+    hashes=new_hashes(algorithms)
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        while chunk:=src_file.read(chunk_size):
+            for h in hashes.values():
+                h.update(chunk)
+            dst_file.write(chunk)
+    shutil.copystat(src, dst)
+    return hexdigests(hashes)
+
+
+def read_digest(digest_path) -> str:
+    """
+    Read a ".md5", ".sha1", ".sha256", or ".sha512" sidecar file, in either the bare or the "<digest>  <file_name>" format.
+    """
+    with open(digest_path, 'r', encoding='utf8') as file:
+        content=file.read().split()
+    return content[0].lower() if content else ''
 
 
 def md5(input_path, output_path=None):
     if not os.path.isfile(input_path):
         raise ValueError('Input is not a file.')
 
-    with open(input_path, 'rb') as file:
-        digest=hashlib.md5(file.read()).hexdigest()
+    digest=hash_file(input_path, ('md5',))['md5']
     if output_path is not None:
         with open(output_path, 'w') as file:
             file.write(digest)
@@ -22,8 +73,7 @@ def sha512(input_path, output_path=None):
     if not os.path.isfile(input_path):
         raise ValueError('Input is not a file.')
 
-    with open(input_path, 'rb') as file:
-        digest=hashlib.sha512(file.read()).hexdigest()
+    digest=hash_file(input_path, ('sha512',))['sha512']
     if output_path is not None:
         with open(output_path, 'w') as file:
             file.write(digest)
@@ -34,5 +84,7 @@ def gpg(passphrase, input_path, output_path=None, gnupghome=None):
     if not os.path.isfile(input_path):
         raise ValueError('Input is not a file.')
 
+    import gnupg
+
     gpg=gnupg.GPG(gnupghome=gnupghome if gnupghome else str(pathlib.Path.home().joinpath('.gnupg')))
     return gpg.sign_file(input_path, passphrase=passphrase, detach=True, output=output_path)
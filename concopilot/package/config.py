@@ -2,13 +2,15 @@
 
 import os
 import pathlib
-import yaml
-import validators
 import urllib.parse
 import datetime
-import requests
 
-from typing import Dict, List, Callable, Optional
+from typing import Dict, List, Callable, Optional, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+    from .lock import ComponentLock
+    from .profiler import StartupProfiler
 
 from ..util.singleton import Singleton
 
@@ -18,6 +20,10 @@ class Env(Singleton):
         self.default_settings_path: str = str(pathlib.Path.home().joinpath('.concopilot/settings.yaml'))
 
         self.default_local_repo_path: str = str(pathlib.Path.home().joinpath('.concopilot/repository'))
+        # the login cookies of uploading, readable by the owner only
+        self.default_auth_session_path: str = str(pathlib.Path.home().joinpath('.concopilot/auth-session.json'))
+        # the lock files shared by all processes of the user, e.g. serializing pip installations into a Python environment
+        self.default_lock_folder: str = str(pathlib.Path.home().joinpath('.concopilot/locks'))
         # default_repo_url/snapshots for snapshot
         # default_repo_url/releases for release
         self.default_repo_base_url: str = 'https://concopilot.org'
@@ -30,26 +36,49 @@ def curr_time() -> str:
 class Settings(Singleton):
     class Repo:
         class RepoPolicy:
-            def __init__(self, enable: bool, update: bool):
+            def __init__(self, enable: bool, update: Union[bool, str]):
                 self.enable: bool = enable
-                self.update: bool = update
-
-        def __init__(self, url: str, snapshot: RepoPolicy = None, release: RepoPolicy = None):
-            if not validators.url(url, simple_host=True):
-                raise ValueError('Invalid url: '+str(url))
+                self.update: Union[bool, str] = update
+
+            def update_interval(self) -> Optional[float]:
+                """
+                `update` can be a bool (`True` for "daily"), "always", "daily", "never", or "interval:<minutes>", as Maven does.
+
+                :return: the seconds between two update checks of a downloaded component, 0 to check every time, or None to never check.
+                """
+                update=self.update
+                if update is True:
+                    update='daily'
+                if not update or update=='never':
+                    return None
+                elif update=='always':
+                    return 0
+                elif update=='daily':
+                    return 24*60*60
+                elif isinstance(update, str) and update.startswith('interval:'):
+                    return float(update[len('interval:'):])*60
+                else:
+                    raise ValueError(f'Unrecognized update policy: {update}')
+
+        def __init__(self, url: str, snapshot: RepoPolicy = None, release: RepoPolicy = None, validate: bool = True):
+            if validate:
+                import validators
+
+                if not validators.url(url, simple_host=True):
+                    raise ValueError('Invalid url: '+str(url))
             self.url: str = url
             self.snapshot: Settings.Repo.RepoPolicy = snapshot if snapshot is not None else Settings.Repo.RepoPolicy(enable=True, update=True)
             self.release: Settings.Repo.RepoPolicy = release if release is not None else Settings.Repo.RepoPolicy(enable=True, update=False)
 
         def _repo_url(self, repo_name: str, group_id: str = None, artifact_id: str = None, version: str = None) -> str:
             if group_id is None and artifact_id is None and version is None:
-                return urllib.parse.urljoin(env.default_repo_base_url, repo_name)
+                return urllib.parse.urljoin(self.url, repo_name)
             elif group_id is not None and artifact_id is not None and version is not None:
-                return urllib.parse.urljoin(env.default_repo_base_url, f'/repository/{repo_name}/{group_id.replace(".", "/")}/{artifact_id}/{version}')
+                return urllib.parse.urljoin(self.url, f'/repository/{repo_name}/{group_id.replace(".", "/")}/{artifact_id}/{version}')
             elif group_id is not None and artifact_id is not None:
-                return urllib.parse.urljoin(env.default_repo_base_url, f'/repository/{repo_name}/{group_id.replace(".", "/")}/{artifact_id}')
+                return urllib.parse.urljoin(self.url, f'/repository/{repo_name}/{group_id.replace(".", "/")}/{artifact_id}')
             elif group_id is not None:
-                return urllib.parse.urljoin(env.default_repo_base_url, f'/repository/{repo_name}/{group_id.replace(".", "/")}')
+                return urllib.parse.urljoin(self.url, f'/repository/{repo_name}/{group_id.replace(".", "/")}')
             else:
                 raise ValueError(f'Cannot get url from an invalid combination of group_id({group_id}), artifact_id({artifact_id}), and version ({version})')
 
@@ -82,15 +111,37 @@ class Settings(Singleton):
                     raise ValueError('Unrecognized release repo')
             return Settings.Repo(url, snapshot, release)
 
-    def __init__(self, local_repo_path: str = None, repos: List[Repo] = None, working_directory: str = '.', skip_setup: bool = False, pip_params: List = None, current_time: Callable[[], str] = None):
+    def __init__(self, local_repo_path: str = None, repos: List[Repo] = None, working_directory: str = '.', skip_setup: bool = False, pip_params: List = None, current_time: Callable[[], str] = None, config_cache: bool = True, profile_config: bool = False, prefetch_workers: int = 8, download_workers: int = 4, materialize: str = 'auto', mirror_timeout: float = 10.0, mirror_hedge_delay: float = 0.5, wheelhouse: str = None, delta_sync: bool = True, archive_download: bool = True, auth_session: bool = True):
         self.local_repo_path: str = check_local_repo_path(local_repo_path=local_repo_path)
         self.repos: List[Settings.Repo] = check_repos(repos=repos)
         self.working_directory: str = working_directory if working_directory else '.'
         self.skip_setup: bool = skip_setup
         self.pip_params: List = pip_params if pip_params is not None else []
+        self.config_cache: bool = config_cache
+        self.profile_config: bool = profile_config
+        # the number of threads to retrieve the component tree before constructing it, 0 to disable the prefetching
+        self.prefetch_workers: int = prefetch_workers
+        # the number of files of a component downloaded concurrently
+        self.download_workers: int = download_workers
+        # how component files are placed from the local repository into ".runtime": "copy", "auto", or "reflink"
+        self.materialize: str = materialize
+        # the timeout in seconds of requesting a component from a remote repository
+        self.mirror_timeout: float = mirror_timeout
+        # the seconds to wait for a remote repository before also trying the next one
+        self.mirror_hedge_delay: float = mirror_hedge_delay
+        # a folder of wheels collected by `conpack wheelhouse`, to install python packages from only, without any index
+        self.wheelhouse: Optional[str] = wheelhouse
+        # whether updating a downloaded component only downloads the files not matching their remote digests
+        self.delta_sync: bool = delta_sync
+        # whether a component is first requested as a single archive, before downloading its files one by one
+        self.archive_download: bool = archive_download
+        # whether the login of uploading is kept between invocations, to log in again only when the repository responds with 401
+        self.auth_session: bool = auth_session
         self._current_time: Callable[[], str] = current_time if current_time else curr_time
 
-        self.network_session: Optional[requests.Session] = None
+        self.network_session: Optional['requests.Session'] = None
+        self.component_lock: Optional['ComponentLock'] = None
+        self.startup_profiler: Optional['StartupProfiler'] = None
 
     @property
     def current_time(self) -> Callable[[], str]:
@@ -102,12 +153,16 @@ class Settings(Singleton):
 
 
 env=Env()
-default_repo=Settings.Repo(url=env.default_repo_base_url)
+default_repo=Settings.Repo(url=env.default_repo_base_url, validate=False)
 
 
 default_config_folder='.config'
 default_config_files=['config.yaml', 'config.yml']
 component_completion_flag='__COMPLETED'
+component_manifest_file='__MANIFEST.json'
+component_index_file='__INDEX.json'
+# files kept in a local repository component folder besides the component files
+component_meta_files={component_completion_flag, component_manifest_file, component_index_file}
 
 
 def check_local_repo_path(local_repo_path: str = None):
@@ -121,7 +176,9 @@ def check_repos(repos: List[Settings.Repo] = None):
     return repos
 
 
-def load_settings(settings_path: str = None, working_directory: str = None, skip_setup: str = None, pip_params: str = None) -> Settings:
+def load_settings(settings_path: str = None, working_directory: str = None, skip_setup: str = None, pip_params: str = None, profile_config: bool = None, wheelhouse: str = None) -> Settings:
+    import yaml
+
     settings=Settings()
 
     settings_info=None
@@ -135,6 +192,26 @@ def load_settings(settings_path: str = None, working_directory: str = None, skip
             settings.local_repo_path=check_local_repo_path(settings_info['local_repo_path'])
         if 'repos' in settings_info:
             settings.repos=check_repos([Settings.Repo.convert(repo) for repo in settings_info['repos'] if repo is not None])
+        if 'config_cache' in settings_info:
+            settings.config_cache=bool(settings_info['config_cache'])
+        if 'prefetch_workers' in settings_info:
+            settings.prefetch_workers=int(settings_info['prefetch_workers'])
+        if 'download_workers' in settings_info:
+            settings.download_workers=int(settings_info['download_workers'])
+        if 'materialize' in settings_info:
+            settings.materialize=str(settings_info['materialize'])
+        if 'mirror_timeout' in settings_info:
+            settings.mirror_timeout=float(settings_info['mirror_timeout'])
+        if 'mirror_hedge_delay' in settings_info:
+            settings.mirror_hedge_delay=float(settings_info['mirror_hedge_delay'])
+        if 'wheelhouse' in settings_info:
+            settings.wheelhouse=settings_info['wheelhouse']
+        if 'delta_sync' in settings_info:
+            settings.delta_sync=bool(settings_info['delta_sync'])
+        if 'archive_download' in settings_info:
+            settings.archive_download=bool(settings_info['archive_download'])
+        if 'auth_session' in settings_info:
+            settings.auth_session=bool(settings_info['auth_session'])
 
     if working_directory is not None:
         settings.working_directory=working_directory
@@ -143,5 +220,9 @@ def load_settings(settings_path: str = None, working_directory: str = None, skip
     if pip_params:
         pip_params=[param for param in pip_params.split(' ') if param]
         settings.pip_params=pip_params
+    if profile_config is not None:
+        settings.profile_config=profile_config
+    if wheelhouse is not None:
+        settings.wheelhouse=wheelhouse
 
     return settings
@@ -3,6 +3,7 @@
 import argparse
 import os
 import sys
+import time
 
 from typing import Tuple, List, Generator
 
@@ -10,7 +11,13 @@ from requests import Session
 from concopilot.package import config
 from concopilot.package import validator
 from concopilot.package import repo
+from concopilot.package import lock
+from concopilot.package import batch
+from concopilot.package import warm
+from concopilot.package import bundle
+from concopilot.package import profiler
 from concopilot.framework import run
+from concopilot.util.initializer import requirement
 from concopilot.util import ClassDict
 
 
@@ -20,12 +27,23 @@ def get_args(args=None) -> Tuple[ClassDict, List[str]]:
     parser.add_argument('--working-directory', type=str, default=None)
     parser.add_argument('--skip-setup', action='store_true', default=False)
     parser.add_argument('--pip-params', type=str, default=None)
+    parser.add_argument('--profile-config', action='store_true', default=None)
+    parser.add_argument('--profile-startup', action='store_true', default=None)
+    parser.add_argument('--profile-output', type=str, default=None)
+    parser.add_argument('--profile-format', type=str, default=None)
+    parser.add_argument('--locked', action='store_true', default=None)
+    parser.add_argument('--lock-file', type=str, default=None)
 
     parser.add_argument('--repo-user-name', type=str, default=None)
     parser.add_argument('--repo-user-pwd', type=str, default=None)
     parser.add_argument('--gpg-passphrase', type=str, default=None)
     parser.add_argument('--gnupg-home', type=str, default=None)
     parser.add_argument('--recursive', action='store_true', default=False)
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--warm', action='store_true', default=None)
+    parser.add_argument('--socket', type=str, default=None)
+    parser.add_argument('--bundle', type=str, default=None)
+    parser.add_argument('--wheelhouse', type=str, default=None)
 
     parser.add_argument('--src-folder', type=str, default=None)
 
@@ -45,6 +63,10 @@ def install(config_folder, config_file):
     return group_id, artifact_id, version
 
 
+def get_settings_kwargs(param: ClassDict) -> dict:
+    return dict(settings_path=param.settings, working_directory=param.working_directory, skip_setup=param.skip_setup, pip_params=param.pip_params, profile_config=param.profile_config, wheelhouse=param.wheelhouse)
+
+
 def get_config_folder(path: str):
     return os.path.join(path, config.default_config_folder)
 
@@ -84,6 +106,13 @@ def get_help_str(command: str = None) -> str:
                 '               ]\n'
                 '               [--skip-setup]\n'
                 '               [--pip-params=<pip_params>] # Additional parameters to be passed to pip when installing a python package\n'
+                '               [--wheelhouse=<wheelhouse>] # Install python packages only from the wheels collected by `conpack wheelhouse` into <wheelhouse>, without any index\n'
+                '               [--profile-config] # Report how long loading the component config files takes\n'
+                '               [--profile-startup] # Report where the startup time goes, by phase and by component, and save the timing tree\n'
+                '               [--profile-output=<profile_output>] # The file to save the timing tree to, default to "<working_directory>/.runtime/startup-profile.json"\n'
+                '               [--profile-format=<tree|chrome>] # Save the timing tree as nested JSON spans, or as a Chrome trace to be opened by chrome://tracing or Perfetto\n'
+                '               [--locked] # Build the components straight from the lock file written by `conpack lock`, without checking repositories\n'
+                '               [--lock-file=<lock_file>] # The lock file path, default to "<working_directory>/conpack-lock.yaml"\n'
                 '               [--add-current-folder-to-path] # Whether add the current folder to path\n'
                 '               [--add-working-directory-to-path] # Whether add the working directory to path\n'
                 '               [--add-src-folder-to-path] # Whether add the source folder to path\n'
@@ -99,6 +128,16 @@ def get_help_str(command: str = None) -> str:
                 '               ]\n'
                 '               [--skip-setup]\n'
                 '               [--pip-params=<pip_params>] # Additional parameters to be passed to pip when installing a python package\n'
+                '               [--wheelhouse=<wheelhouse>] # Install python packages only from the wheels collected by `conpack wheelhouse` into <wheelhouse>, without any index\n'
+                '               [--profile-config] # Report how long loading the component config files takes\n'
+                '               [--profile-startup] # Report where the startup time goes, by phase and by component, and save the timing tree\n'
+                '               [--profile-output=<profile_output>] # The file to save the timing tree to, default to "<working_directory>/.runtime/startup-profile.json"\n'
+                '               [--profile-format=<tree|chrome>] # Save the timing tree as nested JSON spans, or as a Chrome trace to be opened by chrome://tracing or Perfetto\n'
+                '               [--locked] # Build the components straight from the lock file written by `conpack lock`, without checking repositories\n'
+                '               [--lock-file=<lock_file>] # The lock file path, default to "<working_directory>/conpack-lock.yaml"\n'
+                '               [--warm] # Run in a process forked by `conpack serve-warm`, which has the copilot constructed already\n'
+                '               [--socket=<socket>] # The socket path of the warm server, default to "<working_directory>/.runtime/conpack-warm.sock"\n'
+                '               [--bundle=<bundle>] # Run the copilot packed into <bundle> by `conpack bundle`, with its Python packages imported from the archive\n'
                 '               [--add-current-folder-to-path] # Whether add the current folder to path\n'
                 '               [--add-working-directory-to-path] # Whether add the working directory to path\n'
                 '               [--add-src-folder-to-path] # Whether add the source folder to path\n'
@@ -110,7 +149,9 @@ def get_help_str(command: str = None) -> str:
                 '               [--src-folder=<src_folder>] # The source folder (where the ".config" folder exists), default to current directory\n'
                 '               [--skip-setup]\n'
                 '               [--pip-params=<pip_params>] # Additional parameters to be passed to pip when installing a python package\n'
+                '               [--wheelhouse=<wheelhouse>] # Install python packages only from the wheels collected by `conpack wheelhouse` into <wheelhouse>, without any index\n'
                 '               [--recursive] # check all sub-folder of the <src_folder> for possible config files\n'
+                '               [--jobs=<jobs>] # Build and install the source folders in <jobs> processes concurrently, each after the ones it depends on\n'
                 '               [--add-current-folder-to-path] # Whether add the current folder to path\n'
                 '               [--add-working-directory-to-path] # Whether add the working directory to path\n'
                 '               [--add-src-folder-to-path] # Whether add the source folder to path\n'
@@ -122,15 +163,24 @@ def get_help_str(command: str = None) -> str:
                 '               [--src-folder=<src_folder>] # The source folder (where the ".config" folder exists), default to current directory\n'
                 '               [--skip-setup]\n'
                 '               [--pip-params=<pip_params>] # Additional parameters to be passed to pip when installing a python package\n'
+                '               [--wheelhouse=<wheelhouse>] # Install python packages only from the wheels collected by `conpack wheelhouse` into <wheelhouse>, without any index\n'
                 '               [--recursive] # check all sub-folder of the <src_folder> for possible config files\n'
+                '               [--jobs=<jobs>] # Build and install the source folders in <jobs> processes concurrently, each after the ones it depends on\n'
                 '               [--repo-user-name=<repo_user_name>] [--repo-user-pwd=<repo_user_pwd>] [--gpg-passphrase=<gpg_passphrase>] [--gnupg-home=<gnupg_home>]\n'
                 '               [--add-current-folder-to-path] # Whether add the current folder to path\n'
                 '               [--add-working-directory-to-path] # Whether add the working directory to path\n'
                 '               [--add-src-folder-to-path] # Whether add the source folder to path\n'
                 '               [*argv]')
     else:
-        return ('usage: conpack <build|run|install|deploy>\n'
+        return ('usage: conpack <build|lock|bundle|wheelhouse|run|serve-warm|install|deploy>\n'
                 '               [--settings=<settings>] [--working-directory=<working_directory>] [--skip-setup] [--pip-params=<pip_params>] [--recursive]\n'
+                '               [--jobs=<jobs>]\n'
+                '               [--warm] [--socket=<socket>]\n'
+                '               [--bundle=<bundle>]\n'
+                '               [--wheelhouse=<wheelhouse>]\n'
+                '               [--profile-config]\n'
+                '               [--profile-startup] [--profile-output=<profile_output>] [--profile-format=<tree|chrome>]\n'
+                '               [--locked] [--lock-file=<lock_file>]\n'
                 '               [--repo-user-name=<repo_user_name>] [--repo-user-pwd=<repo_user_pwd>] [--gpg-passphrase=<gpg_passphrase>] [--gnupg-home=<gnupg_home>]\n'
                 '               [--src-folder=<src_folder>]\n'
                 '               [--add-current-folder-to-path] [--add-working-directory-to-path] [--add-src-folder-to-path]\n'
@@ -146,7 +196,7 @@ def execute(*args, **kwargs):
     param.update({k: v for k, v in kwargs.items() if k in param})
     if not param.src_folder:
         param.src_folder='.'
-    settings=config.load_settings(settings_path=param.settings, working_directory=param.working_directory, skip_setup=param.skip_setup, pip_params=param.pip_params)
+    settings=config.load_settings(**get_settings_kwargs(param))
 
     if param.add_current_folder_to_path:
         abs_path=str(os.path.abspath('.'))
@@ -166,6 +216,11 @@ def execute(*args, **kwargs):
         argv=argv[1:]
     else:
         command=None
+    lock_file_path=param.lock_file if param.lock_file else os.path.join(settings.working_directory, lock.default_lock_file)
+    if param.locked and (command=='build' or command=='run'):
+        settings.component_lock=lock.ComponentLock.load(lock_file_path)
+    if param.profile_startup and (command=='build' or command=='run') and not param.warm:
+        settings.startup_profiler=profiler.StartupProfiler(output_path=param.profile_output, output_format=param.profile_format if param.profile_format else 'tree')
     folder_count=0
     plugin=None
     plugin_list=None
@@ -188,6 +243,79 @@ def execute(*args, **kwargs):
                 if os.path.isfile(src_config_file):
                     plugin_list.append([src_config_file, run.build(ClassDict(config_file=src_config_file), argv[2:])])
                     folder_count+=1
+        if settings.startup_profiler is not None:
+            settings.startup_profiler.finish()
+    elif command=='lock':
+        # do build, and record the resolved component graph into the lock file
+        run_param, run_argv=run.get_args(argv)
+        run_param.update({k: v for k, v in kwargs.items() if k in run_param})
+        if not (run_param.group_id or run_param.config_file):
+            for src_config_folder, src_config_file in get_valid_configs(param.src_folder, False):
+                run_param.config_file=src_config_file
+                break
+        logger.info(f'---------------- locking ----------------')
+        settings.component_lock=lock.ComponentLock()
+        plugin=run.build(run_param, *run_argv)
+        settings.component_lock.save(lock_file_path)
+        logger.info(f'{len(settings.component_lock.nodes)} components locked into "{lock_file_path}".')
+        settings.component_lock=None
+        folder_count+=1
+    elif command=='bundle':
+        # do build, and pack the resolved component tree with its Python packages into a single archive
+        run_param, run_argv=run.get_args(argv)
+        run_param.update({k: v for k, v in kwargs.items() if k in run_param})
+        if not (run_param.group_id or run_param.config_file):
+            for src_config_folder, src_config_file in get_valid_configs(param.src_folder, False):
+                run_param.config_file=src_config_file
+                break
+        logger.info(f'---------------- bundling ----------------')
+        settings.component_lock=lock.ComponentLock()
+        plugin=run.build(run_param, *run_argv)
+        bundle.create(run_param, settings.component_lock, bundle.get_bundle_path(param.bundle))
+        settings.component_lock=None
+        folder_count+=1
+    elif command=='wheelhouse':
+        # collect the wheels of all python requirements of the component tree, to set up from without network access
+        run_param, run_argv=run.get_args(argv)
+        run_param.update({k: v for k, v in kwargs.items() if k in run_param})
+        if not (run_param.group_id or run_param.config_file):
+            for src_config_folder, src_config_file in get_valid_configs(param.src_folder, False):
+                run_param.config_file=src_config_file
+                break
+        logger.info(f'---------------- collecting wheels ----------------')
+        requirement.build_wheelhouse(run.collect_component_configs(run_param), param.wheelhouse if param.wheelhouse else os.path.join(settings.working_directory, requirement.default_wheelhouse_folder))
+        folder_count+=1
+    elif command=='serve-warm':
+        # build copilots, and keep them in memory to be forked by `conpack run --warm`
+        run_param, run_argv=run.get_args(argv)
+        run_param.update({k: v for k, v in kwargs.items() if k in run_param})
+        params=[]
+        if run_param.group_id or run_param.config_file:
+            params.append((run_param, run_argv))
+        else:
+            for src_config_folder, src_config_file in get_valid_configs(param.src_folder, param.recursive):
+                params.append((ClassDict(config_file=src_config_file), run_argv))
+        logger.info(f'---------------- serving ----------------')
+        folder_count+=max(len(params), 1)
+        warm.serve(params, socket_path=param.socket)
+    elif command=='run' and param.warm:
+        # run copilot in a process forked by `conpack serve-warm`
+        run_param, run_argv=run.get_args(argv)
+        run_param.update({k: v for k, v in kwargs.items() if k in run_param})
+        if not (run_param.group_id or run_param.config_file):
+            for src_config_folder, src_config_file in get_valid_configs(param.src_folder, False):
+                run_param.config_file=src_config_file
+                break
+        folder_count+=1
+        code=warm.run(run_param, socket_path=param.socket, argv=run_argv)
+        if code!=0:
+            sys.exit(code)
+    elif command=='run' and param.bundle:
+        # run copilot from a bundle created by `conpack bundle`, without checking repositories or setting up requirements
+        run_param, run_argv=run.get_args(argv)
+        logger.info(f'---------------- running {param.bundle} ----------------')
+        run.run(bundle.prepare(param.bundle), *run_argv)
+        folder_count+=1
     elif command=='run':
         # do build, and run copilot
         run_param, run_argv=run.get_args(argv)
@@ -201,6 +329,13 @@ def execute(*args, **kwargs):
                 logger.info(f'---------------- running {src_config_folder} ----------------')
                 run.run(ClassDict(config_file=src_config_file), argv[2:])
                 folder_count+=1
+    elif command=='install' and param.jobs and param.jobs>1:
+        # build and install independent source folders concurrently, each after its dependencies
+        start=time.perf_counter()
+        tasks=batch.plan(get_valid_configs(param.src_folder, param.recursive))
+        batch.run_tasks(tasks, param.jobs, get_settings_kwargs(param), argv[2:])
+        logger.info('Timings:\n'+batch.report(tasks, time.perf_counter()-start))
+        folder_count+=len(tasks)
     elif command=='install':
         # check if source folder is a component definition
         # copy config files from ./.config into local repo
@@ -212,6 +347,18 @@ def execute(*args, **kwargs):
             install(src_config_folder, src_config_file)
             logger.info(f'{src_config_folder} successfully installed into local repository.\n')
             folder_count+=1
+    elif command=='deploy' and param.jobs and param.jobs>1:
+        # build and install concurrently as `install --jobs`, and upload in this process, in a dependency order
+        start=time.perf_counter()
+        tasks=batch.plan(get_valid_configs(param.src_folder, param.recursive))
+        with Session() as session:
+            def deploy(task: batch.ComponentTask):
+                logger.info(f'---------------- deploying {task.src_config_folder} ----------------')
+                repo.to_remote_repo(session, task.group_id, task.artifact_id, task.version, name=param.repo_user_name, pwd=param.repo_user_pwd, gpg=True, gpg_passphrase=param.gpg_passphrase, gnupghome=param.gnupg_home)
+
+            batch.run_tasks(tasks, param.jobs, get_settings_kwargs(param), argv[2:], on_installed=deploy)
+        logger.info('Timings:\n'+batch.report(tasks, time.perf_counter()-start))
+        folder_count+=len(tasks)
     elif command=='deploy':
         # do install, and push the component definition to remote repo
         with Session() as session:
@@ -1,8 +1,6 @@
 # -*- coding: utf-8 -*-
 
 import hashlib
-from Crypto.Cipher import PKCS1_v1_5
-from Crypto.PublicKey import RSA
 import base64
 
 
@@ -12,6 +10,9 @@ def scrypt(pwd: bytes, salt: bytes = b'') -> bytes:
 
 
 def encrypt_RSA(msg: bytes, public_key: bytes) -> str:
+    from Crypto.Cipher import PKCS1_v1_5
+    from Crypto.PublicKey import RSA
+
     encryptor=PKCS1_v1_5.new(RSA.importKey(public_key))
     encrypted=encryptor.encrypt(msg)
     return base64.b64encode(encrypted).decode('ISO_8859_1')
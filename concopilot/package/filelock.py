@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import shutil
+import logging
+
+from .error import PackageException
+
+
+logger=logging.getLogger('[ConCopilot]')
+
+
+lock_suffix='.lock'
+staging_suffix='.staging'
+trash_suffix='.trash'
+# seconds between two attempts to acquire a lock held by another process, growing up to the max
+poll_interval=0.05
+max_poll_interval=0.5
+
+
+try:
+    import fcntl
+
+    def _try_lock(fd: int) -> bool:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _lock(fd: int):
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _unlock(fd: int):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+except ImportError:
+    import msvcrt
+
+    def _try_lock(fd: int) -> bool:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    # Windows has no blocking lock without a time limit, the lock is polled instead
+    _lock=None
+
+    def _unlock(fd: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """
+    An exclusive lock on a lock file, shared by all processes and threads on the machine.
+
+    Each acquisition opens the lock file anew, so that threads of the same process exclude each other as well.
+    The lock file is never removed, since removing it would let two processes lock different files of the same path.
+    """
+
+    def __init__(self, path: str, timeout: float = None):
+        self.path: str = path
+        # seconds to wait for the lock before raising, None to wait forever
+        self.timeout: float = timeout
+        self._fd: int = None
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd=os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if not _try_lock(fd):
+            logger.info(f'Waiting for another process holding "{self.path}"...')
+            try:
+                if self.timeout is None and _lock is not None:
+                    _lock(fd)
+                else:
+                    self._poll(fd)
+            except BaseException:
+                os.close(fd)
+                raise
+        self._fd=fd
+
+    def _poll(self, fd: int):
+        start=time.monotonic()
+        interval=poll_interval
+        while not _try_lock(fd):
+            if self.timeout is not None and time.monotonic()-start>self.timeout:
+                raise PackageException(f'Timeout after {self.timeout}s waiting for the lock "{self.path}".')
+            time.sleep(interval)
+            interval=min(interval*2, max_poll_interval)
+
+    def release(self):
+        if self._fd is not None:
+            try:
+                _unlock(self._fd)
+            finally:
+                os.close(self._fd)
+                self._fd=None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+def folder_lock(folder: str, timeout: float = None) -> FileLock:
+    """
+    :return: the lock of a component folder, e.g. in the local repository or the ".runtime" folder, on a lock file beside it.
+    """
+    return FileLock(os.path.normpath(folder)+lock_suffix, timeout=timeout)
+
+
+def get_staging_folder(folder: str, resume: bool) -> str:
+    """
+    Get the folder to prepare the content of `folder` in, before `publish_folder` moves it into place.
+    Its name is fixed, so what an interrupted preparation left there is found by the next one. Use it only while holding the `folder_lock`.
+
+    :param folder: the folder to be prepared.
+    :param resume: True to keep what was left there, e.g. the partial files of a download to be resumed, False to start from an empty folder.
+    :return: the staging folder, which exists.
+    """
+    staging_folder=os.path.normpath(folder)+staging_suffix
+    if not resume and os.path.isdir(staging_folder):
+        shutil.rmtree(staging_folder)
+    os.makedirs(staging_folder, exist_ok=True)
+    return staging_folder
+
+
+def is_auxiliary(name: str) -> bool:
+    """
+    :return: whether a file or folder name is a lock file, staging folder, or folder being removed, beside a component folder.
+    """
+    return name.endswith((lock_suffix, staging_suffix, trash_suffix))
+
+
+def publish_folder(staging_folder: str, folder: str):
+    """
+    Move a completely prepared `staging_folder` into place of `folder`, replacing the existing one, if any.
+    Other processes never see a partially written folder: it either does not exist or is complete.
+    """
+    if os.path.isdir(folder):
+        # renamed away first, so that the folder is missing only between two renames rather than during a whole removal
+        trash_folder=f'{os.path.normpath(folder)}.{os.getpid()}{trash_suffix}'
+        os.rename(folder, trash_folder)
+        os.rename(staging_folder, folder)
+        shutil.rmtree(trash_folder, ignore_errors=True)
+    else:
+        os.rename(staging_folder, folder)
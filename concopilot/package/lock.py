@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+import logging
+
+from typing import Dict, List, Optional
+
+from .error import PackageException
+from ..util import ClassDict
+
+
+logger=logging.getLogger('[ConCopilot]')
+
+
+default_lock_file='conpack-lock.yaml'
+lock_file_version=1
+
+
+def file_sha256(file_path: str) -> str:
+    with open(file_path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def component_key(config: ClassDict) -> str:
+    """
+    The key of a component reference (the `group_id`, `artifact_id`, `version`, etc. in a parent config) in the lock file.
+    """
+    return '/'.join([
+        str(config.group_id),
+        str(config.artifact_id),
+        str(config.version),
+        str(config.instance_id) if config.instance_id is not None else '0',
+        config.config_file if config.config_file else '',
+        config.config_folder if config.config_folder else ''
+    ])
+
+
+class ComponentLock:
+    """
+    The fully resolved component graph of a copilot.
+
+    While recording, each component resolved by `component.get_component_config` is added as a node.
+    While locked, components are resolved from the nodes only, without checking or downloading from repositories.
+    """
+
+    def __init__(self, nodes: List[ClassDict] = None, locked: bool = False):
+        self.nodes: Dict[str, ClassDict] = {node.key: node for node in nodes} if nodes else {}
+        self.locked: bool = locked
+        self._parents: List[str] = []
+
+    def get(self, config: ClassDict) -> Optional[ClassDict]:
+        return self.nodes.get(component_key(config))
+
+    def resolve(self, config: ClassDict) -> ClassDict:
+        node=self.get(config)
+        if node is None:
+            raise PackageException(f'Component {component_key(config)} is not in the lock file. Please run `conpack lock` again.')
+        config_file_path=os.path.join(node.config_folder, node.config_file)
+        if not os.path.isfile(config_file_path):
+            raise PackageException(f'Locked config file "{config_file_path}" does not exist. Please run `conpack lock` again.')
+        if file_sha256(config_file_path)!=node.sha256:
+            logger.warning(f'Locked config file "{config_file_path}" has been modified since `conpack lock`.')
+        return node
+
+    def record(self, config: ClassDict, version: str, config_folder: str, config_file: str, package: str) -> str:
+        key=component_key(config)
+        self.nodes[key]=ClassDict(
+            key=key,
+            group_id=config.group_id,
+            artifact_id=config.artifact_id,
+            version=version,
+            config_folder=os.path.abspath(config_folder),
+            config_file=config_file,
+            package=package,
+            sha256=file_sha256(os.path.join(config_folder, config_file)),
+            parent=self._parents[-1] if self._parents else None
+        )
+        return key
+
+    def enter(self, key: str):
+        self._parents.append(key)
+
+    def exit(self):
+        self._parents.pop()
+
+    def save(self, lock_file_path: str):
+        import yaml
+        from ..util.yamls import YamlDumper
+
+        tmp_file_path=lock_file_path+'.tmp'
+        with open(tmp_file_path, 'w', encoding='utf8') as file:
+            yaml.dump({'version': lock_file_version, 'nodes': list(self.nodes.values())}, file, Dumper=YamlDumper, sort_keys=False, allow_unicode=True)
+        os.replace(tmp_file_path, lock_file_path)
+
+    @staticmethod
+    def load(lock_file_path: str) -> 'ComponentLock':
+        from ..util.config.tool import read_config_file
+
+        if not os.path.isfile(lock_file_path):
+            raise PackageException(f'Lock file "{lock_file_path}" not found. Please run `conpack lock` first.')
+        lock=read_config_file(lock_file_path)
+        if lock.version!=lock_file_version:
+            raise PackageException(f'Unsupported lock file version: {lock.version}. Please run `conpack lock` again.')
+        return ComponentLock(nodes=lock.nodes, locked=True)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+
+from typing import Dict, Optional
+
+from . import check
+from . import materialize
+from .config import component_manifest_file
+from .error import PackageException
+from ..util import jsons
+
+
+manifest_algorithm='sha256'
+
+
+class Manifest:
+    """
+    The digests of the files of a component in the local repository, saved as a `__MANIFEST.json` file in its folder.
+
+    Each entry keeps the size and mtime of the file when it was hashed,
+    so that an unchanged file is trusted without being read again.
+    Entries are keyed by the file path relative to the component folder, in POSIX format.
+    """
+
+    def __init__(self, folder: str, files: Dict[str, Dict] = None):
+        self.folder: str = folder
+        self.files: Dict[str, Dict] = files if files is not None else {}
+        self.modified: bool = False
+        self._lock=threading.Lock()
+
+    def name(self, path: str) -> str:
+        return os.path.relpath(path, self.folder).replace(os.sep, '/')
+
+    def get(self, path: str) -> Optional[Dict]:
+        return self.files.get(self.name(path))
+
+    def is_unchanged(self, path: str) -> bool:
+        """
+        :return: whether the file at `path` has not been modified since it was hashed.
+        """
+        entry=self.get(path)
+        if entry is None:
+            return False
+        stat=os.stat(path)
+        return entry['size']==stat.st_size and entry['mtime_ns']==stat.st_mtime_ns
+
+    def update(self, path: str, digest: str):
+        stat=os.stat(path)
+        with self._lock:
+            self.files[self.name(path)]={'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, manifest_algorithm: digest}
+            self.modified=True
+
+    def verify(self, path: str, digest: str):
+        """
+        Verify the `digest` of the file at `path`, which has just been computed while streaming it.
+        The file is recorded if it is not in the manifest yet.
+        """
+        entry=self.get(path)
+        if entry is not None and entry[manifest_algorithm]!=digest:
+            raise PackageException(f'File "{path}" is corrupted: its {manifest_algorithm} digest does not match the manifest. Please remove the component from the local repository and download it again.')
+        self.update(path, digest)
+
+    def discard_missing(self):
+        """
+        Remove the entries of the files not in the folder anymore.
+        """
+        with self._lock:
+            for name in [name for name in self.files if not os.path.isfile(os.path.join(self.folder, *name.split('/')))]:
+                del self.files[name]
+                self.modified=True
+
+    def save(self):
+        if not self.modified:
+            return
+        file_path=os.path.join(self.folder, component_manifest_file)
+        tmp_file_path=f'{file_path}.{os.getpid()}.tmp'
+        with open(tmp_file_path, 'w', encoding='utf8') as file:
+            file.write(jsons.dumps({'algorithm': manifest_algorithm, 'files': self.files}, indent=2, sort_keys=True))
+        os.replace(tmp_file_path, file_path)
+        self.modified=False
+
+    @staticmethod
+    def load(folder: str) -> 'Manifest':
+        """
+        :return: the manifest in `folder`, or an empty one if there is none or it is unreadable.
+        """
+        file_path=os.path.join(folder, component_manifest_file)
+        try:
+            with open(file_path, 'r', encoding='utf8') as file:
+                data=jsons.loads(file.read())
+            if data.get('algorithm')==manifest_algorithm:
+                return Manifest(folder, data['files'])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return Manifest(folder)
+
+
+def copy_with_manifest(src: str, dst: str, manifest: Manifest, follow_symlinks=True):
+    """
+    Copy a file out of a component folder having the `manifest`.
+
+    Files unchanged since they were hashed are materialized by `materialize.materialize_file` (copied or linked),
+    others are verified against the manifest while being copied.
+    """
+    if manifest.is_unchanged(src):
+        return materialize.materialize_file(src, dst, follow_symlinks=follow_symlinks)
+    materialize.unlink_shared(dst)
+    manifest.verify(src, check.copy_file(src, dst, (manifest_algorithm,))[manifest_algorithm])
+    return dst
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import os
+import errno
+import shutil
+
+from typing import Set, Tuple
+
+from .config import Settings
+
+
+settings=Settings()
+
+
+# copy: always copy files
+# auto: clone files with reflinks where the filesystem supports them, otherwise copy
+# reflink: the same as "auto"
+# files are never hard linked: components write to their ".runtime" files freely, which would write through to the local repository
+modes=('copy', 'auto', 'reflink')
+
+# the `FICLONE` ioctl request on Linux
+FICLONE=0x40049409
+
+# (src_device, dst_device) pairs where reflinks failed, not to be tried again
+_reflink_unsupported: Set[Tuple[int, int]] = set()
+
+_unsupported_errnos={errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL, errno.ENOTTY, errno.EPERM, errno.EMLINK}
+
+
+def _devices(src: str, dst: str) -> Tuple[int, int]:
+    return os.stat(src).st_dev, os.stat(os.path.dirname(os.path.abspath(dst))).st_dev
+
+
+def reflink(src: str, dst: str) -> bool:
+    """
+    Clone `src` into `dst` sharing the data blocks, which are copied by the filesystem only when either file is written.
+
+    :return: whether the clone succeeded. `dst` does not exist if not.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    devices=_devices(src, dst)
+    if devices in _reflink_unsupported:
+        return False
+    try:
+        with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+    except OSError as e:
+        if os.path.exists(dst):
+            os.remove(dst)
+        if e.errno in _unsupported_errnos:
+            _reflink_unsupported.add(devices)
+            return False
+        raise
+    shutil.copystat(src, dst)
+    return True
+
+
+def materialize_file(src: str, dst: str, mode: str = None, follow_symlinks=True) -> str:
+    """
+    Materialize a file of the local repository into the ".runtime" folder, by `mode` (default to `settings.materialize`),
+    falling back to copying where reflinks are not supported.
+    """
+    mode=mode if mode else settings.materialize
+    if mode not in modes:
+        raise ValueError(f'Unknown materialize mode `{mode}`, must be one of {modes}.')
+    unlink_shared(dst)
+    if mode in ('auto', 'reflink'):
+        if reflink(src, dst):
+            return dst
+    return shutil.copy2(src, dst, follow_symlinks=follow_symlinks)
+
+
+def unlink_shared(path: str):
+    """
+    Remove the file at `path` if it is shared by hard links, e.g. placed by a hard link before, so that writing a new file there will not write through to the local repository.
+    """
+    if os.path.isfile(path) and os.stat(path).st_nlink>1:
+        os.remove(path)
+
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import logging
+import threading
+import concurrent.futures
+
+from typing import Dict, List, Set, Tuple, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+
+from .config import Settings
+from ..util import jsons
+
+
+logger=logging.getLogger('[ConCopilot]')
+
+
+settings=Settings()
+
+
+mirror_stats_file='.mirror-stats.json'
+# the weight of the latest latency in the moving average
+latency_weight=0.3
+# a repository failed recently is tried after the healthy ones within this period
+failure_cooldown_seconds=5*60
+
+
+class MirrorStats:
+    """
+    Latency and failure statistics of the remote repositories, persisted in the local repository folder.
+
+    Each repository, keyed by its base url, has the moving average of its response `latency` in seconds,
+    the numbers of `successes` and `failures`, and the time of the `last_failure`.
+    """
+
+    def __init__(self, file_path: str, stats: Dict[str, Dict] = None):
+        self.file_path: str = file_path
+        self.stats: Dict[str, Dict] = stats if stats is not None else {}
+        self._lock=threading.Lock()
+
+    def record(self, url: str, latency: float, ok: bool):
+        with self._lock:
+            stat=self.stats.setdefault(url, {'latency': None, 'successes': 0, 'failures': 0, 'last_failure': None})
+            if ok:
+                stat['latency']=latency if stat['latency'] is None else latency_weight*latency+(1-latency_weight)*stat['latency']
+                stat['successes']+=1
+            else:
+                stat['failures']+=1
+                stat['last_failure']=time.time()
+
+    def is_healthy(self, url: str) -> bool:
+        stat=self.stats.get(url)
+        return stat is None or stat['last_failure'] is None or time.time()-stat['last_failure']>failure_cooldown_seconds
+
+    def rank(self, repos: List[Settings.Repo]) -> List[Settings.Repo]:
+        """
+        :return: `repos` with the healthy ones first, each part from the fastest to the slowest.
+            Repositories never used keep their configured order, before the measured ones, so that they get measured.
+        """
+        def key_fn(item):
+            i, repo=item
+            stat=self.stats.get(repo.url)
+            latency=stat['latency'] if stat is not None and stat['latency'] is not None else 0.0
+            return not self.is_healthy(repo.url), latency, i
+
+        return [repo for _, repo in sorted(enumerate(repos), key=key_fn)]
+
+    def save(self):
+        with self._lock:
+            data=jsons.dumps(self.stats, indent=2)
+        try:
+            os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+            tmp_file_path=f'{self.file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_file_path, 'w', encoding='utf8') as file:
+                file.write(data)
+            os.replace(tmp_file_path, self.file_path)
+        except OSError as e:
+            logger.warning(f'Cannot save mirror statistics to "{self.file_path}": {e}')
+
+    @staticmethod
+    def load(file_path: str) -> 'MirrorStats':
+        try:
+            with open(file_path, 'r', encoding='utf8') as file:
+                return MirrorStats(file_path, jsons.loads(file.read()))
+        except (OSError, ValueError):
+            return MirrorStats(file_path)
+
+
+_mirror_stats: Optional[MirrorStats] = None
+
+
+# the executors of the probes outrun by another repository, whose threads may still be running
+_outrun_executors: List[concurrent.futures.ThreadPoolExecutor] = []
+
+
+def get_mirror_stats() -> MirrorStats:
+    global _mirror_stats
+    file_path=os.path.join(settings.local_repo_path, mirror_stats_file)
+    if _mirror_stats is None or _mirror_stats.file_path!=file_path:
+        _mirror_stats=MirrorStats.load(file_path)
+    return _mirror_stats
+
+
+def _probe(requester: 'requests.Session', url: str, timeout: float) -> Tuple[Optional['requests.Response'], float, Optional[Exception]]:
+    import requests
+
+    start=time.perf_counter()
+    try:
+        response=requester.post(url, timeout=timeout)
+        return response, time.perf_counter()-start, None
+    except requests.RequestException as e:
+        return None, time.perf_counter()-start, e
+
+
+def probe(requester: 'requests.Session', candidates: List[Tuple[Settings.Repo, str]]) -> Tuple[Optional[str], Optional['requests.Response']]:
+    """
+    Request the component file list from the candidate repositories, and return the first successful one.
+
+    Candidates are probed in the ranked order, but without waiting for each other:
+    the next one is started as soon as the previous one fails, or after `settings.mirror_hedge_delay` seconds without a response,
+    so that a slow or unreachable repository never stalls the resolution.
+    The latency and failures of every probe are recorded into the mirror statistics,
+    those of the probes outrun by another repository once they end.
+
+    :param candidates: the (repository, component url) pairs, in ranked order.
+    :return: the component url and the response of the first repository having it, or (None, None) if none has.
+    """
+    stats=get_mirror_stats()
+    pending=list(candidates)
+    futures: Dict[concurrent.futures.Future, Tuple[Settings.Repo, str]] = {}
+    outrun: Set[concurrent.futures.Future] = set()
+    executor=concurrent.futures.ThreadPoolExecutor(max_workers=max(len(candidates), 1))
+
+    def on_done(repo: Settings.Repo, future: concurrent.futures.Future):
+        if future.cancelled():
+            return
+        response, latency, error=future.result()
+        # a repository without the component is still healthy
+        stats.record(repo.url, latency, ok=error is None and response.status_code<500)
+        if future in outrun:
+            # ended after the statistics were saved by `probe`
+            stats.save()
+
+    def launch():
+        repo, url=pending.pop(0)
+        future=executor.submit(_probe, requester, url, settings.mirror_timeout)
+        future.add_done_callback(lambda f, repo=repo: on_done(repo, f))
+        futures[future]=(repo, url)
+
+    try:
+        if pending:
+            launch()
+        while futures:
+            done, _=concurrent.futures.wait(futures, timeout=settings.mirror_hedge_delay if pending else None, return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                launch()
+                continue
+            for future in done:
+                repo, url=futures.pop(future)
+                response, latency, error=future.result()
+                if response is not None and response.status_code==200:
+                    return url, response
+                if error is not None:
+                    logger.warning(f'Repository `{repo.url}` failed in {latency:.2f}s: {error}')
+                else:
+                    logger.warning(f'No such resources found in url `{url}`, status code: {response.status_code}')
+                if pending:
+                    launch()
+        return None, None
+    finally:
+        # the probes still running are outrun, their results are recorded when they end rather than guessed from the time taken so far
+        outrun.update(futures)
+        executor.shutdown(wait=False, cancel_futures=True)
+        if futures:
+            _outrun_executors.append(executor)
+        stats.save()
+
+
+def join_outrun_probes():
+    """
+    Wait for the probes outrun by another repository to end, e.g. before forking, so that no thread is left running.
+    """
+    while _outrun_executors:
+        _outrun_executors.pop().shutdown(wait=True)
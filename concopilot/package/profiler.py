@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import logging
+import threading
+import contextlib
+
+from typing import Any, Dict, List, Optional, ContextManager
+
+from .config import Settings
+from ..util import jsons
+
+
+logger=logging.getLogger('[ConCopilot]')
+
+
+settings=Settings()
+
+
+default_profile_file='startup-profile.json'
+# tree: the nested spans as JSON
+# chrome: the Chrome trace event format, to be opened by chrome://tracing or https://ui.perfetto.dev
+output_formats=('tree', 'chrome')
+# the number of the slowest spans and components in the summary
+summary_size=20
+
+_disabled=contextlib.nullcontext()
+
+
+class Span:
+    """
+    A timed phase of the startup, e.g. retrieving, importing, or constructing a component, with the phases nested in it.
+    """
+
+    def __init__(self, name: str, component: Optional[str], thread: int, start: float):
+        self.name: str = name
+        # the (group_id/artifact_id/version) or config file of the component this phase works on, if any
+        self.component: Optional[str] = component
+        self.thread: int = thread
+        self.start: float = start
+        self.end: Optional[float] = None
+        self.children: List['Span'] = []
+
+    @property
+    def seconds(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter())-self.start
+
+    @property
+    def self_seconds(self) -> float:
+        """
+        :return: the seconds not spent in the children.
+        """
+        return self.seconds-sum(child.seconds for child in self.children if child.thread==self.thread)
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'component': self.component,
+            'thread': self.thread,
+            'start': round(self.start-origin, 6),
+            'seconds': round(self.seconds, 6),
+            'self_seconds': round(self.self_seconds, 6),
+            'children': [child.to_dict(origin) for child in self.children]
+        }
+
+
+class StartupProfiler:
+    """
+    Record where the startup of a copilot goes, as a tree of spans, from building it until its interaction begins.
+
+    Spans opened in other threads (e.g. by the prefetching) are attached to the span open in the thread that started the profiling, if any.
+    """
+
+    def __init__(self, output_path: str = None, output_format: str = 'tree'):
+        if output_format not in output_formats:
+            raise ValueError(f'Unknown profile format `{output_format}`, must be one of {output_formats}.')
+        self.output_path: str = output_path if output_path else os.path.join(settings.working_directory, '.runtime', default_profile_file)
+        self.output_format: str = output_format
+        self.origin: float = time.perf_counter()
+        self.roots: List[Span] = []
+        # the copilot whose interaction ends the startup
+        self.root_plugin: Any = None
+        self.finished: bool = False
+        self._main_thread: int = threading.get_ident()
+        self._local=threading.local()
+        self._lock=threading.Lock()
+        self._main_stack: List[Span] = self._stack()
+
+    def _stack(self) -> List[Span]:
+        stack=getattr(self._local, 'stack', None)
+        if stack is None:
+            stack=self._local.stack=[]
+        return stack
+
+    @contextlib.contextmanager
+    def span(self, name: str, component: str = None):
+        stack=self._stack()
+        span=Span(name, component, threading.get_ident(), time.perf_counter())
+        with self._lock:
+            if stack:
+                stack[-1].children.append(span)
+            elif span.thread!=self._main_thread and self._main_stack:
+                self._main_stack[-1].children.append(span)
+            else:
+                self.roots.append(span)
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            span.end=time.perf_counter()
+            stack.pop()
+
+    def iter_spans(self):
+        pending=list(self.roots)
+        while pending:
+            span=pending.pop()
+            yield span
+            pending.extend(span.children)
+
+    def summary(self) -> str:
+        spans=list(self.iter_spans())
+        seconds=time.perf_counter()-self.origin
+        phases: Dict[str, List[float]] = {}
+        components: Dict[str, float] = {}
+        for span in spans:
+            phase=phases.setdefault(span.name, [0, 0.0])
+            phase[0]+=1
+            phase[1]+=span.self_seconds
+            if span.component:
+                components[span.component]=components.get(span.component, 0.0)+span.self_seconds
+
+        lines=[f'Startup took {seconds:.3f}s, {len(spans)} spans recorded.', 'By phase (self time):']
+        for name, (count, phase_seconds) in sorted(phases.items(), key=lambda item: -item[1][1]):
+            lines.append(f'  {phase_seconds:>9.3f}s  {count:>5}x  {name}')
+        lines.append('Slowest components (self time of all their phases):')
+        for component, component_seconds in sorted(components.items(), key=lambda item: -item[1])[:summary_size]:
+            lines.append(f'  {component_seconds:>9.3f}s  {component}')
+        lines.append('Slowest spans (self time):')
+        for span in sorted(spans, key=lambda span: -span.self_seconds)[:summary_size]:
+            lines.append(f'  {span.self_seconds:>9.3f}s  {span.name}'+(f' {span.component}' if span.component else ''))
+        return '\n'.join(lines)
+
+    def to_tree(self) -> Dict[str, Any]:
+        return {
+            'seconds': round(time.perf_counter()-self.origin, 6),
+            'spans': [span.to_dict(self.origin) for span in self.roots]
+        }
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        pid=os.getpid()
+        events=[]
+        for span in self.iter_spans():
+            event={
+                'name': span.name+(f' {span.component}' if span.component else ''),
+                'cat': span.name,
+                'ph': 'X',
+                'ts': round((span.start-self.origin)*1e6, 1),
+                'dur': round(span.seconds*1e6, 1),
+                'pid': pid,
+                'tid': span.thread
+            }
+            if span.component:
+                event['args']={'component': span.component}
+            events.append(event)
+        events.sort(key=lambda event: event['ts'])
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save(self):
+        data=self.to_chrome_trace() if self.output_format=='chrome' else self.to_tree()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+            with open(self.output_path, 'w', encoding='utf8') as file:
+                file.write(jsons.dumps(data, indent=2))
+        except OSError as e:
+            logger.warning(f'Cannot save the startup profile to "{self.output_path}": {e}')
+            return
+        logger.info(f'Startup profile saved to "{self.output_path}".')
+
+    def finish(self):
+        """
+        Report the startup, once.
+        """
+        if self.finished:
+            return
+        self.finished=True
+        logger.info(self.summary())
+        self.save()
+
+
+def span(name: str, component: str = None) -> ContextManager:
+    """
+    Time a phase of the startup, if `settings.startup_profiler` is set.
+    """
+    profiler=settings.startup_profiler
+    return profiler.span(name, component) if profiler is not None and not profiler.finished else _disabled
+
+
+def ready(plugin: Any):
+    """
+    Report the startup when the interaction of the profiled copilot `plugin` is about to begin.
+    """
+    profiler=settings.startup_profiler
+    if profiler is not None and profiler.root_plugin is plugin:
+        profiler.finish()
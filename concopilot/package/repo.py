@@ -1,16 +1,24 @@
 # -*- coding: utf-8 -*-
 
 import os
+import time
 import pathlib
+import concurrent.futures
 import shutil
 import logging
 
-from typing import Tuple
+from typing import List, Set, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from requests import Session
 
-from requests import Session
 from . import check
+from . import mirror
 from . import transfer
-from .config import Env, Settings, default_config_files, component_completion_flag
+from . import filelock
+from .config import Env, Settings, default_config_files, component_completion_flag, component_meta_files
+from .manifest import Manifest, manifest_algorithm, copy_with_manifest
+from .materialize import materialize_file
 from .error import PackageException, PackageHttpException
 from ..util.config.tool import get_config_folder
 from ..util.config import versions
@@ -27,7 +35,7 @@ ignore_suffixes={'.md5', '.sha1', '.sha256', '.sha512', '.asc'}
 
 
 def _ignore(dir, names):
-    return [name for name in names if (pathlib.Path(name).suffix.lower() in ignore_suffixes or name==component_completion_flag)]
+    return [name for name in names if (pathlib.Path(name).suffix.lower() in ignore_suffixes or name in component_meta_files)]
 
 
 def check_config_file_existence(config_folder: str, config_file: str = None, artifact_id: str = None, version: str = None, check_completion: bool = False) -> Tuple[bool, str, str]:
@@ -48,22 +56,38 @@ def to_repo_file_name(original_file_name: str, artifact_id, version):
     return '-'.join([artifact_id, version, original_file_name])
 
 
-def get_copy_from_repo_fn(artifact_id, version):
+def get_copy_from_repo_fn(artifact_id, version, manifest: Manifest = None):
     def copy_to_repo_fn(src, dst, *args, follow_symlinks=True):
         dst=pathlib.Path(dst)
         dst=str(dst.parent.joinpath(from_repo_file_name(dst.name, artifact_id, version)))
-        return shutil.copy2(src, dst, *args, follow_symlinks=follow_symlinks)
+        if manifest is not None:
+            return copy_with_manifest(src, dst, manifest, follow_symlinks=follow_symlinks)
+        return materialize_file(src, dst, follow_symlinks=follow_symlinks)
     return copy_to_repo_fn
 
 
-def get_copy_to_repo_fn(artifact_id, version):
+def get_copy_to_repo_fn(artifact_id, version, manifest: Manifest = None):
     def copy_to_repo_fn(src, dst, *args, follow_symlinks=True):
         dst=pathlib.Path(dst)
         dst=str(dst.parent.joinpath(to_repo_file_name(dst.name, artifact_id, version)))
+        if manifest is not None:
+            manifest.update(dst, check.copy_file(src, dst, (manifest_algorithm,))[manifest_algorithm])
+            return dst
         return shutil.copy2(src, dst, *args, follow_symlinks=follow_symlinks)
     return copy_to_repo_fn
 
 
+def list_local_repo_versions(group_id: str, artifact_id: str) -> List[str]:
+    """
+    :return: all versions of a component that have been completely installed or downloaded into the local repository,
+        other folders under the artifact folder are ignored.
+    """
+    artifact_folder=os.path.dirname(get_config_folder(root=settings.local_repo_path, group_id=group_id, artifact_id=artifact_id, version='_', instance_id=None))
+    if not os.path.isdir(artifact_folder):
+        return []
+    return [name for name in os.listdir(artifact_folder) if not filelock.is_auxiliary(name) and versions.is_version(name) and os.path.isfile(os.path.join(artifact_folder, name, component_completion_flag))]
+
+
 def from_local_repo(group_id: str, artifact_id: str, version: str, des_folder: str):
     local_repo_folder=get_config_folder(root=settings.local_repo_path, group_id=group_id, artifact_id=artifact_id, version=version, instance_id=None)
     from_local_repo_folder(local_repo_folder=local_repo_folder, artifact_id=artifact_id, version=version, des_folder=des_folder)
@@ -74,18 +98,27 @@ def from_local_repo_folder(local_repo_folder: str, artifact_id: str, version: st
     # if des.is_dir():
     #     shutil.rmtree(str(des))
     des.mkdir(exist_ok=True, parents=True)
-    shutil.copytree(local_repo_folder, des_folder, ignore=_ignore, copy_function=get_copy_from_repo_fn(artifact_id, version), dirs_exist_ok=True)
+    # the folder is not replaced by an install, download, or snapshot update meanwhile
+    with filelock.folder_lock(local_repo_folder):
+        manifest=Manifest.load(local_repo_folder)
+        shutil.copytree(local_repo_folder, des_folder, ignore=_ignore, copy_function=get_copy_from_repo_fn(artifact_id, version, manifest), dirs_exist_ok=True)
+        try:
+            manifest.save()
+        except OSError as e:
+            logger.warning(f'Cannot save the manifest of "{local_repo_folder}": {e}')
 
 
 def to_local_repo(group_id: str, artifact_id: str, version: str, config_folder: str):
     local_repo_folder=get_config_folder(root=settings.local_repo_path, group_id=group_id, artifact_id=artifact_id, version=version, instance_id=None)
     version, _=versions.version_info(version)
-    des=pathlib.Path(local_repo_folder)
-    if des.is_dir():
-        shutil.rmtree(str(des))
-    des.mkdir(exist_ok=True, parents=True)
-    shutil.copytree(config_folder, local_repo_folder, ignore=_ignore, copy_function=get_copy_to_repo_fn(artifact_id, version), dirs_exist_ok=True)
-    pathlib.Path(local_repo_folder).joinpath(component_completion_flag).touch()
+    with filelock.folder_lock(local_repo_folder):
+        # copied again as a whole, rather than resumed
+        staging_folder=filelock.get_staging_folder(local_repo_folder, resume=False)
+        manifest=Manifest(staging_folder)
+        shutil.copytree(config_folder, staging_folder, ignore=_ignore, copy_function=get_copy_to_repo_fn(artifact_id, version, manifest), dirs_exist_ok=True)
+        manifest.save()
+        pathlib.Path(staging_folder).joinpath(component_completion_flag).touch()
+        filelock.publish_folder(staging_folder, local_repo_folder)
 
 
 REMOTE_REPO_STATUS={
@@ -104,21 +137,85 @@ def from_remote_repo(group_id: str, artifact_id: str, version: str):
     from_remote_repo_to_folder(local_repo_folder=local_repo_folder, group_id=group_id, artifact_id=artifact_id, version=version)
 
 
-def from_remote_repo_to_folder(local_repo_folder: str, group_id: str, artifact_id: str, version: str):
-    version, (main_version, info, snapshot)=versions.version_info(version)
-    for repo in settings.repos:
-        remote_repo_url=repo.repo_url(group_id=group_id, artifact_id=artifact_id, version=version, is_snapshot=snapshot)
-        logger.info(f'Attempt to download {group_id}/{artifact_id}/{version} from `{remote_repo_url}`...')
-        try:
-            transfer.download_component(remote_repo_url, local_repo_folder)
-            logger.info(f'Successfully downloaded {group_id}/{artifact_id}/{version} from remote repository.')
+def from_remote_repo_to_folder(local_repo_folder: str, group_id: str, artifact_id: str, version: str, force: bool = False):
+    """
+    Download a component into `local_repo_folder`, unless another process has done it meanwhile (or `force`).
+
+    Only one process downloads a component at a time, the others wait for it and use its download.
+    The files are downloaded into a staging folder beside `local_repo_folder`, and moved into place only when complete.
+    """
+    with filelock.folder_lock(local_repo_folder):
+        if not force and check_config_file_existence(config_folder=local_repo_folder, config_file=None, artifact_id=artifact_id, version=version, check_completion=True)[0]:
+            logger.info(f'{group_id}/{artifact_id}/{version} has been downloaded by another process.')
             return
-        except PackageHttpException as e:
-            logger.warning(e.msg+'\n')
+        # the partial files of an interrupted download are resumed
+        staging_folder=filelock.get_staging_folder(local_repo_folder, resume=True)
+        _from_remote_repo_to_folder(staging_folder, group_id, artifact_id, version)
+        filelock.publish_folder(staging_folder, local_repo_folder)
+
+
+def _from_remote_repo_to_folder(local_repo_folder: str, group_id: str, artifact_id: str, version: str):
+    version, (main_version, info, snapshot)=versions.version_info(version)
+    repos=[repo for repo in settings.repos if (repo.snapshot if snapshot else repo.release).enable]
+    candidates=[(repo, repo.repo_url(group_id=group_id, artifact_id=artifact_id, version=version, is_snapshot=snapshot)) for repo in mirror.get_mirror_stats().rank(repos)]
+    logger.info(f'Attempt to download {group_id}/{artifact_id}/{version} from {len(candidates)} remote repositories...')
+    requester=transfer.get_requester()
+    remote_repo_url, response=mirror.probe(requester, candidates)
+    if remote_repo_url is not None:
+        logger.info(f'Downloading {group_id}/{artifact_id}/{version} from `{remote_repo_url}`...')
+        transfer.download_component_files(requester, remote_repo_url, local_repo_folder, response)
+        logger.info(f'Successfully downloaded {group_id}/{artifact_id}/{version} from remote repository.')
+        return
     raise PackageException(f'Failed to downloaded {group_id}/{artifact_id}/{version} from remote repository.')
 
 
-def to_remote_repo(session: Session, group_id: str, artifact_id: str, version: str, name: str, pwd: str, gpg=True, gpg_passphrase=None, gnupghome=None):
+# snapshots updated in this process, so that every instance of them is retrieved again, but only once
+updated_snapshots: Set[Tuple[str, str, str]] = set()
+refreshed_config_folders: Set[str] = set()
+
+
+def update_snapshot(group_id: str, artifact_id: str, version: str) -> bool:
+    """
+    Revalidate a snapshot downloaded into the local repository, if the update interval of its repository's snapshot policy has passed since the last check.
+    A check is a conditional request of the component file list, and the component is downloaded again only if it has changed.
+    Snapshots installed locally are never updated.
+
+    :return: whether the snapshot in the local repository has been updated in this process.
+    """
+    if (group_id, artifact_id, version) in updated_snapshots:
+        return True
+    local_repo_folder=get_config_folder(root=settings.local_repo_path, group_id=group_id, artifact_id=artifact_id, version=version, instance_id=None)
+    if not pathlib.Path(local_repo_folder).joinpath(component_completion_flag).exists():
+        return False
+    index=transfer.load_component_index(local_repo_folder)
+    if index is None:
+        return False
+    repo=next((repo for repo in settings.repos if repo.snapshot_url(group_id=group_id, artifact_id=artifact_id, version=version)==index['url']), None)
+    if repo is None or not repo.snapshot.enable:
+        return False
+    interval=repo.snapshot.update_interval()
+    if interval is None or time.time()-index.get('checked_at', 0)<interval:
+        return False
+
+    logger.info(f'Checking updates of {group_id}/{artifact_id}/{version}...')
+    with filelock.folder_lock(local_repo_folder):
+        latest=transfer.load_component_index(local_repo_folder)
+        if latest is not None and latest.get('checked_at')!=index.get('checked_at'):
+            # checked by another process while waiting for the lock, whose result is taken
+            updated=any(latest.get(key)!=index.get(key) for key in ('etag', 'last_modified', 'files'))
+        else:
+            try:
+                updated=transfer.revalidate_component(index['url'], local_repo_folder, index)
+            except PackageHttpException as e:
+                logger.warning(f'Cannot check updates of {group_id}/{artifact_id}/{version}, the local one is used. {e.msg}')
+                return False
+    if updated:
+        logger.info(f'{group_id}/{artifact_id}/{version} updated from remote repository.')
+        updated_snapshots.add((group_id, artifact_id, version))
+    return updated
+
+
+def to_remote_repo(session: 'Session', group_id: str, artifact_id: str, version: str, name: str, pwd: str, gpg=True, gpg_passphrase=None, gnupghome=None):
     local_repo_folder=get_config_folder(root=settings.local_repo_path, group_id=group_id, artifact_id=artifact_id, version=version, instance_id=None)
     version, _=versions.version_info(version)
     remote_repo_base_url=env.default_repo_base_url
@@ -127,17 +224,20 @@ def to_remote_repo(session: Session, group_id: str, artifact_id: str, version: s
     metas=[]
     for file_name in os.listdir(local_repo_folder):
         file=os.path.join(local_repo_folder, file_name)
-        if file_name!=component_completion_flag and os.path.isfile(file):
+        if file_name not in component_meta_files and os.path.isfile(file):
             ext=os.path.splitext(file)[1]
             if ext!='.asc':
                 original_file_name=from_repo_file_name(file_name, artifact_id, version)
                 assets.append((file, original_file_name))
                 logger.info(f'checking component: {file_name} added')
-                if gpg:
-                    gpg_file=file+'.asc'
-                    check.gpg(passphrase=gpg_passphrase, input_path=file, output_path=gpg_file, gnupghome=gnupghome)
-                    metas.append((gpg_file, original_file_name+'.asc'))
-                    logger.info(f'checking component: {file_name+".asc"} created and added')
+    if gpg and len(assets)>0:
+        # each signature is made by a separate gpg process, so they are made concurrently
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(assets), os.cpu_count() or 1)) as executor:
+            futures=[executor.submit(check.gpg, passphrase=gpg_passphrase, input_path=file, output_path=file+'.asc', gnupghome=gnupghome) for file, _ in assets]
+            for (file, original_file_name), future in zip(assets, futures):
+                future.result()
+                metas.append((file+'.asc', original_file_name+'.asc'))
+                logger.info(f'checking component: {os.path.basename(file)+".asc"} created and added')
 
     logger.info(f'Uploading {group_id}/{artifact_id}/{version} to remote repository...')
     try:
@@ -155,6 +255,12 @@ def to_remote_repo(session: Session, group_id: str, artifact_id: str, version: s
 
 
 def retrieve_config(group_id: str, artifact_id: str, version: str, config_folder: str, config_file: str = None, force_update: bool = False) -> Tuple[str, str]:
+    # processes sharing the working directory retrieve a config folder one at a time
+    with filelock.folder_lock(config_folder):
+        return _retrieve_config(group_id=group_id, artifact_id=artifact_id, version=version, config_folder=config_folder, config_file=config_file, force_update=force_update)
+
+
+def _retrieve_config(group_id: str, artifact_id: str, version: str, config_folder: str, config_file: str = None, force_update: bool = False) -> Tuple[str, str]:
     valid_config_file=None
     config_file_path=None
     default_config_file=None
@@ -162,9 +268,21 @@ def retrieve_config(group_id: str, artifact_id: str, version: str, config_folder
     local_repo_folder=None
 
     if force_update:
+        local_repo_folder=get_config_folder(root=settings.local_repo_path, group_id=group_id, artifact_id=artifact_id, version=version, instance_id=None)
         exists=False
         default_exists=False
         local_repo_exists=False
+    elif versions.version_info(version)[1][2] and config_folder not in refreshed_config_folders and update_snapshot(group_id=group_id, artifact_id=artifact_id, version=version):
+        # the snapshot in the local repository is updated, retrieve it into the working folder again, keeping the custom config file
+        refreshed_config_folders.add(config_folder)
+        local_repo_folder=get_config_folder(root=settings.local_repo_path, group_id=group_id, artifact_id=artifact_id, version=version, instance_id=None)
+        valid_config_file=config_file is not None and config_file.strip()!=''
+        if valid_config_file:
+            exists, config_file, config_file_path=check_config_file_existence(config_folder=config_folder, config_file=config_file)
+        else:
+            exists=False
+        default_exists=False
+        local_repo_exists=True
     else:
         valid_config_file=config_file is not None and config_file.strip()!=''
         if valid_config_file:
@@ -185,7 +303,7 @@ def retrieve_config(group_id: str, artifact_id: str, version: str, config_folder
 
     if not local_repo_exists:
         logger.info(f'Downloading {group_id}/{artifact_id}/{version} from remote repository...')
-        from_remote_repo_to_folder(local_repo_folder=local_repo_folder, group_id=group_id, artifact_id=artifact_id, version=version)
+        from_remote_repo_to_folder(local_repo_folder=local_repo_folder, group_id=group_id, artifact_id=artifact_id, version=version, force=force_update)
         logger.info(f'{group_id}/{artifact_id}/{version} successfully downloaded.')
         local_repo_exists, local_repo_config_file, local_repo_config_file_path=check_config_file_existence(config_folder=local_repo_folder, config_file=None, artifact_id=artifact_id, version=version, check_completion=True)
         if not local_repo_exists:
@@ -202,7 +320,7 @@ def retrieve_config(group_id: str, artifact_id: str, version: str, config_folder
     if valid_config_file:
         if not exists:
             logger.info(f'Copy default config file to {config_file_path}')
-            shutil.copy2(default_config_file_path, config_file_path)
+            shutil.copyfile(default_config_file_path, config_file_path)
             exists, config_file, config_file_path=check_config_file_existence(config_folder=config_folder, config_file=config_file)
             if not exists:
                 raise PackageException(f'Cannot copy default config file to {config_file}.')
@@ -1,15 +1,24 @@
 # -*- coding: utf-8 -*-
 import base64
 
-import requests
 import uuid
-import json
 import os
+import time
+import logging
 import datetime
 
+from typing import Callable, Dict, Iterator, List, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+
 from . import encrypt
+from . import filelock
 from .error import PackageException, PackageHttpException, PackageServiceException
-from ..util.jsons import JsonEncoder
+from ..util import jsons
+
+
+logger=logging.getLogger('[ConCopilot]')
 
 
 def get_c():
@@ -20,35 +29,119 @@ def get_c():
     }
 
 
-def request_post(session: requests.Session, url, b, c=None):
+def request_post(session: 'requests.Session', url, b, c=None):
     if c is None:
         c=get_c()
     return send(session=session, method='post', url=url, b=b, c=c, headers=None, files=None, auth=None)
 
 
-def request_upload(session: requests.Session, url, b, assets, metas, auth):
+upload_chunk_size=1024*1024
+
+
+class MultipartEncoder:
+    """
+    A `multipart/form-data` request body read lazily, so that files are streamed from the disk instead of being loaded into memory.
+
+    The total length is computed from the file sizes beforehand, so the body is sent with a `Content-Length` instead of chunked.
+    """
+
+    def __init__(self, fields: List[Tuple[str, str]], files: List[Tuple[str, str, str]], progress: Callable[[int], None] = None):
+        """
+        :param fields: the (name, value) pairs of the form fields.
+        :param files: the (name, file_name, file_path) triples of the files.
+        :param progress: called with the number of bytes each time a part of the body is read.
+        """
+        self.boundary: str = uuid.uuid4().hex
+        self.content_type: str = f'multipart/form-data; boundary={self.boundary}'
+        self.progress: Callable[[int], None] = progress
+        # each part is either bytes, or a file path to be read lazily
+        self._parts: List[Union[bytes, str]] = []
+        self._length=0
+        for name, value in fields:
+            self._add(self._part_header(name)+b'\r\n'+value.encode('utf8')+b'\r\n')
+        for name, file_name, file_path in files:
+            self._add(self._part_header(name, file_name)+b'Content-Type: application/octet-stream\r\n\r\n')
+            self._parts.append(file_path)
+            self._length+=os.path.getsize(file_path)
+            self._add(b'\r\n')
+        self._add(f'--{self.boundary}--\r\n'.encode('ascii'))
+        self._file=None
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        # percent-encoded as browsers do, so that a name never ends the quoted string or the header
+        return value.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+    def _part_header(self, name: str, file_name: str = None) -> bytes:
+        disposition=f'form-data; name="{self._quote(name)}"'
+        if file_name is not None:
+            disposition+=f'; filename="{self._quote(file_name)}"'
+        return f'--{self.boundary}\r\nContent-Disposition: {disposition}\r\n'.encode('utf8')
+
+    def _add(self, data: bytes):
+        if self._parts and isinstance(self._parts[-1], bytes):
+            self._parts[-1]+=data
+        else:
+            self._parts.append(data)
+        self._length+=len(data)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self) -> Iterator[bytes]:
+        # iterated instead of read, since `http.client` reads file-like bodies in blocks of only 8 KB
+        while chunk:=self._read(upload_chunk_size):
+            yield chunk
+
+    def _read(self, size: int) -> bytes:
+        chunks=[]
+        while size>0 and (self._parts or self._file is not None):
+            if self._file is None and isinstance(self._parts[0], str):
+                self._file=open(self._parts.pop(0), 'rb')
+            if self._file is not None:
+                chunk=self._file.read(size)
+                if not chunk:
+                    self._file.close()
+                    self._file=None
+                    continue
+            else:
+                chunk=self._parts[0][:size]
+                self._parts[0]=self._parts[0][size:]
+                if not self._parts[0]:
+                    self._parts.pop(0)
+            chunks.append(chunk)
+            size-=len(chunk)
+        data=b''.join(chunks)
+        if self.progress is not None and data:
+            self.progress(len(data))
+        return data
+
+
+def request_upload(session: 'requests.Session', url, b, assets, metas, auth, progress: Callable[[int], None] = None):
     def append_file(files, key, file_info_list):
         for file_path, name in file_info_list:
-            with open(file_path, 'rb') as file:
-                file_data=file.read()
-            files.append([key, (name if name is not None else os.path.basename(file_path), file_data)])
+            files.append((key, name if name is not None else os.path.basename(file_path), file_path))
         return files
 
     c=get_c()
     files=[]
     append_file(files, 'assets', assets)
     append_file(files, 'metas', metas)
-    return send(session=session, method='post', url=url, b=b, c=c, headers=None, files=files, auth=auth)
+    encoder=MultipartEncoder(fields=[
+        ('b', jsons.dumps(b, ensure_ascii=False)),
+        ('c', jsons.dumps(c, ensure_ascii=False))
+    ], files=files, progress=progress)
+    return session.request(method='post', url=url, data=encoder, headers={'Content-Type': encoder.content_type}, auth=auth)
 
 
-def send(session: requests.Session, method, url, b, c, headers=None, files=None, auth=None):
+def send(session: 'requests.Session', method, url, b, c, headers=None, files=None, auth=None):
     return session.request(method=method, url=url, data={
-        'b': json.dumps(b, cls=JsonEncoder, ensure_ascii=False),
-        'c': json.dumps(c, cls=JsonEncoder, ensure_ascii=False)
+        'b': jsons.dumps(b, ensure_ascii=False),
+        'c': jsons.dumps(c, ensure_ascii=False)
     }, headers=headers, files=files, auth=auth)
 
 
-def request_public_key(session: requests.Session, url, captcha):
+def request_public_key(session: 'requests.Session', url, captcha):
     response=request_post(session=session, url=url, b={'captcha': captcha})
     if response.status_code==200:
         data=response.json()
@@ -60,7 +153,7 @@ def request_public_key(session: requests.Session, url, captcha):
         raise PackageHttpException(f'request_public_key encounter HTTP error with code {response.status_code}.', response.status_code)
 
 
-def login(session: requests.Session, base_url, name, pwd):
+def login(session: 'requests.Session', base_url, name, pwd):
     from . import captcha
 
     captcha_url=f'{base_url}/api/captcha?d={int(datetime.datetime.now().timestamp()*1000)}'
@@ -78,7 +171,7 @@ def login(session: requests.Session, base_url, name, pwd):
         raise PackageHttpException(f'login encounter HTTP error with code {response.status_code}.', response.status_code)
 
 
-def check_login(session: requests.Session, base_url):
+def check_login(session: 'requests.Session', base_url):
     response=session.post(base_url+'/api/checklogin')
     if response.status_code==200:
         data=response.json()
@@ -87,22 +180,127 @@ def check_login(session: requests.Session, base_url):
         raise PackageHttpException(f'check_login encounter HTTP error with code {response.status_code}.', response.status_code)
 
 
-class Auth(requests.auth.AuthBase):
-    def __init__(self, session: requests.Session, base_url: str, name: str, pwd: str):
-        super(Auth, self).__init__()
+class AuthSessionStore:
+    """
+    The login cookies of the repository users, kept in a file accessible by the owner only, so that later invocations reuse a login instead of logging in again.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+
+    @staticmethod
+    def get_key(base_url: str, name: str) -> str:
+        return f'{name}@{base_url.rstrip("/")}'
+
+    def _read(self) -> Dict[str, List[Dict]]:
+        try:
+            with open(self.path, 'rb') as file:
+                if os.name=='posix':
+                    stat=os.fstat(file.fileno())
+                    if stat.st_uid!=os.getuid() or stat.st_mode & 0o077:
+                        logger.warning(f'Login session file "{self.path}" is accessible by other users, ignored.')
+                        return {}
+                return jsons.loads(file.read())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f'Cannot read the login session file "{self.path}": {e}')
+            return {}
+
+    def _write(self, sessions: Dict[str, List[Dict]]):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+        tmp_path=f'{self.path}.{os.getpid()}.tmp'
+        # created with the owner permissions only, rather than restricted after the cookies are written
+        fd=os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf8') as file:
+                file.write(jsons.dumps(sessions))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load(self, session: 'requests.Session', base_url: str, name: str) -> bool:
+        """
+        Set the kept login cookies of the user `name` to `base_url` into `session`, except the expired ones.
+
+        :return: whether any cookie is set.
+        """
+        from requests.cookies import create_cookie
+
+        now=time.time()
+        count=0
+        for cookie in self._read().get(self.get_key(base_url, name), []):
+            if cookie.get('expires') is None or cookie['expires']>now:
+                session.cookies.set_cookie(create_cookie(**cookie))
+                count+=1
+        return count>0
+
+    def save(self, session: 'requests.Session', base_url: str, name: str):
+        cookies=[{
+            'name': cookie.name,
+            'value': cookie.value,
+            'domain': cookie.domain,
+            'path': cookie.path,
+            'secure': cookie.secure,
+            'expires': cookie.expires,
+            'rest': cookie._rest
+        } for cookie in session.cookies if not cookie.is_expired()]
+        try:
+            # concurrent invocations may save the logins of other users or repositories meanwhile
+            with filelock.FileLock(self.path+filelock.lock_suffix):
+                sessions=self._read()
+                sessions[self.get_key(base_url, name)]=cookies
+                self._write(sessions)
+        except OSError as e:
+            logger.warning(f'Cannot save the login session to "{self.path}": {e}')
+
+    def clear(self, base_url: str, name: str):
+        try:
+            with filelock.FileLock(self.path+filelock.lock_suffix):
+                sessions=self._read()
+                if sessions.pop(self.get_key(base_url, name), None) is not None:
+                    self._write(sessions)
+        except OSError as e:
+            logger.warning(f'Cannot clear the login session in "{self.path}": {e}')
+
+
+class Auth:
+    """
+    A `requests` authentication callable, which logs in before the request if the session has no login yet.
+
+    A login kept in the session, or restored from `store`, is not checked before each request:
+    it is trusted until the repository rejects a request as unauthorized, when the caller should `login` again and retry.
+    """
+
+    def __init__(self, session: 'requests.Session', base_url: str, name: str, pwd: str, store: AuthSessionStore = None):
         self.session=session
         self.base_url=base_url
         self.name=name
         self.pwd=pwd
+        self.store=store
+        if self.store is not None and len(self.session.cookies)==0:
+            self.store.load(self.session, self.base_url, self.name)
 
-    def __call__(self, r):
+    def login(self):
+        self.session.cookies.clear()
+        if self.store is not None:
+            # dropped first, so that a stale login is not restored again if logging in fails
+            self.store.clear(self.base_url, self.name)
         try:
-            if not check_login(self.session, self.base_url):
-                login(session=self.session, base_url=self.base_url, name=self.name, pwd=self.pwd)
-                r.prepare_cookies(self.session.cookies)
+            login(session=self.session, base_url=self.base_url, name=self.name, pwd=self.pwd)
         except PackageServiceException:
             raise PackageException('Authorization Failed! Please check your user name, password, and captcha.')
         except PackageHttpException as e:
             raise PackageHttpException(f'Authorization Failed! Service reture status code {e.http_code}. Please try again later.', e.http_code)
-        return r
+        if self.store is not None:
+            self.store.save(self.session, self.base_url, self.name)
 
+    def __call__(self, r):
+        if len(self.session.cookies)==0:
+            self.login()
+            # the cookies of the request were prepared before logging in
+            r.headers.pop('Cookie', None)
+            r.prepare_cookies(self.session.cookies)
+        return r
@@ -1,54 +1,466 @@
 # -*- coding: utf-8 -*-
 
 import os
-import requests
+import re
+import time
+import logging
 import pathlib
-import yaml
-import tqdm
 import urllib.parse
+import concurrent.futures
 
-from typing import List, Tuple
+from typing import Dict, List, Set, Tuple, Iterable, Optional, TYPE_CHECKING
 
+if TYPE_CHECKING:
+    import requests
+
+from . import check
 from . import request
-from .config import Settings, component_completion_flag
-from .error import PackageHttpException
+from . import profiler
+from .config import Settings, Env, component_completion_flag, component_index_file
+from .error import PackageException, PackageHttpException
+from .manifest import Manifest, manifest_algorithm
+from ..util import jsons
+
+
+logger=logging.getLogger('[ConCopilot]')
 
 
 settings=Settings()
+env=Env()
+
+
+unauthorized_upload_status='RepositoryCode.UNAUTHORIZED_UPLOAD'
+
+
+def upload_component(session: 'requests.Session', group_id: str, artifact_id: str, version: str, assets: List[Tuple[str, str]], metas: List[Tuple[str, str]], base_url: str, name: str, pwd: str):
+    """
+    Upload a component, reusing the login of `session`, or the one kept by a previous invocation if `settings.auth_session` is set.
+    The login is only renewed when the repository rejects the upload as unauthorized, and then the upload is retried once.
+    """
+    auth=request.Auth(session=session, base_url=base_url, name=name, pwd=pwd, store=request.AuthSessionStore(env.default_auth_session_path) if settings.auth_session else None)
+    response=_upload_component(session=session, group_id=group_id, artifact_id=artifact_id, version=version, assets=assets, metas=metas, base_url=base_url, auth=auth)
+    if is_unauthorized(response):
+        logger.info('Login session expired, logging in again...')
+        auth.login()
+        response=_upload_component(session=session, group_id=group_id, artifact_id=artifact_id, version=version, assets=assets, metas=metas, base_url=base_url, auth=auth)
+    return response
+
+
+def is_unauthorized(response: 'requests.Response') -> bool:
+    """
+    :return: whether the repository rejected a request for its login, by 401, or by a 200 response with the `UNAUTHORIZED_UPLOAD` status.
+    """
+    if response.status_code==401:
+        return True
+    if response.status_code==200:
+        try:
+            return response.json()['status']['des']==unauthorized_upload_status
+        except (ValueError, KeyError, TypeError):
+            return False
+    return False
+
+
+def _upload_component(session: 'requests.Session', group_id: str, artifact_id: str, version: str, assets: List[Tuple[str, str]], metas: List[Tuple[str, str]], base_url: str, auth: request.Auth):
+    import tqdm
+
+    total_length=sum(os.path.getsize(file_path) for file_path, _ in assets+metas)
+    with tqdm.tqdm(total=total_length, unit='B', unit_scale=True, unit_divisor=1024, desc=f'Uploading {group_id}/{artifact_id}/{version}: ') as t:
+        start=time.perf_counter()
+        response=request.request_upload(session=session, url=base_url+'/api/repo/upload', b={
+            'g': group_id,
+            'a': artifact_id,
+            'v': version
+        }, assets=assets, metas=metas, auth=auth, progress=t.update)
+        seconds=time.perf_counter()-start
+    logger.info(f'Uploaded {len(assets)+len(metas)} files ({t.n/1024/1024:.2f} MB) in {seconds:.2f}s, {t.n/1024/1024/max(seconds, 1e-6):.2f} MB/s.')
+    return response
+
+
+def new_session(pool_maxsize: int = 10) -> 'requests.Session':
+    """
+    :return: a new session keeping up to `pool_maxsize` connections alive per host, to be shared by concurrent downloads.
+    """
+    import requests
+
+    session=requests.Session()
+    adapter=requests.adapters.HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_download_session=None
+
 
+def get_download_session() -> 'requests.Session':
+    global _download_session
+    if _download_session is None:
+        _download_session=new_session(max(settings.download_workers, 10))
+    return _download_session
 
-def upload_component(session: requests.Session, group_id: str, artifact_id: str, version: str, assets: List[Tuple[str, str]], metas: List[Tuple[str, str]], base_url: str, name: str, pwd: str):
-    auth=request.Auth(session=session, base_url=base_url, name=name, pwd=pwd)
-    return request.request_upload(session=session, url=base_url+'/api/repo/upload', b={
-        'g': group_id,
-        'a': artifact_id,
-        'v': version
-    }, assets=assets, metas=metas, auth=auth)
+
+def get_requester() -> 'requests.Session':
+    return settings.network_session if settings.network_session else get_download_session()
+
+
+def load_component_index(local_repo_folder: str) -> Optional[Dict]:
+    """
+    :return: the index of a downloaded component, with the remote repository `url`, the `etag` and `last_modified` of its file list,
+        the `files`, and the time it was last `checked_at`. None if the component was not downloaded, e.g. installed locally.
+    """
+    try:
+        with open(os.path.join(local_repo_folder, component_index_file), 'r', encoding='utf8') as file:
+            return jsons.loads(file.read())
+    except (OSError, ValueError):
+        return None
+
+
+def save_component_index(local_repo_folder: str, index: Dict):
+    file_path=os.path.join(local_repo_folder, component_index_file)
+    tmp_file_path=f'{file_path}.{os.getpid()}.tmp'
+    with open(tmp_file_path, 'w', encoding='utf8') as file:
+        file.write(jsons.dumps(index, indent=2))
+    os.replace(tmp_file_path, file_path)
 
 
 def download_component(remote_repo_url, local_repo_folder):
-    requester=settings.network_session if settings.network_session else requests
+    requester=get_requester()
     response=requester.post(remote_repo_url)
     if response.status_code==200:
-        file_list=yaml.safe_load(response.text)
-        for file in file_list:
-            file_url=urllib.parse.urljoin(remote_repo_url+'/', pathlib.Path(file).name)
-            download_file(requester, file_url, local_repo_folder)
-        pathlib.Path(local_repo_folder).joinpath(component_completion_flag).touch()
+        download_component_files(requester, remote_repo_url, local_repo_folder, response)
     else:
         raise PackageHttpException(f'No such resources found in url `{remote_repo_url}`', http_code=response.status_code)
 
 
-def download_file(requester, url, folder):
+def revalidate_component(remote_repo_url, local_repo_folder, index: Dict) -> bool:
+    """
+    Check if a downloaded component has been changed in the remote repository with a conditional request, and download it again if so.
+
+    :param index: the index of the component, see `load_component_index`.
+    :return: whether the component has been updated.
+    """
+    headers={}
+    if index.get('etag'):
+        headers['If-None-Match']=index['etag']
+    if index.get('last_modified'):
+        headers['If-Modified-Since']=index['last_modified']
+    requester=get_requester()
+    response=requester.post(remote_repo_url, headers=headers)
+    # 412 is what a conditional POST gets instead of 304
+    not_modified=response.status_code in (304, 412) or (response.status_code==200 and index.get('etag') and response.headers.get('ETag')==index['etag'])
+    if not_modified:
+        index['checked_at']=time.time()
+        save_component_index(local_repo_folder, index)
+        return False
+    elif response.status_code==200:
+        pathlib.Path(local_repo_folder).joinpath(component_completion_flag).unlink(missing_ok=True)
+        download_component_files(requester, remote_repo_url, local_repo_folder, response, stale_files=index.get('files'))
+        return True
+    else:
+        raise PackageHttpException(f'Failed to check updates from url `{remote_repo_url}`', http_code=response.status_code)
+
+
+def download_component_files(requester, remote_repo_url, local_repo_folder, response, stale_files: Iterable[str] = None):
+    """
+    Download the files listed in `response` into `local_repo_folder`, and mark the component completed.
+
+    With `settings.archive_download`, the files are first requested as a single archive of the component, see `download_archive`.
+    Files not received that way are downloaded one by one.
+    When a previous version is in the folder (`stale_files` given) and `settings.delta_sync` is enabled,
+    the digest sidecar files are downloaded first, and the files still matching them are kept instead of being downloaded again.
+
+    :param stale_files: the files of a previously downloaded version, removed if they are not listed anymore.
+    """
+    import yaml
+
+    file_list=yaml.safe_load(response.text)
+    file_names=[pathlib.Path(file).name for file in file_list]
+    # digests are computed while downloading, for the manifest and for the sidecar files to be verified
+    algorithms={file_name: get_digest_algorithms(file_name, file_names) for file_name in file_names}
+    digests={}
+    with profiler.span('download', remote_repo_url):
+        if stale_files and settings.delta_sync:
+            sidecar_names=[file_name for file_name in file_names if pathlib.Path(file_name).suffix.lower() in digest_suffixes]
+            digests.update(download_files(requester, remote_repo_url, local_repo_folder, sidecar_names, algorithms))
+            unchanged=find_unchanged_files(local_repo_folder, [file_name for file_name in file_names if file_name not in digests], file_names)
+            digests.update(unchanged)
+            logger.info(f'{len(unchanged)} of {len(file_names)-len(sidecar_names)} files of `{remote_repo_url}` unchanged, {len(file_names)-len(digests)} to download.')
+        elif settings.archive_download and len(file_names)>1:
+            digests.update(download_archive(requester, remote_repo_url, local_repo_folder, file_names, algorithms))
+        digests.update(download_files(requester, remote_repo_url, local_repo_folder, [file_name for file_name in file_names if file_name not in digests], algorithms))
+    for file_name in set(stale_files if stale_files else [])-set(file_names):
+        file_path=os.path.join(local_repo_folder, file_name)
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+    verify_digests(local_repo_folder, digests)
+    save_component_index(local_repo_folder, {
+        'url': remote_repo_url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'files': file_names,
+        'checked_at': time.time()
+    })
+    pathlib.Path(local_repo_folder).joinpath(component_completion_flag).touch()
+
+
+archive_suffix='.tar'
+# the origins (scheme and host) of the remote repositories without component archives, not to be requested again
+_archive_unsupported: Set[str] = set()
+
+
+def get_archive_url(remote_repo_url: str) -> str:
+    return remote_repo_url.rstrip('/')+archive_suffix
+
+
+def download_archive(requester, remote_repo_url, local_repo_folder, file_names: List[str], algorithms: Dict[str, Tuple[str, ...]]) -> Dict[str, Dict[str, str]]:
+    """
+    Download the files of a component as one tar archive (optionally compressed) at "<component url>.tar", extracting them while it streams,
+    so that a component of many small files takes one request instead of one per file.
+
+    Only regular files listed in `file_names` are extracted, by their base names. Each one is written to a partial file renamed into place when complete.
+    Members with absolute paths or parent folder references are rejected.
+    A remote repository not serving the archive is remembered and not asked again in this process.
+
+    :return: the digests of the files extracted, which may be none or only some of them, e.g. if the stream was interrupted.
+    """
+    import tarfile
+    import requests
+
+    parsed=urllib.parse.urlparse(remote_repo_url)
+    origin=f'{parsed.scheme}://{parsed.netloc}'
+    if origin in _archive_unsupported:
+        return {}
+    wanted=set(file_names)
+    digests={}
+    try:
+        response=requester.get(get_archive_url(remote_repo_url), stream=True, headers={'Accept-Encoding': 'identity'})
+        with response:
+            if response.status_code!=200:
+                if response.status_code in (404, 405, 501):
+                    _archive_unsupported.add(origin)
+                logger.info(f'No component archive at `{origin}` (status code: {response.status_code}), downloading files one by one.')
+                return {}
+            os.makedirs(local_repo_folder, exist_ok=True)
+            with tarfile.open(fileobj=response.raw, mode='r|*') as archive:
+                for member in archive:
+                    path=pathlib.PurePosixPath(member.name)
+                    if path.is_absolute() or '..' in path.parts or '\\' in member.name:
+                        logger.warning(f'Unsafe member `{member.name}` in the component archive of `{remote_repo_url}`, skipped.')
+                        continue
+                    file_name=path.name
+                    if not member.isfile() or file_name not in wanted or file_name in digests:
+                        continue
+                    file_path=os.path.join(local_repo_folder, file_name)
+                    hashes=check.new_hashes(algorithms[file_name])
+                    source=archive.extractfile(member)
+                    # not resumable, since the archive cannot be requested from the middle of a file
+                    save_validator(file_path+partial_file_suffix, None)
+                    with open(file_path+partial_file_suffix, 'wb') as file:
+                        while chunk:=source.read(check.chunk_size):
+                            file.write(chunk)
+                            for h in hashes.values():
+                                h.update(chunk)
+                    os.replace(file_path+partial_file_suffix, file_path)
+                    digests[file_name]=check.hexdigests(hashes)
+    except (requests.RequestException, tarfile.TarError, OSError) as e:
+        logger.warning(f'Component archive of `{remote_repo_url}` failed after {len(digests)} files, the others are downloaded one by one: {e}')
+    logger.info(f'{len(digests)} of {len(file_names)} files extracted from the archive of `{remote_repo_url}`.')
+    return digests
+
+
+def download_files(requester, remote_repo_url, local_repo_folder, file_names: List[str], algorithms: Dict[str, Tuple[str, ...]]) -> Dict[str, Dict[str, str]]:
+    """
+    Download files of a component concurrently, by `settings.download_workers` threads.
+
+    :param algorithms: the digest algorithms to compute for each file, see `get_digest_algorithms`.
+    :return: the digests of each file.
+    """
+    file_urls=[urllib.parse.urljoin(remote_repo_url+'/', file_name) for file_name in file_names]
+    if settings.download_workers>1 and len(file_urls)>1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=settings.download_workers) as executor:
+            futures=[executor.submit(download_file, requester, file_url, local_repo_folder, algorithms[file_name]) for file_name, file_url in zip(file_names, file_urls)]
+            return {file_name: future.result() for file_name, future in zip(file_names, futures)}
+    else:
+        return {file_name: download_file(requester, file_url, local_repo_folder, algorithms[file_name]) for file_name, file_url in zip(file_names, file_urls)}
+
+
+def find_unchanged_files(folder: str, file_names: Iterable[str], remote_file_names: Iterable[str]) -> Dict[str, Dict[str, str]]:
+    """
+    Find the files in `folder` matching the digest sidecar files just downloaded beside them.
+    Digests recorded in the manifest are trusted for files unchanged since they were hashed, others are hashed again.
+    Files without any sidecar file in `remote_file_names` cannot be compared, and are never considered unchanged.
+
+    :return: the digests of the unchanged files, with the manifest algorithm and the algorithms of their sidecar files.
+    """
+    remote_file_names=set(remote_file_names)
+    manifest=Manifest.load(folder)
+    unchanged={}
+    for file_name in file_names:
+        file_path=os.path.join(folder, file_name)
+        sidecars={algorithm: file_path+suffix for suffix, algorithm in digest_suffixes.items() if file_name+suffix in remote_file_names}
+        if not sidecars or not os.path.isfile(file_path):
+            continue
+        file_digests={}
+        if manifest.is_unchanged(file_path):
+            file_digests[manifest_algorithm]=manifest.get(file_path)[manifest_algorithm]
+        missing=[algorithm for algorithm in (manifest_algorithm,)+tuple(sidecars) if algorithm not in file_digests]
+        if missing:
+            file_digests.update(check.hash_file(file_path, missing))
+        if all(os.path.isfile(sidecar) and check.read_digest(sidecar)==file_digests[algorithm] for algorithm, sidecar in sidecars.items()):
+            unchanged[file_name]=file_digests
+    return unchanged
+
+
+digest_suffixes={'.md5': 'md5', '.sha1': 'sha1', '.sha256': 'sha256', '.sha512': 'sha512'}
+
+
+def get_digest_algorithms(file_name: str, file_names: Iterable[str]) -> Tuple[str, ...]:
+    """
+    :return: the digest algorithms to compute for `file_name`: the manifest one, and those of its sidecar files in `file_names`, if any.
+        Nothing is computed for the sidecar files themselves.
+    """
+    suffix=pathlib.Path(file_name).suffix.lower()
+    if suffix in digest_suffixes or suffix=='.asc':
+        return ()
+    file_names=set(file_names)
+    return (manifest_algorithm,)+tuple(algorithm for suffix, algorithm in digest_suffixes.items() if file_name+suffix in file_names and algorithm!=manifest_algorithm)
+
+
+def verify_digests(folder: str, digests: Dict[str, Dict[str, str]]):
+    """
+    Verify the downloaded files against their sidecar files, and record them into the manifest of `folder`,
+    keeping the entries of the other files still in the folder, e.g. those left unchanged by a delta sync.
+    """
+    manifest=Manifest.load(folder)
+    manifest.discard_missing()
+    for file_name, file_digests in digests.items():
+        if not file_digests:
+            continue
+        file_path=os.path.join(folder, file_name)
+        for suffix, algorithm in digest_suffixes.items():
+            if algorithm in file_digests and os.path.isfile(file_path+suffix) and check.read_digest(file_path+suffix)!=file_digests[algorithm]:
+                os.remove(file_path)
+                raise PackageException(f'Downloaded file "{file_path}" is corrupted: its {algorithm} digest does not match "{file_name+suffix}".')
+        manifest.update(file_path, file_digests[manifest_algorithm])
+    manifest.save()
+
+
+min_chunk_size=64*1024
+max_chunk_size=4*1024*1024
+# the chunk size is doubled while a chunk takes less than this to arrive
+chunk_target_seconds=0.25
+partial_file_suffix='.part'
+# beside a partial file, the `ETag` or `Last-Modified` of the remote file it is a prefix of
+validator_file_suffix='.validator'
+
+content_range_pattern=re.compile(r'^\s*bytes\s+(\d+)-')
+
+
+def get_validator(response: 'requests.Response') -> Optional[str]:
+    """
+    :return: the strong `ETag` of a response, or its `Last-Modified`, to be sent as `If-Range`, since weak ETags are not allowed there.
+    """
+    etag=response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+
+def load_validator(partial_file_name: str) -> Optional[str]:
+    try:
+        with open(partial_file_name+validator_file_suffix, 'r', encoding='utf8') as file:
+            return file.read().strip() or None
+    except OSError:
+        return None
+
+
+def save_validator(partial_file_name: str, validator: Optional[str]):
+    if validator:
+        with open(partial_file_name+validator_file_suffix, 'w', encoding='utf8') as file:
+            file.write(validator)
+    elif os.path.exists(partial_file_name+validator_file_suffix):
+        os.remove(partial_file_name+validator_file_suffix)
+
+
+def is_range_from(response: 'requests.Response', offset: int) -> bool:
+    """
+    :return: whether a 206 response starts at `offset`, by its `Content-Range`.
+    """
+    match=content_range_pattern.match(response.headers.get('Content-Range', ''))
+    return match is not None and int(match.group(1))==offset
+
+
+def download_file(requester, url, folder, algorithms: Iterable[str] = ()) -> Dict[str, str]:
+    """
+    Download a file into `folder`.
+
+    The file is written to a "<file_name>.part" temporary file, and renamed into place only when it is complete.
+    If a partial file is left by an interrupted download, the download resumes from its end with an HTTP `Range` request,
+    conditioned by `If-Range` on the `ETag` or `Last-Modified` recorded with the partial file,
+    so that a remote file changed meanwhile is downloaded from the beginning instead of being appended to the old prefix.
+
+    :return: the hex digests of the file with `algorithms`, computed while downloading.
+    """
+    import tqdm
+
     file_name=os.path.basename(urllib.parse.urlparse(url).path)
     file_name=os.path.join(folder, file_name)
-    response=requester.get(url, stream=True)
-    total_length=int(response.headers.get('content-length'))
+    partial_file_name=file_name+partial_file_suffix
     if not os.path.exists(folder):
-        os.makedirs(folder)
-    with open(file_name, 'wb') as file:
-        with tqdm.tqdm(total=total_length, unit='B', unit_scale=True, unit_divisor=1024, desc=f'Downloading {file_name}: ') as t:
-            for chunk in response.iter_content(chunk_size=1024):
-                if chunk:
-                    file.write(chunk)
-                    t.update(len(chunk))
+        os.makedirs(folder, exist_ok=True)
+
+    offset=os.path.getsize(partial_file_name) if os.path.isfile(partial_file_name) else 0
+    validator=load_validator(partial_file_name) if offset>0 else None
+    # byte ranges and lengths only make sense for the raw content
+    headers={'Accept-Encoding': 'identity'}
+    if offset>0 and validator is not None:
+        headers['Range']=f'bytes={offset}-'
+        headers['If-Range']=validator
+    else:
+        # a partial file of unknown origin cannot be resumed safely
+        offset=0
+    response=requester.get(url, stream=True, headers=headers)
+    if response.status_code==416 or (response.status_code==206 and not is_range_from(response, offset)):
+        # the partial file is not smaller than the remote one, or the range is not the one requested, start over
+        response.close()
+        offset=0
+        response=requester.get(url, stream=True, headers={'Accept-Encoding': 'identity'})
+    if response.status_code==200:
+        offset=0
+    elif response.status_code!=206 or offset==0:
+        response.close()
+        raise PackageHttpException(f'Failed to download `{url}`', http_code=response.status_code)
+    if offset==0:
+        save_validator(partial_file_name, get_validator(response))
+
+    hashes=check.new_hashes(algorithms)
+    if offset>0 and len(hashes)>0:
+        # only the resumed partial file is read again
+        with open(partial_file_name, 'rb') as file:
+            while chunk:=file.read(check.chunk_size):
+                for h in hashes.values():
+                    h.update(chunk)
+
+    content_length=response.headers.get('content-length')
+    total_length=offset+int(content_length) if content_length is not None else None
+    with response, open(partial_file_name, 'ab' if offset>0 else 'wb') as file:
+        with tqdm.tqdm(total=total_length, initial=offset, unit='B', unit_scale=True, unit_divisor=1024, desc=f'Downloading {file_name}: ') as t:
+            chunk_size=min_chunk_size
+            while True:
+                start=time.perf_counter()
+                chunk=response.raw.read(chunk_size)
+                if not chunk:
+                    break
+                file.write(chunk)
+                for h in hashes.values():
+                    h.update(chunk)
+                t.update(len(chunk))
+                offset+=len(chunk)
+                if chunk_size<max_chunk_size and time.perf_counter()-start<chunk_target_seconds:
+                    chunk_size*=2
+
+    if total_length is not None and offset!=total_length:
+        raise PackageHttpException(f'Incomplete download of `{url}`: {offset} of {total_length} bytes received. Try again to resume it.', http_code=response.status_code)
+    os.replace(partial_file_name, file_name)
+    save_validator(partial_file_name, None)
+    return check.hexdigests(hashes)
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shlex
+import socket
+import signal
+import logging
+import threading
+import traceback
+
+from typing import Any, Callable, Dict, List, Tuple
+
+from . import mirror
+from .config import Settings
+from .error import PackageException
+from ..util import ClassDict, jsons
+
+
+logger=logging.getLogger('[ConCopilot]')
+
+
+settings=Settings()
+
+
+default_socket_file='conpack-warm.sock'
+# seconds between two checks of the finished children, while waiting for connections
+poll_interval=0.2
+
+
+def get_socket_path(socket_path: str = None) -> str:
+    return socket_path if socket_path else os.path.join(settings.working_directory, '.runtime', default_socket_file)
+
+
+def get_key(param: ClassDict, argv: List[str] = None) -> str:
+    """
+    :return: the key of a copilot to run, by its ("group-id", "artifact-id", "version") combination or its config file path,
+        and the extra arguments it is built with, since the same copilot built with different arguments may differ.
+    """
+    if param.group_id and param.artifact_id and param.version:
+        key=f'{param.group_id}/{param.artifact_id}/{param.version}'
+    elif param.config_file:
+        key=os.path.abspath(param.config_file)
+    else:
+        raise ValueError('Either a ("group-id", "artifact-id", "version") combination or a config file path should be provided.')
+    return f'{key} {shlex.join(str(arg) for arg in argv)}' if argv else key
+
+
+def check_platform():
+    if not hasattr(os, 'fork') or not hasattr(socket, 'AF_UNIX') or not hasattr(socket, 'send_fds'):
+        raise PackageException('The warm server requires a POSIX system with Python 3.9 or later.')
+
+
+def _send(conn: socket.socket, message: Dict):
+    try:
+        conn.sendall(jsons.dumpb(message)+b'\n')
+    except OSError:
+        pass
+
+
+class WarmServer:
+    """
+    A server keeping constructed copilots in memory, and forking a child process to run one for each `conpack run --warm`.
+
+    The child gets the stdin, stdout, and stderr of the client, passed through the Unix socket,
+    and shares the memory pages of the server copy-on-write,
+    so it starts without importing, resolving, or constructing anything.
+
+    The server is single-threaded on purpose, since forking a multi-threaded process is unsafe:
+    `serve` builds the copilots without prefetching or concurrent downloads, and waits for any probe thread left by the mirrors before forking.
+    """
+
+    def __init__(self, socket_path: str, build_fn: Callable[..., Any]):
+        self.socket_path: str = socket_path
+        self.build_fn: Callable[..., Any] = build_fn
+        self.plugins: Dict[str, Any] = {}
+        # pid -> the connection to report the exit code to
+        self.children: Dict[int, socket.socket] = {}
+
+    def preload(self, param: ClassDict, argv: List[str] = None):
+        key=get_key(param, argv)
+        if key not in self.plugins:
+            logger.info(f'Warming up {key}...')
+            self.plugins[key]=self.build_fn(param, *(argv if argv else []))
+            mirror.join_outrun_probes()
+        return self.plugins[key]
+
+    def serve(self):
+        check_platform()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        server=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        server.listen()
+        server.settimeout(poll_interval)
+        logger.info(f'Warm server listening on "{self.socket_path}" with {len(self.plugins)} copilots.')
+        try:
+            while True:
+                self.reap()
+                try:
+                    conn, _=server.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                try:
+                    self.handle(server, conn)
+                except Exception as e:
+                    logger.error(f'Warm server failed to handle a request: {e}')
+                    _send(conn, {'error': str(e)})
+                    conn.close()
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def handle(self, server: socket.socket, conn: socket.socket):
+        data, fds, _, _=socket.recv_fds(conn, 64*1024, 3)
+        try:
+            request=jsons.loads(data)
+            plugin=self.preload(ClassDict.convert(request['param']), request.get('argv'))
+        except BaseException:
+            for fd in fds:
+                os.close(fd)
+            raise
+
+        if threading.active_count()>1:
+            # e.g. started by a component, which may hold locks that the child would never see released
+            logger.warning(f'Forking with other threads running: {", ".join(thread.name for thread in threading.enumerate() if thread is not threading.current_thread())}.')
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid=os.fork()
+        if pid==0:
+            server.close()
+            conn.close()
+            self.run_child(plugin, request, fds)
+        for fd in fds:
+            os.close(fd)
+        self.children[pid]=conn
+        _send(conn, {'pid': pid})
+
+    @staticmethod
+    def run_child(plugin: Any, request: Dict, fds: List[int]):
+        code=0
+        try:
+            for i, fd in enumerate(fds):
+                os.dup2(fd, i)
+                os.close(fd)
+            os.chdir(request.get('cwd', '.'))
+            sys.argv=['conpack']+request.get('argv', [])
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            plugin.run()
+        except SystemExit as e:
+            code=e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+            code=1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def reap(self):
+        while self.children:
+            try:
+                pid, status=os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid==0:
+                return
+            conn=self.children.pop(pid, None)
+            if conn is not None:
+                _send(conn, {'exit': os.waitstatus_to_exitcode(status)})
+                conn.close()
+
+
+def run(param: ClassDict, socket_path: str = None, argv: List[str] = None) -> int:
+    """
+    Run a copilot in a child forked by the warm server, with the stdin, stdout, and stderr of this process.
+    `SIGINT` is forwarded to the child.
+
+    :return: the exit code of the child.
+    """
+    check_platform()
+    param=ClassDict(**param)
+    if param.config_file:
+        # the server resolves it from its own current directory
+        param.config_file=os.path.abspath(param.config_file)
+    client=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(get_socket_path(socket_path))
+    except OSError as e:
+        raise PackageException(f'Cannot connect to the warm server at "{get_socket_path(socket_path)}": {e}. Please start it by `conpack serve-warm`.')
+    with client:
+        socket.send_fds(client, [jsons.dumpb({'param': dict(param), 'cwd': os.getcwd(), 'argv': argv if argv else []})], [0, 1, 2])
+        pid=None
+        previous_handler=signal.getsignal(signal.SIGINT)
+
+        def forward(signum, frame):
+            if pid is not None:
+                os.kill(pid, signum)
+
+        signal.signal(signal.SIGINT, forward)
+        try:
+            for line in client.makefile('rb'):
+                message=jsons.loads(line)
+                if 'pid' in message:
+                    pid=message['pid']
+                elif 'exit' in message:
+                    return message['exit']
+                elif 'error' in message:
+                    raise PackageException(f'Warm server error: {message["error"]}')
+        finally:
+            signal.signal(signal.SIGINT, previous_handler)
+    raise PackageException('The warm server closed the connection unexpectedly.')
+
+
+def serve(params: List[Tuple[ClassDict, List[str]]], socket_path: str = None):
+    """
+    Construct the copilots of `params`, and serve them until interrupted.
+    Other copilots are constructed on their first run, and kept for the following ones.
+    """
+    from ..framework import run as framework_run
+    from ..framework.copilot import Copilot
+
+    def build(param: ClassDict, *args) -> Copilot:
+        plugin=framework_run.build(param, *args)
+        if not isinstance(plugin, Copilot):
+            raise ValueError('The specific component is not a Copilot object, and cannot be run.')
+        return plugin
+
+    # the children run in the current directories of the clients, where relative paths resolved by the copilots would be wrong
+    settings.working_directory=os.path.abspath(settings.working_directory)
+    # no thread is left running by the building, to be forked safely
+    settings.prefetch_workers=0
+    settings.download_workers=1
+    server=WarmServer(get_socket_path(socket_path), build_fn=build)
+    for param, argv in params:
+        server.preload(param, argv)
+    server.serve()
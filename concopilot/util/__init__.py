@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
-from .class_dict import ClassDict
+from .class_dict import ClassDict, ClassList, FrozenClassDict
 
 __all__=[
-    'ClassDict'
+    'ClassDict',
+    'ClassList',
+    'FrozenClassDict'
 ]
\ No newline at end of file
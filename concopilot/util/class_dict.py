@@ -1,17 +1,51 @@
 # -*- coding: utf-8 -*-
 
 import copy
+import weakref
+import threading
+import operator
 
-from typing import Sequence, Mapping, Any
+from typing import Sequence, Mapping, Iterator, Tuple, Any
 
 from . import dicts
 
 
+_leaf_types=frozenset({str, bytes, int, float, complex, bool, type(None)})
+
+
+def _is_container(obj: Any) -> bool:
+    return isinstance(obj, (Mapping, set)) or (isinstance(obj, Sequence) and not isinstance(obj, (str, bytes)))
+
+
+def _is_leaf_sequence(obj: Sequence) -> bool:
+    return all(map(_leaf_types.__contains__, map(type, obj))) or not any(map(_is_container, obj))
+
+
+def _needs_conversion(obj: Any) -> bool:
+    if type(obj) in _leaf_types:
+        return False
+    if isinstance(obj, (ClassDict, ClassList)):
+        return not ClassDict.is_converted(obj)
+    return _is_container(obj)
+
+
 class ClassDict(dict):
+    # The keys whose values are still waiting to be converted.
+    # A `None` means this ClassDict has not been marked as converted yet.
+    __pending=None
+    # The keys whose container values were assigned as they are after this ClassDict was marked,
+    # to be converted by the next `ClassDict.convert`.
+    __raw=None
+
     def __init__(self, **kwargs):
         super(ClassDict, self).__init__()
-        if len(kwargs)>0:
-            self.update(**ClassDict.convert(kwargs))
+        pending=set()
+        self._mark(pending)
+        for k, v in kwargs.items():
+            assert isinstance(k, str), 'key must be str'
+            super(ClassDict, self).__setitem__(k, v)
+            if _needs_conversion(v):
+                pending.add(k)
 
     def __getattr__(self, item):
         return self.get(item)
@@ -22,12 +56,68 @@ class ClassDict(dict):
     def __delattr__(self, item):
         del self[item]
 
+    def __getitem__(self, key):
+        if self.__pending and key in self.__pending:
+            return self._resolve(key)
+        return super(ClassDict, self).__getitem__(key)
+
     def __setitem__(self, key, value):
         assert isinstance(key, str), 'key must be str'
         super(ClassDict, self).__setitem__(key, value)
+        if self.__pending is not None:
+            self.__pending.discard(key)
+            if _needs_conversion(value):
+                if self.__raw is None:
+                    object.__setattr__(self, '_ClassDict__raw', set())
+                self.__raw.add(key)
+            elif self.__raw:
+                self.__raw.discard(key)
+
+    def __delitem__(self, key):
+        super(ClassDict, self).__delitem__(key)
+        if self.__pending:
+            self.__pending.discard(key)
+        if self.__raw:
+            self.__raw.discard(key)
+
+    def __iter__(self):
+        # overridden so that `dict(...)`, `{**...}`, and `dict.update` read the values through `__getitem__`, converting the pending ones
+        return super(ClassDict, self).__iter__()
+
+    def __eq__(self, other):
+        self._resolve_all()
+        return super(ClassDict, self).__eq__(other)
+
+    def __ne__(self, other):
+        self._resolve_all()
+        return super(ClassDict, self).__ne__(other)
+
+    __hash__=None
+
+    def __repr__(self):
+        self._resolve_all()
+        return super(ClassDict, self).__repr__()
+
+    def __or__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        result=self.copy()
+        result.update(other)
+        return result
+
+    def __ror__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        result=dict(other)
+        result.update(self)
+        return result
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
 
     def __getstate__(self):
-        return self.__dict__
+        return {k: v for k, v in self.__dict__.items() if k!='_ClassDict__lock'}
 
     def __setstate__(self, state):
         self.__dict__.update(state)
@@ -35,17 +125,88 @@ class ClassDict(dict):
     def __copy__(self):
         cls=self.__class__
         result=cls.__new__(cls)
+        result._mark()
         result.update(self)
         return result
 
     def __deepcopy__(self, memodict={}):
         cls=self.__class__
         result=cls.__new__(cls)
+        result._mark()
         memodict[id(self)]=result
         for k, v in self.items():
             setattr(result, copy.deepcopy(k, memodict), copy.deepcopy(v, memodict))
         return result
 
+    def _mark(self, pending: set = None) -> None:
+        object.__setattr__(self, '_ClassDict__pending', pending if pending is not None else set())
+
+    def _resolve(self, key: str) -> Any:
+        # locked, so that threads reading the same pending value get the same converted object,
+        # by a lock of this ClassDict only, created on its first resolving atomically by `dict.setdefault`
+        lock=self.__dict__.get('_ClassDict__lock')
+        if lock is None:
+            lock=self.__dict__.setdefault('_ClassDict__lock', threading.Lock())
+        with lock:
+            if key not in self.__pending:
+                return super(ClassDict, self).__getitem__(key)
+            value=ClassDict.convert(super(ClassDict, self).__getitem__(key), lazy=True)
+            super(ClassDict, self).__setitem__(key, value)
+            self.__pending.discard(key)
+            return value
+
+    def _resolve_all(self) -> None:
+        if self.__pending:
+            for key in list(self.__pending):
+                self._resolve(key)
+
+    def get(self, key, default=None):
+        if self.__pending and key in self.__pending:
+            return self._resolve(key)
+        return super(ClassDict, self).get(key, default)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key]=default
+        return self[key]
+
+    def pop(self, key, *args):
+        if self.__pending and key in self.__pending:
+            self._resolve(key)
+        if self.__raw:
+            self.__raw.discard(key)
+        return super(ClassDict, self).pop(key, *args)
+
+    def popitem(self):
+        self._resolve_all()
+        key, value=super(ClassDict, self).popitem()
+        if self.__raw:
+            self.__raw.discard(key)
+        return key, value
+
+    def clear(self):
+        super(ClassDict, self).clear()
+        if self.__pending:
+            self.__pending.clear()
+        if self.__raw:
+            self.__raw.clear()
+
+    def copy(self) -> dict:
+        self._resolve_all()
+        return super(ClassDict, self).copy()
+
+    def update(self, *args, **kwargs) -> None:
+        for k, v in dict(*args, **kwargs).items():
+            self[k]=v
+
+    def values(self):
+        self._resolve_all()
+        return super(ClassDict, self).values()
+
+    def items(self):
+        self._resolve_all()
+        return super(ClassDict, self).items()
+
     def hasattr(self, item):
         return item in self
 
@@ -66,17 +227,295 @@ class ClassDict(dict):
     def flatten(self, parent_key: str = '', sep: str = '.', keep_none: bool = False, keep_container_type: bool = False) -> dict[str, Any]:
         return dicts.flatten_dict(self, parent_key=parent_key, sep=sep, keep_none=keep_none, keep_container_type=keep_container_type)
 
+    def iter_flatten(self, parent_key: str = '', sep: str = '.', keep_none: bool = False, keep_container_type: bool = False) -> Iterator[Tuple[str, Any]]:
+        return dicts.iter_flatten_dict(self, parent_key=parent_key, sep=sep, keep_none=keep_none, keep_container_type=keep_container_type)
+
+    def path_index(self, sep: str = '.') -> dicts.PathIndex:
+        return dicts.PathIndex(self, sep=sep)
+
+    @staticmethod
+    def is_converted(obj: Any) -> bool:
+        """
+        Check if the input `obj` has already been marked as converted by `ClassDict.convert`,
+        so that converting it again costs nothing.
+
+        :param obj: the object to be checked.
+        :return: True if the object is a converted `ClassDict` or `ClassList`, otherwise False.
+        """
+        if isinstance(obj, ClassList):
+            return not obj._dirty
+        return isinstance(obj, ClassDict) and obj.__pending is not None and not obj.__raw
+
     @staticmethod
-    def convert(obj: Any) -> Any:
+    def convert(obj: Any, lazy: bool = False) -> Any:
+        """
+        Convert all Mappings in the input `obj` into ClassDicts.
+
+        Converted containers are marked, and will be returned directly if they are converted again.
+        Sequences whose items are not containers (e.g. numeric lists) are kept as they are without copy.
+
+        :param obj: the object to be converted.
+        :param lazy: if True, nested containers are converted only when they are first accessed.
+        :return: the converted object.
+        """
         if isinstance(obj, Mapping):
-            _obj=obj if isinstance(obj, ClassDict) else ClassDict()
-            items=[x for x in obj.items()] if isinstance(obj, ClassDict) else obj.items()
+            if isinstance(obj, ClassDict):
+                if obj.__pending is not None:
+                    if obj.__raw:
+                        # values assigned as they are since it was marked
+                        for k in obj.__raw:
+                            if lazy:
+                                obj.__pending.add(k)
+                            else:
+                                super(ClassDict, obj).__setitem__(k, ClassDict.convert(super(ClassDict, obj).__getitem__(k)))
+                        obj.__raw.clear()
+                    return obj
+                _obj=obj
+                items=[x for x in super(ClassDict, obj).items()]
+            else:
+                _obj=ClassDict()
+                items=obj.items()
+            pending=set()
+            _obj._mark(pending)
             for k, v in items:
-                _obj[k]=ClassDict.convert(v)
+                assert isinstance(k, str), 'key must be str'
+                if lazy:
+                    super(ClassDict, _obj).__setitem__(k, v)
+                    if _needs_conversion(v):
+                        pending.add(k)
+                else:
+                    super(ClassDict, _obj).__setitem__(k, ClassDict.convert(v))
             return _obj
+        elif isinstance(obj, ClassList) and not obj._dirty:
+            return obj
         elif isinstance(obj, Sequence) and not isinstance(obj, str) and not isinstance(obj, bytes):
-            return [ClassDict.convert(x) for x in obj]
+            if _is_leaf_sequence(obj):
+                return obj if isinstance(obj, list) else list(obj)
+            return ClassList(obj, lazy=lazy)
         elif isinstance(obj, set):
             return {ClassDict.convert(x) for x in obj}
         else:
             return obj
+
+
+class ClassList(list):
+    """
+    A list marked as converted by `ClassDict.convert`.
+
+    Items added into it are kept as they are, as in a list.
+    If any of them needs conversion, the list is no longer marked, and the next `ClassDict.convert` converts it again.
+    """
+    _dirty=False
+
+    def __init__(self, iterable=(), lazy: bool = False):
+        super(ClassList, self).__init__(ClassDict.convert(x, lazy=lazy) for x in iterable)
+
+    def _check(self, items) -> None:
+        if not self._dirty and any(map(_needs_conversion, items)):
+            self._dirty=True
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            value=list(value)
+            self._check(value)
+        else:
+            self._check((value,))
+        super(ClassList, self).__setitem__(key, value)
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def append(self, obj):
+        self._check((obj,))
+        super(ClassList, self).append(obj)
+
+    def insert(self, index, obj):
+        self._check((obj,))
+        super(ClassList, self).insert(index, obj)
+
+    def extend(self, iterable):
+        iterable=list(iterable)
+        self._check(iterable)
+        super(ClassList, self).extend(iterable)
+
+
+_interned_frozen_class_dicts=weakref.WeakValueDictionary()
+
+
+def _identical(a: Any, b: Any) -> bool:
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, tuple):
+        return len(a)==len(b) and all(map(_identical, a, b))
+    if isinstance(a, Mapping):
+        return a.keys()==b.keys() and all(_identical(v, b[k]) for k, v in a.items())
+    return a==b
+
+
+class FrozenClassDict(ClassDict):
+    """
+    An immutable and hashable ClassDict.
+
+    Nested Mappings are frozen into FrozenClassDicts, Sequences into tuples, and sets into frozensets.
+    Use `FrozenClassDict.freeze` to create one, so that identical fragments are shared across all frozen trees.
+    """
+
+    def __init__(self, mapping: Mapping = None, **kwargs):
+        super(ClassDict, self).__init__()
+        self._mark()
+        for k, v in (dict(mapping, **kwargs) if mapping is not None else kwargs).items():
+            assert isinstance(k, str), 'key must be str'
+            super(ClassDict, self).__setitem__(k, FrozenClassDict.freeze(v))
+
+    def __setattr__(self, key, value):
+        raise TypeError('FrozenClassDict is immutable')
+
+    def __delattr__(self, item):
+        raise TypeError('FrozenClassDict is immutable')
+
+    def __setitem__(self, key, value):
+        raise TypeError('FrozenClassDict is immutable')
+
+    def __delitem__(self, key):
+        raise TypeError('FrozenClassDict is immutable')
+
+    def __ior__(self, other):
+        raise TypeError('FrozenClassDict is immutable')
+
+    def __hash__(self):
+        h=self.__dict__.get('_FrozenClassDict__hash')
+        if h is None:
+            h=hash(frozenset(super(ClassDict, self).items()))
+            object.__setattr__(self, '_FrozenClassDict__hash', h)
+        return h
+
+    def __reduce__(self):
+        return self.__class__, (dict(super(ClassDict, self).items()),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memodict={}):
+        return self
+
+    def setdefault(self, key, default=None):
+        raise TypeError('FrozenClassDict is immutable')
+
+    def pop(self, key, *args):
+        raise TypeError('FrozenClassDict is immutable')
+
+    def popitem(self):
+        raise TypeError('FrozenClassDict is immutable')
+
+    def clear(self):
+        raise TypeError('FrozenClassDict is immutable')
+
+    def update(self, *args, **kwargs):
+        raise TypeError('FrozenClassDict is immutable')
+
+    def update_nested(self, other: Mapping):
+        raise TypeError('FrozenClassDict is immutable')
+
+    def replace(self, **kwargs) -> 'FrozenClassDict':
+        """
+        Create a new FrozenClassDict with the given fields replaced.
+
+        Fields not replaced are shared with this one without copy.
+
+        :param kwargs: the fields to be replaced.
+        :return: the new FrozenClassDict.
+        """
+        return FrozenClassDict._intern(FrozenClassDict(self, **kwargs))
+
+    def thaw(self) -> ClassDict:
+        """
+        :return: a mutable ClassDict deep copy of this FrozenClassDict.
+        """
+        return FrozenClassDict.thaw_obj(self)
+
+    @staticmethod
+    def _intern(frozen: 'FrozenClassDict') -> 'FrozenClassDict':
+        try:
+            key=frozenset(super(ClassDict, frozen).items())
+        except TypeError:
+            return frozen
+        interned=_interned_frozen_class_dicts.get(key)
+        if interned is not None and _identical(interned, frozen):
+            return interned
+        _interned_frozen_class_dicts[key]=frozen
+        return frozen
+
+    @staticmethod
+    def freeze(obj: Any) -> Any:
+        """
+        Freeze the input `obj` recursively.
+
+        Frozen Mappings are interned, so that identical fragments (e.g. `developers` and `licenses` of component configs)
+        are the same object across all frozen trees, and can be hashed in O(1) once hashed.
+
+        :param obj: the object to be frozen.
+        :return: the frozen object.
+        """
+        if isinstance(obj, FrozenClassDict):
+            return obj
+        elif isinstance(obj, Mapping):
+            return FrozenClassDict._intern(FrozenClassDict(obj))
+        elif isinstance(obj, Sequence) and not isinstance(obj, str) and not isinstance(obj, bytes):
+            frozen=tuple(FrozenClassDict.freeze(x) for x in obj)
+            return obj if type(obj) is tuple and all(map(operator.is_, frozen, obj)) else frozen
+        elif isinstance(obj, frozenset):
+            return obj
+        elif isinstance(obj, set):
+            return frozenset(FrozenClassDict.freeze(x) for x in obj)
+        else:
+            return obj
+
+    @staticmethod
+    def matches(frozen: Any, obj: Any) -> bool:
+        """
+        Check if freezing the input `obj` would give a value equal to `frozen`, without freezing it.
+
+        It walks `obj` once without creating any object, so that a frozen snapshot can be checked against its mutable origin
+        much more cheaply than being taken again.
+
+        :param frozen: the frozen object.
+        :param obj: the object to be checked.
+        :return: True if `FrozenClassDict.freeze(obj)` equals `frozen`, otherwise False.
+        """
+        if frozen is obj:
+            return True
+        if isinstance(frozen, FrozenClassDict):
+            if not isinstance(obj, Mapping) or len(obj)!=len(frozen):
+                return False
+            # the values of a ClassDict are read as they are, without converting the pending ones
+            for k, v in (dict.items(obj) if isinstance(obj, dict) else obj.items()):
+                if not (k in frozen and FrozenClassDict.matches(dict.__getitem__(frozen, k), v)):
+                    return False
+            return True
+        if isinstance(frozen, tuple):
+            if not isinstance(obj, Sequence) or isinstance(obj, (str, bytes)) or len(obj)!=len(frozen):
+                return False
+            return all(map(FrozenClassDict.matches, frozen, obj))
+        if isinstance(frozen, frozenset) and isinstance(obj, set):
+            return FrozenClassDict.freeze(obj)==frozen
+        return type(frozen) is type(obj) and frozen==obj
+
+    @staticmethod
+    def thaw_obj(obj: Any) -> Any:
+        """
+        Convert a frozen object back into a mutable one, with ClassDicts and lists.
+
+        :param obj: the object to be thawed.
+        :return: the thawed object.
+        """
+        if isinstance(obj, Mapping):
+            return ClassDict.convert({k: FrozenClassDict.thaw_obj(v) for k, v in obj.items()})
+        elif isinstance(obj, tuple):
+            return ClassDict.convert([FrozenClassDict.thaw_obj(x) for x in obj])
+        elif isinstance(obj, frozenset):
+            return {FrozenClassDict.thaw_obj(x) for x in obj}
+        else:
+            return obj
@@ -1,11 +1,55 @@
 # -*- coding: utf-8 -*-
 
 import os
-import yaml
+import time
+import marshal
+import hashlib
+import logging
+import threading
+import functools
 
 from ..class_dict import ClassDict
 
 
+logger=logging.getLogger('[ConCopilot]')
+
+
+@functools.lru_cache(maxsize=None)
+def get_yaml_loader():
+    try:
+        from yaml import CSafeLoader as YamlLoader
+    except ImportError:
+        from yaml import SafeLoader as YamlLoader
+    return YamlLoader
+
+
+class ConfigLoadStats:
+    def __init__(self):
+        self.files: int = 0
+        self.cache_hits: int = 0
+        self.seconds: float = 0.0
+        # configs are loaded by the prefetching threads concurrently
+        self._lock=threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.files=0
+            self.cache_hits=0
+            self.seconds=0.0
+
+    def add(self, files: int = 0, cache_hits: int = 0, seconds: float = 0.0):
+        with self._lock:
+            self.files+=files
+            self.cache_hits+=cache_hits
+            self.seconds+=seconds
+
+    def __str__(self):
+        return f'{self.files} config files loaded in {self.seconds*1000:.1f} ms ({self.cache_hits} from cache, YAML loader: {get_yaml_loader().__name__})'
+
+
+config_load_stats=ConfigLoadStats()
+
+
 def get_config_folder(root: str, group_id: str, artifact_id: str, version: str, instance_id=None) -> str:
     assert root is not None and len(root)>0
     assert group_id is not None and len(group_id)>0
@@ -17,6 +61,75 @@ def get_config_folder(root: str, group_id: str, artifact_id: str, version: str,
     return os.path.join(*dir_list)
 
 
-def read_config_file(config_file_path) -> ClassDict:
-    with open(config_file_path, 'r', encoding='utf8') as file:
-        return ClassDict.convert(yaml.safe_load(file))
+def load_yaml_file(file_path):
+    import yaml
+
+    with open(file_path, 'r', encoding='utf8') as file:
+        return yaml.load(file, Loader=get_yaml_loader())
+
+
+def load_yaml(content: bytes):
+    import yaml
+
+    return yaml.load(content.decode('utf8'), Loader=get_yaml_loader())
+
+
+def _load_cached_yaml_file(file_path, cache_folder):
+    # the cache holds only the plain data of the safe YAML loader, by `marshal` which never runs any code when loading,
+    # and is keyed by the content digest of the config file, so that an edit is never missed whatever its mtime and size
+    with open(file_path, 'rb') as file:
+        content=file.read()
+    digest=hashlib.sha256(content).hexdigest()
+    cache_file_path=os.path.join(cache_folder, hashlib.sha1(os.path.abspath(file_path).encode('utf8')).hexdigest()+'.marshal')
+    try:
+        with open(cache_file_path, 'rb') as file:
+            cached_digest, data=marshal.load(file)
+        if cached_digest==digest:
+            config_load_stats.add(cache_hits=1)
+            return data
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # a corrupted or truncated cache file may fail in many ways, it is parsed again instead
+        logger.warning(f'Ignoring the unreadable config cache "{cache_file_path}" of "{file_path}": {e!r}')
+        try:
+            os.remove(cache_file_path)
+        except OSError:
+            pass
+
+    data=load_yaml(content)
+    try:
+        cache=marshal.dumps((digest, data))
+    except ValueError:
+        # e.g. dates, which `marshal` does not support, the file is parsed on every load
+        return data
+    try:
+        os.makedirs(cache_folder, exist_ok=True)
+        # readable and writable by the owner only
+        os.chmod(cache_folder, 0o700)
+        tmp_file_path=f'{cache_file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_file_path, 'wb') as file:
+            file.write(cache)
+        os.replace(tmp_file_path, cache_file_path)
+    except OSError:
+        pass
+    return data
+
+
+def read_config_file(config_file_path, cache_folder=None) -> ClassDict:
+    """
+    Read a YAML config file into a ClassDict.
+
+    :param config_file_path: the config file path.
+    :param cache_folder: if provided, parsed configs are cached in this folder keyed by the file path and content digest,
+        so that an unchanged config file will not be parsed again.
+    :return: the config.
+    """
+    start=time.perf_counter()
+    if cache_folder:
+        data=_load_cached_yaml_file(config_file_path, cache_folder)
+    else:
+        data=load_yaml_file(config_file_path)
+    config=ClassDict.convert(data)
+    config_load_stats.add(files=1, seconds=time.perf_counter()-start)
+    return config
@@ -1,8 +1,16 @@
 # -*- coding: utf-8 -*-
 
 import re
+import functools
 
+from typing import Iterable, List, Tuple, Optional
 
+
+version_pattern=re.compile(r'^(\d+(?:\.\d+)*)(?:-([^`~!@#$%^&*()\[\]{}\\|;:\'",/?]+))?$')
+version_specifier_pattern=re.compile(r'^\s*(~=|==|!=|>=|<=|=|>|<)?\s*([^\s]+)\s*$')
+
+
+@functools.lru_cache(maxsize=4096)
 def version_info(version):
     if version[-9:].upper()=='-SNAPSHOT':
         version=version[:-9]+'-SNAPSHOT'
@@ -11,8 +19,7 @@ def version_info(version):
     else:
         ver=version
         snapshot=False
-    pattern=re.compile(r'^(\d+(?:\.\d+)*)(?:-([^`~!@#$%^&*()\[\]{}\\|;:\'",/?]+))?$')
-    if result:=pattern.match(ver):
+    if result:=version_pattern.match(ver):
         main_version, info=result.groups()
         return version, (main_version, info, snapshot)
     else:
@@ -27,3 +34,158 @@ def sort_versions(versions):
     version_info_list=[version_info(ver) for ver in versions]
     version_info_list.sort(key=key_fn)
     return version_info_list
+
+
+@functools.total_ordering
+class Version:
+    """
+    A parsed component version, such as "0.0.5", "1.2-beta", or "0.1.0-SNAPSHOT".
+
+    Versions are ordered by their numeric parts first (trailing zeros ignored),
+    then a version without extra info is greater than one with extra info (e.g. "1.0" > "1.0-beta"),
+    and a release is greater than a snapshot of the same version.
+    Use `Version.parse` to benefit from the parsing cache.
+    """
+
+    __slots__=('version', 'main_version', 'info', 'snapshot', 'release', '_key')
+
+    def __init__(self, version: str):
+        self.version, (self.main_version, self.info, self.snapshot)=version_info(version)
+        release=tuple(int(x) for x in self.main_version.split('.'))
+        self.release: Tuple[int, ...] = release
+        while len(release)>1 and release[-1]==0:
+            release=release[:-1]
+        self._key=(release, self.info is None, self.info if self.info else '', not self.snapshot)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def parse(version: str) -> 'Version':
+        return Version(version)
+
+    def __eq__(self, other):
+        if isinstance(other, str):
+            try:
+                other=Version.parse(other)
+            except ValueError:
+                return NotImplemented
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key==other._key
+
+    def __lt__(self, other):
+        if isinstance(other, str):
+            try:
+                other=Version.parse(other)
+            except ValueError:
+                return NotImplemented
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key<other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __str__(self):
+        return self.version
+
+    def __repr__(self):
+        return f'Version({self.version!r})'
+
+
+class VersionSpecifier:
+    """
+    A version range, such as ">=0.1,<0.3", "~=0.0.5", or "!=0.2.1".
+
+    Comma separated clauses must all be satisfied.
+    "~=X.Y" means ">=X.Y,<(X+1)", and "~=X.Y.Z" means ">=X.Y.Z,<X.(Y+1)".
+    Snapshots are not matched unless `allow_snapshot` is set or a clause mentions a snapshot version.
+    """
+
+    def __init__(self, specifier: str, allow_snapshot: bool = False):
+        self.specifier: str = specifier
+        self.clauses: List[Tuple[str, Version]] = []
+        for clause in specifier.split(','):
+            if not clause.strip():
+                continue
+            result=version_specifier_pattern.match(clause)
+            if not result:
+                raise ValueError(f'Illegal version specifier: `{specifier}`')
+            operator, version=result.groups()
+            try:
+                version=Version.parse(version)
+            except ValueError:
+                raise ValueError(f'Illegal version `{version}` in version specifier: `{specifier}`') from None
+            if operator=='~=':
+                if len(version.release)<2:
+                    raise ValueError(f'`~=` requires at least two version parts: `{specifier}`')
+                upper=version.release[:-2]+(version.release[-2]+1,)
+                self.clauses.append(('>=', version))
+                self.clauses.append(('<', Version.parse('.'.join(str(x) for x in upper))))
+            else:
+                # "=" is accepted as an alias of "=="
+                self.clauses.append((operator if operator and operator!='=' else '==', version))
+        if len(self.clauses)==0:
+            raise ValueError(f'Empty version specifier: `{specifier}`')
+        self.allow_snapshot: bool = allow_snapshot or any(version.snapshot for _, version in self.clauses)
+
+    def contains(self, version) -> bool:
+        version=version if isinstance(version, Version) else Version.parse(version)
+        if version.snapshot and not self.allow_snapshot:
+            return False
+        for operator, bound in self.clauses:
+            if operator=='==':
+                ok=version==bound
+            elif operator=='!=':
+                ok=version!=bound
+            elif operator=='>=':
+                ok=version>=bound
+            elif operator=='<=':
+                ok=version<=bound
+            elif operator=='>':
+                ok=version>bound
+            else:
+                ok=version<bound
+            if not ok:
+                return False
+        return True
+
+    def __contains__(self, version) -> bool:
+        return self.contains(version)
+
+    def select(self, versions: Iterable[str]) -> Optional[str]:
+        """
+        :param versions: the candidate versions, those not in a legal version format are ignored.
+        :return: the greatest candidate version satisfying this specifier, or None if there is none.
+        """
+        matched=[Version.parse(version) for version in versions if is_version(version) and self.contains(version)]
+        return max(matched).version if matched else None
+
+    def __str__(self):
+        return self.specifier
+
+    def __repr__(self):
+        return f'VersionSpecifier({self.specifier!r})'
+
+
+def is_version(version: str) -> bool:
+    """
+    Check if the input `version` is in a legal version format.
+    """
+    try:
+        version_info(version)
+        return True
+    except ValueError:
+        return False
+
+
+def is_version_specifier(version: str) -> bool:
+    """
+    Check if the input `version` is a version range instead of an exact version.
+    """
+    version=version.strip()
+    return ',' in version or version[:1] in ('~', '=', '!', '>', '<')
+
+
+@functools.lru_cache(maxsize=1024)
+def version_specifier(specifier: str) -> VersionSpecifier:
+    return VersionSpecifier(specifier)
@@ -1,23 +1,177 @@
 # -*- coding: utf-8 -*-
 
-from typing import Mapping, List, Tuple, Any
+from typing import Mapping, MutableMapping, Iterator, Iterable, List, Tuple, Dict, Union, Any
 
 
 def _flatten_dict_gen(d: Mapping, parent_key: str = '', sep: str = '.', keep_none: bool = False, keep_container_type: bool = False):
-    for k, v in d.items():
+    yield from _flatten_items_gen(d.items(), parent_key=parent_key, sep=sep, keep_none=keep_none, keep_container_type=keep_container_type)
+
+
+def _flatten_items_gen(items: Iterable[Tuple[Any, Any]], parent_key: str = '', sep: str = '.', keep_none: bool = False, keep_container_type: bool = False):
+    for k, v in items:
         new_key=parent_key+sep+str(k) if parent_key else k
         if isinstance(v, Mapping):
             if keep_container_type:
                 yield new_key, str(type(v))
-            yield from _flatten_dict_gen(v, parent_key=new_key, sep=sep, keep_none=keep_none, keep_container_type=keep_container_type)
+            yield from _flatten_items_gen(v.items(), parent_key=new_key, sep=sep, keep_none=keep_none, keep_container_type=keep_container_type)
         elif isinstance(v, (List, Tuple)):
             if keep_container_type:
                 yield new_key, str(type(v))
-            yield from _flatten_dict_gen({str(i): x for i, x in enumerate(v)}, parent_key=new_key, sep=sep, keep_none=keep_none, keep_container_type=keep_container_type)
+            yield from _flatten_items_gen(((str(i), x) for i, x in enumerate(v)), parent_key=new_key, sep=sep, keep_none=keep_none, keep_container_type=keep_container_type)
         else:
             if keep_none or v is not None:
                 yield new_key, v
 
 
+def iter_flatten_dict(d: Mapping, parent_key: str = '', sep: str = '.', keep_none: bool = False, keep_container_type: bool = False) -> Iterator[Tuple[str, Any]]:
+    """
+    Lazily iterate the (flattened_key, value) pairs of the input mapping `d`, without building the flattened dict.
+
+    List and tuple items are keyed by their indices.
+    """
+    return _flatten_dict_gen(d, parent_key=parent_key, sep=sep, keep_none=keep_none, keep_container_type=keep_container_type)
+
+
 def flatten_dict(d: Mapping, parent_key: str = '', sep: str = '.', keep_none: bool = False, keep_container_type: bool = False) -> dict[str, Any]:
     return dict(_flatten_dict_gen(d, parent_key=parent_key, sep=sep, keep_none=keep_none, keep_container_type=keep_container_type))
+
+
+def _restore_lists(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            obj[k]=_restore_lists(v)
+        if len(obj)>0 and all(isinstance(k, str) and k.isdigit() for k in obj.keys()):
+            indices=sorted(int(k) for k in obj.keys())
+            if indices==list(range(len(indices))) and all(str(i) in obj for i in indices):
+                return [obj[str(i)] for i in indices]
+    return obj
+
+
+def unflatten_dict(flat: Union[Mapping[str, Any], Iterable[Tuple[str, Any]]], sep: str = '.', restore_lists: bool = True) -> dict[str, Any]:
+    """
+    The inverse of `flatten_dict`.
+
+    :param flat: a flattened mapping, or an iterable of (flattened_key, value) pairs such as the output of `iter_flatten_dict`.
+    :param sep: the key separator used in flattening.
+    :param restore_lists: if True, nested dicts whose keys are exactly "0", "1", ..., "n-1" are restored into lists.
+    :return: the nested dict.
+    """
+    result={}
+    for key, value in (flat.items() if isinstance(flat, Mapping) else flat):
+        parts=str(key).split(sep)
+        node=result
+        for part in parts[:-1]:
+            child=node.get(part)
+            if not isinstance(child, dict):
+                child=node[part]={}
+            node=child
+        node[parts[-1]]=value
+    return _restore_lists(result) if restore_lists else result
+
+
+class PathIndex:
+    """
+    An index of all paths in a nested Mapping, with the same path format as `flatten_dict` produces.
+
+    Lookups and updates through the index cost O(1) (plus the size of the replaced subtree),
+    without re-flattening the whole tree.
+    The tree should be modified through the index only, otherwise call `refresh` on the modified path.
+    """
+
+    def __init__(self, d: MutableMapping, sep: str = '.'):
+        self.root: MutableMapping = d
+        self.sep: str = sep
+        self._nodes: Dict[str, Tuple[Union[MutableMapping, List], Union[str, int]]] = {}
+        self._children: Dict[str, List[str]] = {'': []}
+        self._index_children('', d)
+
+    def _join(self, parent_path: str, key: Any) -> str:
+        return parent_path+self.sep+str(key) if parent_path else str(key)
+
+    def _index_children(self, path: str, container: Any) -> None:
+        if isinstance(container, Mapping):
+            items=container.items()
+        elif isinstance(container, (List, Tuple)):
+            items=enumerate(container)
+        else:
+            return
+        children=self._children[path]
+        for k, v in items:
+            child_path=self._join(path, k)
+            self._nodes[child_path]=(container, k)
+            children.append(child_path)
+            if isinstance(v, (Mapping, List, Tuple)):
+                self._children[child_path]=[]
+                self._index_children(child_path, v)
+
+    def _drop(self, path: str) -> None:
+        for child_path in self._children.pop(path, ()):
+            self._drop(child_path)
+            del self._nodes[child_path]
+
+    def _parent_path(self, path: str) -> str:
+        parent_path, _, _=path.rpartition(self.sep)
+        return parent_path
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._nodes
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._nodes)
+
+    def __getitem__(self, path: str) -> Any:
+        container, key=self._nodes[path]
+        return container[key]
+
+    def __setitem__(self, path: str, value: Any) -> None:
+        if path in self._nodes:
+            container, key=self._nodes[path]
+            container[key]=value
+            self.refresh(path)
+        else:
+            parent_path=self._parent_path(path)
+            parent=self.root if parent_path=='' else self[parent_path]
+            if not isinstance(parent, MutableMapping):
+                raise KeyError(f'Cannot create `{path}`, the parent `{parent_path}` is not a mutable mapping.')
+            key=path[len(parent_path)+len(self.sep):] if parent_path else path
+            parent[key]=value
+            self._nodes[path]=(parent, key)
+            self._children[parent_path].append(path)
+            self.refresh(path)
+
+    def __delitem__(self, path: str) -> None:
+        container, key=self._nodes[path]
+        if not isinstance(container, MutableMapping):
+            raise KeyError(f'Cannot delete `{path}`, only mapping entries can be deleted.')
+        del container[key]
+        self._drop(path)
+        del self._nodes[path]
+        self._children[self._parent_path(path)].remove(path)
+
+    def get(self, path: str, default: Any = None) -> Any:
+        return self[path] if path in self._nodes else default
+
+    def refresh(self, path: str = '') -> None:
+        """
+        Re-index the subtree under `path` after it has been modified outside of this index.
+
+        :param path: the path of the modified subtree, empty for the whole tree.
+        """
+        self._drop(path)
+        value=self.root if path=='' else self[path]
+        if path=='' or isinstance(value, (Mapping, List, Tuple)):
+            self._children[path]=[]
+            self._index_children(path, value)
+
+    def leaves(self, keep_none: bool = False) -> Iterator[Tuple[str, Any]]:
+        """
+        Iterate all (path, value) pairs of the leaves, the same as `iter_flatten_dict`, but from the index.
+        """
+        for path, (container, key) in self._nodes.items():
+            if path not in self._children:
+                value=container[key]
+                if keep_none or value is not None:
+                    yield path, value
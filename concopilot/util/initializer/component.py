@@ -1,19 +1,65 @@
 # -*- coding: utf-8 -*-
 
 import os
-import sys
-import subprocess
+import copy
+import logging
+import threading
 import importlib
+import concurrent.futures
 
-from typing import Callable, Dict, Tuple, List, Sequence, Mapping, Any
+from typing import Callable, Dict, Tuple, List, Set, Mapping, Iterable, Iterator, Any
 from ..config.tool import get_config_folder, read_config_file
+from ..config import versions
+from . import requirement
 from ..class_dict import ClassDict
 from ...package import repo
+from ...package import profiler
 from ...package.config import Settings
+from ...package.error import PackageException
+from ...package.lock import component_key
+
+
+logger=logging.getLogger('[ConCopilot]')
 
 
 settings=Settings()
 
+# versions of each (group_id, artifact_id) that have been used in this process,
+# preferred when resolving version ranges so that shared dependencies resolve to one version.
+resolved_versions: Dict[Tuple[str, str], Set[str]] = {}
+
+
+def resolve_component_version(config: ClassDict) -> ClassDict:
+    """
+    Resolve a version range (e.g. ">=0.1,<0.3", "~=0.0.5") in `config.version` into an exact version.
+
+    Versions already used in this process are preferred, then the greatest matched version in the local repository.
+
+    :param config: the component reference config, with `group_id`, `artifact_id`, and `version`.
+    :return: the config itself if the version is exact, otherwise a copy with the resolved version.
+    """
+    key=(config.group_id, config.artifact_id)
+    if config.version is None or not versions.is_version_specifier(config.version):
+        if config.version is not None:
+            resolved_versions.setdefault(key, set()).add(config.version)
+        return config
+
+    specifier=versions.version_specifier(config.version)
+    version=specifier.select(resolved_versions.get(key, ()))
+    if version is None:
+        version=specifier.select(repo.list_local_repo_versions(config.group_id, config.artifact_id))
+    if version is None:
+        raise PackageException(f'No version of {config.group_id}/{config.artifact_id} satisfying `{config.version}` found in the local repository. Please install or run with an exact version first.')
+    resolved_versions.setdefault(key, set()).add(version)
+
+    config=copy.copy(config)
+    config.version=version
+    return config
+
+
+def get_config_cache_folder() -> str:
+    return os.path.join(settings.working_directory, '.runtime', '.cache', 'config') if settings.config_cache else None
+
 
 def get_component_config_file_path(config: ClassDict) -> Tuple[str, str, str]:
     if config.config_folder is not None and config.config_folder.strip()!='':
@@ -21,20 +67,95 @@ def get_component_config_file_path(config: ClassDict) -> Tuple[str, str, str]:
     else:
         config_folder=get_config_folder(os.path.join(settings.working_directory, '.runtime'), config.group_id, config.artifact_id, config.version, config.instance_id if config.instance_id is not None else '0')
 
-    config_file, config_file_path=repo.retrieve_config(group_id=config.group_id, artifact_id=config.artifact_id, version=config.version, config_folder=config_folder, config_file=config.config_file, force_update=False)
+    with profiler.span('retrieve_config', f'{config.group_id}/{config.artifact_id}/{config.version}'):
+        config_file, config_file_path=repo.retrieve_config(group_id=config.group_id, artifact_id=config.artifact_id, version=config.version, config_folder=config_folder, config_file=config.config_file, force_update=False)
 
     return config_folder, config_file, config_file_path
 
 
+def is_component_reference(config: Any) -> bool:
+    return isinstance(config, Mapping) and config.get('group_id') is not None and config.get('artifact_id') is not None and config.get('version') is not None
+
+
+def iter_component_references(config: Any) -> Iterator[ClassDict]:
+    """
+    Yield the component references (mappings with `group_id`, `artifact_id`, and `version`) nested in `config`.
+
+    A reference is not descended into, since its `config` is merged into the referenced component's config,
+    where its own children will be found.
+    """
+    if is_component_reference(config):
+        yield ClassDict.convert(config)
+    elif isinstance(config, Mapping):
+        for value in config.values():
+            yield from iter_component_references(value)
+    elif isinstance(config, (list, tuple)):
+        for value in config:
+            yield from iter_component_references(value)
+
+
+def prefetch_components(references: Iterable[ClassDict], max_workers: int = None) -> List[ClassDict]:
+    """
+    Discover the whole component tree under `references`, and retrieve the config folders of all components concurrently,
+    so that constructing the tree later will find every component locally instead of downloading them one by one.
+
+    Version ranges are resolved in the calling thread, so the shared `resolved_versions` is never raced.
+    Components sharing a (group_id, artifact_id, version) are retrieved one at a time, as they share a local repository folder.
+    A failed retrieval is only logged, and left to the construction to report.
+
+    :param references: the component references to start from.
+    :param max_workers: the number of threads, default to `settings.prefetch_workers`.
+    :return: the component configs retrieved.
+    """
+    max_workers=max_workers if max_workers else settings.prefetch_workers
+    if not max_workers or (settings.component_lock is not None and settings.component_lock.locked):
+        return []
+
+    discovered: Set[str] = set()
+    component_configs: List[ClassDict] = []
+    folder_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+
+    def fetch(reference: ClassDict) -> ClassDict:
+        with folder_locks[(reference.group_id, reference.artifact_id, reference.version)]:
+            config_folder, config_file, config_file_path=get_component_config_file_path(reference)
+        component_config=read_config_file(config_file_path, cache_folder=get_config_cache_folder())
+        return config_component_config_meta(component_config, config_folder, config_file, parent_config=reference)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures: Dict[concurrent.futures.Future, ClassDict] = {}
+
+        def submit(children: Iterable[ClassDict]):
+            for reference in children:
+                try:
+                    reference=resolve_component_version(reference)
+                except Exception as e:
+                    logger.warning(f'Failed to prefetch {reference.group_id}/{reference.artifact_id}/{reference.version}: {e}')
+                    continue
+                key=component_key(reference)
+                if key not in discovered:
+                    discovered.add(key)
+                    folder_locks.setdefault((reference.group_id, reference.artifact_id, reference.version), threading.Lock())
+                    futures[executor.submit(fetch, reference)]=reference
+
+        submit(references)
+        while futures:
+            done, _=concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                reference=futures.pop(future)
+                try:
+                    component_config=future.result()
+                except Exception as e:
+                    logger.warning(f'Failed to prefetch {reference.group_id}/{reference.artifact_id}/{reference.version}: {e}')
+                else:
+                    component_configs.append(component_config)
+                    submit(iter_component_references(component_config.config))
+    return component_configs
+
+
 def get_component_constructor(config: ClassDict) -> Callable[[Dict, ...], Any]:
-    if not settings.skip_setup and config.setup is not None and isinstance(config.setup, ClassDict) and config.setup.pip is not None and isinstance(config.setup.pip, List):
-        for package in config.setup.pip:
-            if isinstance(package, str):
-                package=[package]
-            elif not isinstance(package, Sequence):
-                raise ValueError('Unrecognized package: '+str(package))
-            subprocess.check_call([sys.executable, '-m', 'pip', 'install']+package+settings.pip_params)
-    return importlib.import_module(config.setup.package).constructor
+    requirement.setup_component(config)
+    with profiler.span('import', f'{config.group_id}/{config.artifact_id}/{config.version}'):
+        return importlib.import_module(config.setup.package).constructor
 
 
 def config_component_config_meta(component_config: ClassDict, config_folder: str, config_file: str, parent_config: ClassDict = None):
@@ -55,20 +176,42 @@ def config_component_config_meta(component_config: ClassDict, config_folder: str
 
 def construct_component(component_config, *args, **kwargs) -> Any:
     constructor=get_component_constructor(component_config)
-    return constructor(component_config, *args, **kwargs)
+    with profiler.span('construct', f'{component_config.group_id}/{component_config.artifact_id}/{component_config.version}'):
+        return constructor(component_config, *args, **kwargs)
 
 
 def get_component_config(config: ClassDict) -> ClassDict:
-    config_folder, config_file, config_file_path=get_component_config_file_path(config)
-    component_config=read_config_file(config_file_path)
+    lock=settings.component_lock
+    if lock is not None and lock.locked:
+        node=lock.resolve(config)
+        if config.version is not None and versions.is_version_specifier(config.version):
+            config=copy.copy(config)
+            config.version=node.version
+        config_folder, config_file=node.config_folder, node.config_file
+        config_file_path=os.path.join(config_folder, config_file)
+    else:
+        reference=config
+        config=resolve_component_version(config)
+        config_folder, config_file, config_file_path=get_component_config_file_path(config)
+    component_config=read_config_file(config_file_path, cache_folder=get_config_cache_folder())
+    if lock is not None and not lock.locked:
+        lock.record(reference, version=component_config.version, config_folder=config_folder, config_file=config_file, package=component_config.setup.package if component_config.setup else None)
     component_config=config_component_config_meta(component_config, config_folder, config_file, parent_config=config)
     return component_config
 
 
 def create_component(config: Mapping, *args, **kwargs) -> Any:
     config=ClassDict.convert(config)
-    component_config=get_component_config(config)
-    return construct_component(component_config, *args, **kwargs)
+    with profiler.span('component', f'{config.group_id}/{config.artifact_id}/{config.version}'):
+        component_config=get_component_config(config)
+        lock=settings.component_lock
+        if lock is None:
+            return construct_component(component_config, *args, **kwargs)
+        lock.enter(component_key(config))
+        try:
+            return construct_component(component_config, *args, **kwargs)
+        finally:
+            lock.exit()
 
 
 def create(config_folder: str = None, config_file: str = None, config_file_path: str = None, *args, **kwargs) -> Any:
@@ -78,6 +221,7 @@ def create(config_folder: str = None, config_file: str = None, config_file_path:
         config_folder, config_file=os.path.split(config_file_path)
     else:
         raise ValueError('Either (config_folder, config_file) or config_file_path should exist.')
-    component_config=read_config_file(config_file_path)
-    component_config=config_component_config_meta(component_config, config_folder, config_file, parent_config=None)
-    return construct_component(component_config, *args, **kwargs)
+    with profiler.span('component', config_file_path):
+        component_config=read_config_file(config_file_path, cache_folder=get_config_cache_folder())
+        component_config=config_component_config_meta(component_config, config_folder, config_file, parent_config=None)
+        return construct_component(component_config, *args, **kwargs)
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import site
+import hashlib
+import logging
+import sysconfig
+import subprocess
+import importlib
+import importlib.metadata
+
+from typing import Iterable, List, Tuple, Set, Sequence, Any
+
+from ..class_dict import ClassDict
+from ...package.config import Env, Settings
+from ...package.error import PackageException
+from ...package import profiler
+from ...package import filelock
+
+
+logger=logging.getLogger('[ConCopilot]')
+
+
+settings=Settings()
+env=Env()
+
+default_wheelhouse_folder='wheelhouse'
+pip_lock_file_prefix='pip-'
+# pip options followed by an index or a place to find packages
+index_options={'-i', '--index-url', '--extra-index-url', '-f', '--find-links', '--trusted-host'}
+
+requirement_name_pattern=re.compile(r'^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*$')
+
+# `setup.pip` entries known to be satisfied in this process
+satisfied_entries: Set[Tuple[str, ...]] = set()
+
+
+def get_pip_entries(component_config: ClassDict) -> List[Tuple[str, ...]]:
+    """
+    :return: the `setup.pip` entries of a component config, each as a tuple of pip install arguments.
+    """
+    if component_config.setup is None or not isinstance(component_config.setup, ClassDict) or component_config.setup.pip is None or not isinstance(component_config.setup.pip, List):
+        return []
+    entries=[]
+    for package in component_config.setup.pip:
+        if isinstance(package, str):
+            entries.append((package,))
+        elif isinstance(package, Sequence):
+            entries.append(tuple(str(x) for x in package))
+        else:
+            raise ValueError('Unrecognized package: '+str(package))
+    return entries
+
+
+def is_requirement_satisfied(requirement: str) -> bool:
+    """
+    Check a requirement specifier (e.g. "numpy>=1.24", "requests[socks]") against the installed distributions, without running pip.
+
+    URLs, paths, and anything that cannot be parsed are never considered satisfied.
+    """
+    try:
+        from packaging.requirements import Requirement, InvalidRequirement
+    except ImportError:
+        # without `packaging`, only bare distribution names can be checked
+        if result:=requirement_name_pattern.match(requirement):
+            return _installed_version(result.group(1)) is not None
+        return False
+
+    try:
+        req=Requirement(requirement)
+    except InvalidRequirement:
+        return False
+    if req.url:
+        return False
+    if req.marker is not None and not req.marker.evaluate():
+        return True
+    version=_installed_version(req.name)
+    if version is None or not req.specifier.contains(version, prereleases=True):
+        return False
+    for extra in req.extras:
+        for dependency in importlib.metadata.requires(req.name) or []:
+            dependency=Requirement(dependency)
+            if dependency.marker is not None and dependency.marker.evaluate({'extra': extra}) and not dependency.marker.evaluate({'extra': ''}):
+                dependency.marker=None
+                if not is_requirement_satisfied(str(dependency)):
+                    return False
+    return True
+
+
+def _installed_version(name: str) -> Any:
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def is_entry_satisfied(entry: Tuple[str, ...]) -> bool:
+    if entry in satisfied_entries:
+        return True
+    # entries with pip options (e.g. "-r", "--index-url") cannot be checked
+    return all(not x.startswith('-') and is_requirement_satisfied(x) for x in entry)
+
+
+def is_direct_entry(entry: Tuple[str, ...]) -> bool:
+    """
+    :return: whether a `setup.pip` entry refers to a URL or a local path (e.g. a wheel file, a source folder, or a requirements file),
+        whose content may change without changing the entry.
+    """
+    for i, x in enumerate(entry):
+        # the URLs of indexes are where to look the requirements up, not requirements themselves
+        if x.startswith('-') or (i>0 and entry[i-1] in index_options):
+            continue
+        if '://' in x or '@' in x or '/' in x or '\\' in x or x.startswith(('.', '~')) or x.endswith(('.whl', '.zip', '.tar.gz', '.txt')):
+            return True
+    return False
+
+
+def get_fingerprint(entries: Iterable[Tuple[str, ...]]) -> str:
+    """
+    The fingerprint of a set of `setup.pip` entries in the current Python environment.
+
+    The modification times of the site-packages folders, including the user one, are included,
+    so that installing or uninstalling any distribution invalidates the fingerprint.
+    """
+    h=hashlib.sha256()
+    h.update(sys.executable.encode('utf8'))
+    h.update(b'\0'.join(x.encode('utf8') for x in settings.pip_params))
+    for path in sorted({sysconfig.get_path('purelib'), sysconfig.get_path('platlib'), site.getusersitepackages()}):
+        h.update(path.encode('utf8'))
+        if os.path.isdir(path):
+            h.update(str(os.stat(path).st_mtime_ns).encode('utf8'))
+    for entry in sorted(set(entries)):
+        h.update(b'\0'.join(x.encode('utf8') for x in entry)+b'\n')
+    return h.hexdigest()
+
+
+def get_fingerprint_file_path(fingerprint: str) -> str:
+    return os.path.join(settings.working_directory, '.runtime', '.cache', 'setup', fingerprint)
+
+
+def get_wheelhouse_args() -> List[str]:
+    """
+    :return: the pip arguments to install from `settings.wheelhouse` only, without looking up any index, or none if it is not set.
+    """
+    if not settings.wheelhouse:
+        return []
+    if not os.path.isdir(settings.wheelhouse):
+        raise PackageException(f'Wheelhouse "{settings.wheelhouse}" not found. Please collect it by `conpack wheelhouse` first.')
+    return ['--no-index', '--find-links', os.path.abspath(settings.wheelhouse)]
+
+
+def get_pip_lock_path() -> str:
+    """
+    :return: the lock file serializing pip installations into this Python environment, e.g. by the worker processes of `conpack install --jobs`,
+        in the lock folder of the user, keyed by the environment so that nothing is written into the environment itself.
+    """
+    key=hashlib.sha1(sys.prefix.encode('utf8')).hexdigest()[:16]
+    return os.path.join(env.default_lock_folder, f'{pip_lock_file_prefix}{key}.lock')
+
+
+def pip_install(args: List[str]):
+    # concurrent pip processes installing into the same site-packages may corrupt it
+    with filelock.FileLock(get_pip_lock_path()):
+        subprocess.check_call([sys.executable, '-m', 'pip', 'install']+args+get_wheelhouse_args()+settings.pip_params)
+
+
+def build_wheelhouse(component_configs: Iterable[ClassDict], wheelhouse: str):
+    """
+    Collect the wheels of the `setup.pip` requirements of a component tree, with their whole dependency closure, into the `wheelhouse` folder,
+    so that setting up the components later with `settings.wheelhouse` installs from it without any network access.
+
+    Plain requirements are collected by a single `pip wheel` invocation, and entries with pip options one by one.
+    The plain requirements are also listed in a "requirements.txt" file in the wheelhouse.
+
+    :param component_configs: the component configs of the tree.
+    :param wheelhouse: the folder to place the wheels in.
+    """
+    entries=list(dict.fromkeys(entry for component_config in component_configs for entry in get_pip_entries(component_config)))
+    os.makedirs(wheelhouse, exist_ok=True)
+    batch=[entry[0] for entry in entries if len(entry)==1 and not entry[0].startswith('-')]
+    # wheels already collected are reused instead of being downloaded again
+    args=['--wheel-dir', wheelhouse, '--find-links', wheelhouse]+settings.pip_params
+    if len(batch)>0:
+        subprocess.check_call([sys.executable, '-m', 'pip', 'wheel']+batch+args)
+    for entry in entries:
+        if not (len(entry)==1 and not entry[0].startswith('-')):
+            subprocess.check_call([sys.executable, '-m', 'pip', 'wheel']+list(entry)+args)
+    with open(os.path.join(wheelhouse, 'requirements.txt'), 'w', encoding='utf8') as file:
+        file.write(''.join(f'{requirement}\n' for requirement in batch))
+    logger.info(f'Wheels of {len(entries)} pip requirements collected into "{wheelhouse}".')
+
+
+def setup_components(component_configs: Iterable[ClassDict]):
+    """
+    Install the `setup.pip` requirements of a whole component tree at once.
+
+    Requirements already satisfied by the installed distributions are skipped,
+    plain requirements are installed by a single pip invocation, and entries with pip options are installed one by one.
+    A fingerprint of the requirements and the environment is recorded afterward,
+    so that the next start with the same requirements skips the checking entirely.
+    Entries of URLs or local paths are left out of the fingerprint, and passed to pip on every setup.
+
+    :param component_configs: the component configs of the tree.
+    """
+    if settings.skip_setup:
+        return
+
+    with profiler.span('setup'):
+        _setup_components(component_configs)
+
+
+def _setup_components(component_configs: Iterable[ClassDict]):
+    entries=list(dict.fromkeys(entry for component_config in component_configs for entry in get_pip_entries(component_config)))
+    if len(entries)==0:
+        return
+    # the content of URLs and local paths cannot be fingerprinted, only the other entries can be skipped
+    cached=[entry for entry in entries if not is_direct_entry(entry)]
+    if len(cached)>0 and os.path.isfile(get_fingerprint_file_path(get_fingerprint(cached))):
+        logger.info(f'{len(cached)} pip requirements unchanged since last setup, skipped.')
+        satisfied_entries.update(cached)
+        entries=[entry for entry in entries if entry not in satisfied_entries]
+        if len(entries)==0:
+            return
+
+    unsatisfied=[entry for entry in entries if not is_entry_satisfied(entry)]
+    logger.info(f'{len(entries)-len(unsatisfied)} of {len(entries)} pip requirements already satisfied.')
+    batch=[entry[0] for entry in unsatisfied if len(entry)==1 and not entry[0].startswith('-')]
+    if len(batch)>0:
+        pip_install(batch)
+    for entry in unsatisfied:
+        if not (len(entry)==1 and not entry[0].startswith('-')):
+            pip_install(list(entry))
+    if len(unsatisfied)>0:
+        importlib.invalidate_caches()
+    satisfied_entries.update(entries)
+
+    if len(cached)==0:
+        return
+    try:
+        fingerprint_file_path=get_fingerprint_file_path(get_fingerprint(cached))
+        os.makedirs(os.path.dirname(fingerprint_file_path), exist_ok=True)
+        with open(fingerprint_file_path, 'w', encoding='utf8') as file:
+            file.write('\n'.join(' '.join(entry) for entry in cached))
+    except OSError:
+        pass
+
+
+def setup_component(component_config: ClassDict):
+    """
+    Install the `setup.pip` requirements of one component, skipping the satisfied ones.
+    """
+    if settings.skip_setup:
+        return
+
+    with profiler.span('setup', f'{component_config.group_id}/{component_config.artifact_id}/{component_config.version}'):
+        for entry in get_pip_entries(component_config):
+            if not is_entry_satisfied(entry):
+                pip_install(list(entry))
+                importlib.invalidate_caches()
+            satisfied_entries.add(entry)
@@ -1,18 +1,148 @@
 # -*- coding: utf-8 -*-
 
+import os
+import sys
 import json
 import uuid
-import numpy as np
 
+from typing import IO, Iterator, Optional, Tuple, Union, Any
 
-class JsonEncoder(json.JSONEncoder):
-    def default(self, obj):
+try:
+    import orjson
+except ImportError:
+    orjson=None
+
+
+def _default(obj: Any) -> Any:
+    # numpy is never imported here: if it has not been imported elsewhere, `obj` cannot be a numpy object
+    np=sys.modules.get('numpy')
+    if np is not None:
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
         if isinstance(obj, np.integer):
             return int(obj)
         if isinstance(obj, np.floating):
             return float(obj)
-        if isinstance(obj, uuid.UUID):
-            return str(obj)
-        if isinstance(obj, set):
-            return self.default(list(obj))
-        return json.JSONEncoder.default(self, obj)
+        if isinstance(obj, np.bool_):
+            return bool(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, os.PathLike):
+        return os.fspath(obj)
+    raise TypeError(f'Object of type {obj.__class__.__name__} is not JSON serializable')
+
+
+class JsonEncoder(json.JSONEncoder):
+    def default(self, obj):
+        try:
+            return _default(obj)
+        except TypeError:
+            return json.JSONEncoder.default(self, obj)
+
+
+BACKENDS=('orjson', 'json')
+
+_backend: str = 'orjson' if orjson is not None else 'json'
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def set_backend(backend: str = None) -> None:
+    """
+    Select the JSON serialization backend.
+
+    :param backend: "orjson" for the C encoder, "json" for the standard library, or None to pick the fastest one installed.
+    """
+    global _backend
+    if backend is None:
+        _backend='orjson' if orjson is not None else 'json'
+    elif backend not in BACKENDS:
+        raise ValueError(f'Unknown JSON backend `{backend}`, must be one of {BACKENDS}.')
+    elif backend=='orjson' and orjson is None:
+        raise ValueError('JSON backend `orjson` is not installed. Install it by `pip install orjson`.')
+    else:
+        _backend=backend
+
+
+def _orjson_option(indent: int = None, sort_keys: bool = False) -> int:
+    option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    if indent:
+        option|=orjson.OPT_INDENT_2
+    if sort_keys:
+        option|=orjson.OPT_SORT_KEYS
+    return option
+
+
+def _use_orjson(ensure_ascii: bool, indent: int, separators: Tuple[str, str], allow_nan: bool) -> bool:
+    # orjson always writes UTF-8, only indents with 2 spaces, only writes its own separators, and writes NaN and infinities as null instead of raising
+    if _backend!='orjson' or ensure_ascii or indent not in (None, 2) or not allow_nan:
+        return False
+    return separators is None or tuple(separators)==((',', ': ') if indent else (',', ':'))
+
+
+def _orjson_dumpb(obj: Any, indent: int, sort_keys: bool) -> Optional[bytes]:
+    """
+    :return: the JSON of `obj` by orjson, or None if orjson cannot serialize it (e.g. integers beyond 64 bits), to be left to the standard library.
+    """
+    try:
+        return orjson.dumps(obj, default=_default, option=_orjson_option(indent, sort_keys))
+    except orjson.JSONEncodeError:
+        return None
+
+
+def dumps(obj: Any, ensure_ascii: bool = False, indent: int = None, sort_keys: bool = False, separators: Tuple[str, str] = None, allow_nan: bool = True) -> str:
+    """
+    Serialize `obj` into a JSON string with the selected backend.
+
+    NumPy arrays and scalars, UUIDs, sets, and path-like objects are supported besides the standard JSON types.
+
+    With the "orjson" backend, the output differs from the standard library only where no format is asked for:
+    without `indent` and `separators`, it is compact (`(',', ':')` separators), and NaN and infinities are written as null.
+    Explicit `separators` other than those of orjson, `allow_nan=False`, and objects orjson cannot serialize are left to the standard library.
+    """
+    if _use_orjson(ensure_ascii, indent, separators, allow_nan):
+        data=_orjson_dumpb(obj, indent, sort_keys)
+        if data is not None:
+            return data.decode('utf8')
+    return json.dumps(obj, cls=JsonEncoder, ensure_ascii=ensure_ascii, indent=indent, sort_keys=sort_keys, separators=separators, allow_nan=allow_nan)
+
+
+def dumpb(obj: Any, ensure_ascii: bool = False, indent: int = None, sort_keys: bool = False, separators: Tuple[str, str] = None, allow_nan: bool = True) -> bytes:
+    """
+    The same as `dumps`, but returns UTF-8 encoded bytes, which saves a decoding with the "orjson" backend.
+    """
+    if _use_orjson(ensure_ascii, indent, separators, allow_nan):
+        data=_orjson_dumpb(obj, indent, sort_keys)
+        if data is not None:
+            return data
+    return json.dumps(obj, cls=JsonEncoder, ensure_ascii=ensure_ascii, indent=indent, sort_keys=sort_keys, separators=separators, allow_nan=allow_nan).encode('utf8')
+
+
+def iterencode(obj: Any, ensure_ascii: bool = False, indent: int = None, sort_keys: bool = False, separators: Tuple[str, str] = None, allow_nan: bool = True) -> Iterator[str]:
+    """
+    Serialize `obj` incrementally, yielding the JSON string chunk by chunk,
+    so that a very large object is never materialized as one string.
+    """
+    return JsonEncoder(ensure_ascii=ensure_ascii, indent=indent, sort_keys=sort_keys, separators=separators, allow_nan=allow_nan).iterencode(obj)
+
+
+def dump(obj: Any, fp: IO[str], ensure_ascii: bool = False, indent: int = None, sort_keys: bool = False, separators: Tuple[str, str] = None, allow_nan: bool = True) -> None:
+    """
+    Serialize `obj` incrementally into the text stream `fp`.
+    """
+    for chunk in iterencode(obj, ensure_ascii=ensure_ascii, indent=indent, sort_keys=sort_keys, separators=separators, allow_nan=allow_nan):
+        fp.write(chunk)
+
+
+def loads(s: Union[str, bytes]) -> Any:
+    if _backend=='orjson':
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            # e.g. NaN, infinities, or integers beyond 64 bits, which the standard library accepts
+            pass
+    return json.loads(s)
@@ -8,3 +8,4 @@ class YamlDumper(yaml.SafeDumper):
 
 YamlDumper.add_representer(uuid.UUID, lambda dumper, data : dumper.represent_str(str(data)))
 YamlDumper.add_multi_representer(dict, YamlDumper.represent_dict)
+YamlDumper.add_multi_representer(list, YamlDumper.represent_list)
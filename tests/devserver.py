@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import time
+import hashlib
+import logging
+import argparse
+import tarfile
+import threading
+import http.server
+
+from typing import List, Optional, Set, Tuple
+
+from concopilot.package.config import component_meta_files, load_settings
+from concopilot.package.transfer import archive_suffix
+
+
+logger=logging.getLogger('[ConCopilot]')
+
+
+class DevRepoServer:
+    """
+    A stand-in remote repository serving a local repository folder, to test and benchmark downloading offline.
+
+    Components are served in the layout of the remote repositories, under both "/repository/snapshots" and "/repository/releases":
+    `POST <component url>` lists the files (with an `ETag`, honoring `If-None-Match`), `GET <component url>/<file>` gets a file,
+    and `GET <component url>.tar` streams all files as a single tar archive, unless `archive` is disabled.
+
+    Run `python -m tests.devserver` from the repository root to serve the local repository of the settings.
+    """
+
+    def __init__(self, root: str, host: str = '127.0.0.1', port: int = 0, archive: bool = True, latency: float = 0.0):
+        """
+        :param root: the local repository folder to serve.
+        :param port: the port to listen on, 0 for any free one.
+        :param archive: whether to serve the component archives, or only the files one by one.
+        :param latency: the seconds to delay each request, to emulate a distant repository.
+        """
+        self.root: str = os.path.abspath(root)
+        self.archive: bool = archive
+        self.latency: float = latency
+        self.requests: int = 0
+        # the files left out of the archives, to emulate an incomplete archive
+        self.archive_missing: Set[str] = set()
+        # the (member name, content) pairs put first into the archives, e.g. members with unsafe paths
+        self.archive_extra: List[Tuple[str, bytes]] = []
+        self._lock=threading.Lock()
+        self.httpd=http.server.ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads=True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port=self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def resolve(self, path: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        :return: the component folder and the file name (None for the component itself) of a request path, or (None, None) if it is not found.
+        """
+        parts=[part for part in path.split('?')[0].split('/') if part]
+        if len(parts)<5 or parts[0]!='repository' or parts[1] not in ('snapshots', 'releases') or any(part in ('.', '..') for part in parts):
+            return None, None
+        folder=os.path.join(self.root, *parts[2:])
+        if os.path.isdir(folder):
+            return folder, None
+        folder, file_name=os.path.split(folder)
+        if os.path.isdir(folder) and os.path.isfile(os.path.join(folder, file_name)) and file_name not in component_meta_files:
+            return folder, file_name
+        return None, None
+
+    @staticmethod
+    def list_files(folder: str) -> List[str]:
+        return sorted(name for name in os.listdir(folder) if name not in component_meta_files and os.path.isfile(os.path.join(folder, name)))
+
+    def etag(self, folder: str) -> str:
+        h=hashlib.sha1()
+        for name in self.list_files(folder):
+            stat=os.stat(os.path.join(folder, name))
+            h.update(f'{name}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode('utf8'))
+        return f'"{h.hexdigest()}"'
+
+    def _handler_class(self):
+        server=self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version='HTTP/1.1'
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _begin(self):
+                with server._lock:
+                    server.requests+=1
+                if server.latency>0:
+                    time.sleep(server.latency)
+
+            def _send(self, code: int, body: bytes = b'', headers: dict = None):
+                self.send_response(code)
+                for key, value in (headers if headers else {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self._begin()
+                if self.headers.get('Content-Length'):
+                    self.rfile.read(int(self.headers['Content-Length']))
+                folder, file_name=server.resolve(self.path)
+                if folder is None or file_name is not None:
+                    self._send(404)
+                    return
+                etag=server.etag(folder)
+                if self.headers.get('If-None-Match')==etag:
+                    self._send(304, headers={'ETag': etag})
+                    return
+                path=self.path.split('?')[0].rstrip('/')
+                body=''.join(f'- {path}/{name}\n' for name in server.list_files(folder)).encode('utf8')
+                self._send(200, body, {'ETag': etag, 'Content-Type': 'application/x-yaml'})
+
+            def do_GET(self):
+                self._begin()
+                path=self.path.split('?')[0]
+                if path.endswith(archive_suffix) and not server.resolve(path)[0]:
+                    folder, file_name=server.resolve(path[:-len(archive_suffix)])
+                    if folder is None or file_name is not None or not server.archive:
+                        self._send(404)
+                        return
+                    # streamed without a length, the connection is closed at its end
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/x-tar')
+                    self.send_header('Connection', 'close')
+                    self.end_headers()
+                    with tarfile.open(fileobj=self.wfile, mode='w|') as archive:
+                        for name, content in server.archive_extra:
+                            info=tarfile.TarInfo(name)
+                            info.size=len(content)
+                            archive.addfile(info, io.BytesIO(content))
+                        for name in server.list_files(folder):
+                            if name not in server.archive_missing:
+                                archive.add(os.path.join(folder, name), arcname=name)
+                    self.close_connection=True
+                    return
+                folder, file_name=server.resolve(path)
+                if folder is None or file_name is None:
+                    self._send(404)
+                    return
+                with open(os.path.join(folder, file_name), 'rb') as file:
+                    self._send(200, file.read(), {'Content-Type': 'application/octet-stream'})
+
+        return Handler
+
+    def start(self) -> 'DevRepoServer':
+        self._thread=threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__=='__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser=argparse.ArgumentParser(description='Serve a local repository folder as a remote repository, for testing and benchmarking offline.')
+    parser.add_argument('--root', type=str, default=None, help='the local repository folder, default to the one of the settings')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--no-archive', action='store_true', default=False, help='serve files one by one only, as repositories without component archives')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to delay each request')
+    args=parser.parse_args()
+    dev_server=DevRepoServer(args.root if args.root else load_settings().local_repo_path, host=args.host, port=args.port, archive=not args.no_archive, latency=args.latency)
+    logger.info(f'Serving "{dev_server.root}" at {dev_server.url}, component archives {"disabled" if args.no_archive else "enabled"}.')
+    try:
+        dev_server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from concopilot.package import transfer
+from concopilot.package.config import Settings, component_completion_flag
+
+from .devserver import DevRepoServer
+
+
+file_contents={f'prompt-{i}.txt': f'prompt {i}\n'.encode('utf8')*(i+1) for i in range(5)}
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    remote_folder=tmp_path/'remote'/'org'/'test'/'demo'/'0.1.0'
+    remote_folder.mkdir(parents=True)
+    for name, content in file_contents.items():
+        (remote_folder/name).write_bytes(content)
+    monkeypatch.setattr(Settings(), 'archive_download', True)
+    monkeypatch.setattr(Settings(), 'delta_sync', True)
+    # the repositories without archives are remembered per process
+    monkeypatch.setattr(transfer, '_archive_unsupported', set())
+    with DevRepoServer(str(tmp_path/'remote')) as server:
+        yield server
+
+
+def download(server, folder):
+    url=server.url+'/repository/releases/org/test/demo/0.1.0'
+    requester=transfer.new_session()
+    transfer.download_component_files(requester, url, str(folder), requester.post(url))
+    assert os.path.isfile(os.path.join(folder, component_completion_flag))
+    for name, content in file_contents.items():
+        with open(os.path.join(folder, name), 'rb') as file:
+            assert file.read()==content
+
+
+def test_archive(server, tmp_path):
+    download(server, tmp_path/'local')
+    # the file list and the archive
+    assert server.requests==2
+
+
+def test_fallback_to_files(server, tmp_path):
+    server.archive=False
+    download(server, tmp_path/'local')
+    assert server.requests==1+1+len(file_contents)
+    # not asked again
+    download(server, tmp_path/'local2')
+    assert server.requests==2*(1+1+len(file_contents))-1
+
+
+def test_files_missing_from_archive(server, tmp_path):
+    server.archive_missing={'prompt-1.txt', 'prompt-3.txt'}
+    download(server, tmp_path/'local')
+    assert server.requests==2+2
+
+
+def test_unsafe_member_paths(server, tmp_path):
+    local_folder=tmp_path/'local'/'inner'
+    server.archive_extra=[('../prompt-0.txt', b'evil'), ('/prompt-1.txt', b'evil'), ('a/../../prompt-2.txt', b'evil'), ('../../escaped.txt', b'evil')]
+    download(server, local_folder)
+    assert server.requests==2
+    assert sorted(os.listdir(tmp_path/'local'))==['inner']
+    assert not os.path.exists(tmp_path/'escaped.txt')
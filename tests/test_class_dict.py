@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+import threading
+
+from concopilot.util import ClassDict
+
+
+def test_lazy_value_resolved_once_across_threads():
+    for _ in range(20):
+        obj=ClassDict.convert({'a': {'b': [{'c': 1}]}}, lazy=True)
+        barrier=threading.Barrier(8)
+        results=[]
+
+        def read():
+            barrier.wait()
+            results.append(obj.a)
+
+        threads=[threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert all(result is obj.a for result in results)
+        assert obj.a.b[0].c==1
+
+
+def test_pickle_after_resolving():
+    obj=ClassDict.convert({'a': {'b': 1}}, lazy=True)
+    assert obj.a.b==1
+    restored=pickle.loads(pickle.dumps(obj))
+    assert restored==obj and restored.a.b==1
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import os
+import stat
+
+from concopilot.util.config import tool
+
+
+def test_same_size_edit_is_not_stale(tmp_path):
+    config_file=tmp_path/'config.yaml'
+    cache_folder=tmp_path/'cache'
+    config_file.write_text('name: aaa\n')
+    assert tool.read_config_file(str(config_file), str(cache_folder)).name=='aaa'
+    mtime_ns=os.stat(config_file).st_mtime_ns
+
+    # the same size and mtime, as an edit within the mtime granularity
+    config_file.write_text('name: bbb\n')
+    os.utime(config_file, ns=(mtime_ns, mtime_ns))
+    assert tool.read_config_file(str(config_file), str(cache_folder)).name=='bbb'
+
+
+def test_cache_hit_and_owner_only(tmp_path):
+    config_file=tmp_path/'config.yaml'
+    cache_folder=tmp_path/'cache'
+    config_file.write_text('name: aaa\nvalues: [1, 2]\n')
+    tool.read_config_file(str(config_file), str(cache_folder))
+    hits=tool.config_load_stats.cache_hits
+    assert tool.read_config_file(str(config_file), str(cache_folder))['values']==[1, 2]
+    assert tool.config_load_stats.cache_hits==hits+1
+    assert stat.S_IMODE(os.stat(cache_folder).st_mode)==0o700
+
+
+def test_unmarshallable_config_is_parsed(tmp_path):
+    config_file=tmp_path/'config.yaml'
+    config_file.write_text('date: 2024-01-01\n')
+    assert str(tool.read_config_file(str(config_file), str(tmp_path/'cache')).date)=='2024-01-01'
+    assert str(tool.read_config_file(str(config_file), str(tmp_path/'cache')).date)=='2024-01-01'
+
+
+def test_corrupted_cache_is_parsed(tmp_path):
+    config_file=tmp_path/'config.yaml'
+    cache_folder=tmp_path/'cache'
+    config_file.write_text('name: aaa\n')
+    tool.read_config_file(str(config_file), str(cache_folder))
+    for name in os.listdir(cache_folder):
+        (cache_folder/name).write_bytes(b'\x00garbage')
+    assert tool.read_config_file(str(config_file), str(cache_folder)).name=='aaa'
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import pathlib
+import multiprocessing
+
+from concopilot.package import repo, filelock
+from concopilot.package.config import Settings, component_completion_flag
+
+from .devserver import DevRepoServer
+
+
+process_count=8
+group_id='org.test'
+artifact_id='demo'
+version='0.1.0'
+file_names=[repo.to_repo_file_name('config.yaml', artifact_id, version)]+[repo.to_repo_file_name(f'prompt-{i}.txt', artifact_id, version) for i in range(10)]
+
+
+def configure(local_repo_path: str, url: str = None):
+    settings=Settings()
+    settings.local_repo_path=local_repo_path
+    settings.repos=[Settings.Repo(url, validate=False)] if url else []
+    # files one by one, so that the download lasts long enough for the others to wait
+    settings.archive_download=False
+
+
+def get_local_repo_folder(local_repo_path: str) -> str:
+    return repo.get_config_folder(root=local_repo_path, group_id=group_id, artifact_id=artifact_id, version=version, instance_id=None)
+
+
+def download(local_repo_path: str, url: str, start: float):
+    configure(local_repo_path, url)
+    time.sleep(max(start-time.time(), 0))
+    repo.from_remote_repo_to_folder(local_repo_folder=get_local_repo_folder(local_repo_path), group_id=group_id, artifact_id=artifact_id, version=version)
+
+
+def watch(local_repo_path: str, start: float, seconds: float, queue: multiprocessing.Queue):
+    """
+    Count the times a listed version is seen without all of its files, while the others download it.
+    """
+    configure(local_repo_path)
+    listed=0
+    partial=0
+    while time.time()<start+seconds:
+        for local_version in repo.list_local_repo_versions(group_id, artifact_id):
+            listed+=1
+            folder=get_local_repo_folder(local_repo_path)
+            if not all(os.path.isfile(os.path.join(folder, name)) for name in file_names):
+                partial+=1
+    queue.put((listed, partial))
+
+
+def test_single_flight_download(tmp_path):
+    remote_folder=tmp_path/'remote'/'org'/'test'/artifact_id/version
+    remote_folder.mkdir(parents=True)
+    for name in file_names:
+        (remote_folder/name).write_text(name)
+    local_repo_path=str(tmp_path/'repository')
+
+    context=multiprocessing.get_context('spawn')
+    queue=context.Queue()
+    with DevRepoServer(str(tmp_path/'remote'), latency=0.02) as server:
+        # started together once all processes are up
+        start=time.time()+3.0
+        processes=[context.Process(target=download, args=(local_repo_path, server.url, start)) for _ in range(process_count)]
+        processes.append(context.Process(target=watch, args=(local_repo_path, start, 2.0, queue)))
+        for process in processes:
+            process.start()
+        listed, partial=queue.get(timeout=60)
+        for process in processes:
+            process.join(timeout=60)
+            assert process.exitcode==0
+        requests=server.requests
+
+    # one listing and one request per file: only one process downloaded
+    assert requests==1+len(file_names)
+    assert listed>0 and partial==0
+    folder=get_local_repo_folder(local_repo_path)
+    assert set(file_names)<=set(os.listdir(folder))
+    assert os.path.isfile(os.path.join(folder, component_completion_flag))
+    assert sorted(name for name in os.listdir(os.path.dirname(folder)) if filelock.is_auxiliary(name))==[version+filelock.lock_suffix]
+
+
+def test_install_does_not_resume(tmp_path, monkeypatch):
+    monkeypatch.setattr(Settings(), 'local_repo_path', str(tmp_path/'repository'))
+    local_repo_folder=get_local_repo_folder(str(tmp_path/'repository'))
+    # left by an interrupted install
+    staging_folder=pathlib.Path(filelock.get_staging_folder(local_repo_folder, resume=True))
+    (staging_folder/'stale.txt').write_text('stale')
+    assert filelock.get_staging_folder(local_repo_folder, resume=True)==str(staging_folder) and (staging_folder/'stale.txt').is_file()
+
+    config_folder=tmp_path/'src'
+    config_folder.mkdir()
+    (config_folder/'config.yaml').write_text(f'group_id: {group_id}\nartifact_id: {artifact_id}\nversion: {version}\n')
+    repo.to_local_repo(group_id, artifact_id, version, str(config_folder))
+    assert 'stale.txt' not in os.listdir(local_repo_folder)
+    assert repo.list_local_repo_versions(group_id, artifact_id)==[version]
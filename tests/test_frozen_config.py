@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+from concopilot.framework.plugin.plugin import AbstractPlugin
+from concopilot.util.class_dict import FrozenClassDict
+
+
+class DummyPlugin(AbstractPlugin):
+    @property
+    def prompt(self):
+        return None
+
+
+DummyPlugin.__abstractmethods__=frozenset()
+
+
+def new_plugin():
+    return DummyPlugin({
+        'group_id': 'org.test',
+        'artifact_id': 'demo',
+        'version': '0.1.0',
+        'info': {'title': 'Demo'},
+        'commands': [{'command_name': 'run'}],
+        'config': {'values': [1, 2]}
+    })
+
+
+def test_config_stays_mutable():
+    plugin=new_plugin()
+    plugin.config.info.title='Changed'
+    plugin.config.commands.append({'command_name': 'stop'})
+    assert plugin.config.info.title=='Changed'
+    assert len(plugin.config.commands)==2
+
+
+def test_frozen_config_is_kept_until_modified():
+    plugin=new_plugin()
+    frozen=plugin.frozen_config
+    assert plugin.frozen_config is frozen
+
+    plugin.config.commands.append({'command_name': 'stop'})
+    plugin.config.config['values'].append(3)
+    modified=plugin.frozen_config
+    assert modified is not frozen
+    assert modified.commands[1].command_name=='stop'
+    assert modified.config['values']==(1, 2, 3)
+    assert plugin.frozen_config is modified
+
+
+def test_frozen_config_is_shared():
+    assert new_plugin().frozen_config.info is new_plugin().frozen_config.info
+
+
+def test_matches():
+    assert FrozenClassDict.matches(FrozenClassDict.freeze({'a': [1, {'b': 2}]}), {'a': [1, {'b': 2}]})
+    assert not FrozenClassDict.matches(FrozenClassDict.freeze({'a': [1, {'b': 2}]}), {'a': [1, {'b': 3}]})
+    assert not FrozenClassDict.matches(FrozenClassDict.freeze({'a': 1}), {'a': 1.0})
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import subprocess
+
+import pytest
+
+
+root_folder=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# dependencies of `conpack` only, which must not be imported by the framework
+heavy_modules=('requests', 'validators', 'yaml', 'tqdm', 'gnupg', 'Crypto', 'numpy')
+
+# the cumulative import time budgets in microseconds, loose enough for slow machines but far below the eager imports
+import_budgets={
+    'concopilot': 50_000,
+    'concopilot.util.jsons': 300_000,
+    'concopilot.framework.plugin': 1_000_000,
+}
+
+
+def import_times(module: str) -> dict:
+    """
+    :return: the cumulative import time in microseconds of every module imported by `import <module>` in a fresh interpreter, from the `-X importtime` output.
+    """
+    env=dict(os.environ)
+    env['PYTHONPATH']=os.pathsep.join([root_folder]+([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    result=subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], env=env, capture_output=True, text=True, check=True)
+    times={}
+    for line in result.stderr.splitlines():
+        match=re.match(r'^import time:\s+\d+\s+\|\s+(\d+)\s+\|\s+(.+)$', line)
+        if match:
+            times[match.group(2).strip()]=int(match.group(1))
+    return times
+
+
+@pytest.mark.parametrize('module', list(import_budgets))
+def test_no_heavy_imports(module):
+    times=import_times(module)
+    assert module in times
+    assert [name for name in heavy_modules if name in times]==[]
+
+
+@pytest.mark.parametrize('module,budget', list(import_budgets.items()))
+def test_import_time_budget(module, budget):
+    # the best of a few runs, to ignore a cold file system cache
+    assert min(import_times(module)[module] for _ in range(3))<=budget
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+
+import pytest
+
+from concopilot.package import repo, materialize
+from concopilot.package.manifest import Manifest, manifest_algorithm
+
+
+@pytest.mark.parametrize('mode', materialize.modes)
+def test_write_does_not_reach_repository(tmp_path, mode):
+    src=tmp_path/'repo.txt'
+    src.write_text('original')
+    dst=tmp_path/'runtime.txt'
+    materialize.materialize_file(str(src), str(dst), mode=mode)
+
+    with open(dst, 'a') as file:
+        file.write(' changed')
+    assert src.read_text()=='original'
+    assert dst.read_text()=='original changed'
+
+
+def test_hard_linked_runtime_file_is_replaced(tmp_path):
+    src=tmp_path/'repo.txt'
+    src.write_text('original')
+    dst=tmp_path/'runtime.txt'
+    # left by an earlier version placing hard links
+    os.link(src, dst)
+    materialize.materialize_file(str(src), str(dst), mode='auto')
+
+    dst.write_text('changed')
+    assert src.read_text()=='original'
+
+
+def test_write_through_runtime_folder(tmp_path):
+    local_repo_folder=tmp_path/'repository'/'demo'/'0.1.0'
+    local_repo_folder.mkdir(parents=True)
+    repo_file=local_repo_folder/repo.to_repo_file_name('prompt.txt', 'demo', '0.1.0')
+    repo_file.write_text('original')
+    # unchanged files listed in the manifest are materialized instead of copied
+    manifest=Manifest(str(local_repo_folder))
+    manifest.update(str(repo_file), hashlib.new(manifest_algorithm, b'original').hexdigest())
+    manifest.save()
+    runtime_folder=tmp_path/'.runtime'/'demo'
+
+    repo.from_local_repo_folder(local_repo_folder=str(local_repo_folder), artifact_id='demo', version='0.1.0', des_folder=str(runtime_folder))
+    with open(runtime_folder/'prompt.txt', 'w') as file:
+        file.write('changed')
+    assert repo_file.read_text()=='original'
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+import requests
+
+from concopilot.package import mirror
+from concopilot.package.config import Settings
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code=status_code
+
+
+class FakeRequester:
+    """
+    Answers each url after its delay, with its status code, or raises its exception.
+    """
+
+    def __init__(self, answers):
+        self.answers=answers
+
+    def post(self, url, timeout=None):
+        delay, answer=self.answers[url]
+        time.sleep(delay)
+        if isinstance(answer, Exception):
+            raise answer
+        return FakeResponse(answer)
+
+
+@pytest.fixture
+def stats_settings(tmp_path, monkeypatch):
+    settings=Settings()
+    monkeypatch.setattr(settings, 'local_repo_path', str(tmp_path))
+    monkeypatch.setattr(settings, 'mirror_hedge_delay', 0.05)
+    monkeypatch.setattr(mirror, '_mirror_stats', None)
+    return settings
+
+
+def candidates(*urls):
+    return [(Settings.Repo(url, validate=False), f'{url}/component') for url in urls]
+
+
+def test_outrun_probes_record_their_own_results(stats_settings):
+    requester=FakeRequester({
+        'http://hanging/component': (0.5, requests.Timeout('timed out')),
+        'http://slow/component': (0.5, 200),
+        'http://fast/component': (0.0, 200)
+    })
+    url, response=mirror.probe(requester, candidates('http://hanging', 'http://slow', 'http://fast'))
+    assert url=='http://fast/component'
+
+    stats=mirror.get_mirror_stats()
+    # the outrun probes are not recorded while still running
+    assert set(stats.stats)=={'http://fast'}
+    mirror.join_outrun_probes()
+    assert stats.stats['http://hanging']['failures']==1 and stats.stats['http://hanging']['successes']==0
+    assert stats.stats['http://slow']['successes']==1 and stats.stats['http://slow']['latency']>=0.5
+    assert [repo.url for repo in stats.rank([repo for repo, _ in candidates('http://hanging', 'http://slow', 'http://fast')])]==['http://fast', 'http://slow', 'http://hanging']
+
+    # saved once they ended
+    saved=mirror.MirrorStats.load(stats.file_path).stats
+    assert saved['http://hanging']['failures']==1 and saved['http://slow']['successes']==1
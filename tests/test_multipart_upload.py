@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import threading
+import http.server
+import email.parser
+import email.policy
+
+import pytest
+
+from concopilot.package import request, transfer
+
+
+class UploadServer:
+    """
+    A local stand-in of the upload API of a remote repository, recording the requests it receives.
+    """
+
+    def __init__(self):
+        self.requests=[]
+        server=self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version='HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body=self.rfile.read(int(self.headers['Content-Length']))
+                server.requests.append((dict(self.headers), body))
+                data=json.dumps({'status': {'code': 0}}).encode('utf8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd=http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url=f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        self.thread=threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def parse_multipart(headers, body):
+    message=email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(f'Content-Type: {headers["Content-Type"]}\r\n\r\n'.encode('ascii')+body)
+    assert message.is_multipart()
+    return [(part.get_param('name', header='content-disposition'), part.get_filename(), part.get_payload(decode=True)) for part in message.iter_parts()]
+
+
+@pytest.fixture
+def upload_files(tmp_path):
+    large=os.urandom(request.upload_chunk_size*2+12345)
+    (tmp_path/'model.bin').write_bytes(large)
+    (tmp_path/'model.bin.asc').write_bytes(b'signature')
+    return tmp_path, large
+
+
+def test_streamed_body(upload_files):
+    folder, large=upload_files
+    progress=[]
+    with UploadServer() as server:
+        response=request.request_upload(
+            session=transfer.new_session(),
+            url=server.url+'/api/repo/upload',
+            b={'g': 'org.test', 'a': 'demo', 'v': '0.1.0'},
+            assets=[(str(folder/'model.bin'), None)],
+            metas=[(str(folder/'model.bin.asc'), None)],
+            auth=None,
+            progress=progress.append
+        )
+    assert response.status_code==200
+
+    headers, body=server.requests[0]
+    assert 'Transfer-Encoding' not in headers
+    assert int(headers['Content-Length'])==len(body)==sum(progress)
+    # read in chunks instead of at once
+    assert len(progress)>1 and max(progress)<=request.upload_chunk_size
+
+    parts=parse_multipart(headers, body)
+    assert [(name, file_name) for name, file_name, _ in parts]==[('b', None), ('c', None), ('assets', 'model.bin'), ('metas', 'model.bin.asc')]
+    assert json.loads(parts[0][2])=={'g': 'org.test', 'a': 'demo', 'v': '0.1.0'}
+    assert parts[2][2]==large
+    assert parts[3][2]==b'signature'
+
+
+def test_quoted_names(tmp_path):
+    (tmp_path/'file').write_bytes(b'content')
+    encoder=request.MultipartEncoder(fields=[], files=[('assets', 'a"b\r\nX-Injected: 1.txt', str(tmp_path/'file'))])
+    body=b''.join(encoder)
+    assert len(body)==len(encoder)
+    parts=parse_multipart({'Content-Type': encoder.content_type}, body)
+    assert parts==[('assets', 'a%22b%0D%0AX-Injected: 1.txt', b'content')]
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+from concopilot.package.config import Env
+from concopilot.util.initializer import requirement
+
+
+def test_pip_lock_outside_environment():
+    path=requirement.get_pip_lock_path()
+    assert os.path.dirname(path)==Env().default_lock_folder
+    assert not os.path.abspath(path).startswith(os.path.abspath(sys.prefix)+os.sep)
+    assert requirement.get_pip_lock_path()==path
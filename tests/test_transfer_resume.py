@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import hashlib
+import threading
+import http.server
+
+import pytest
+
+from concopilot.package import transfer
+
+
+class RangeServer:
+    """
+    A local stand-in of a remote repository serving files with `ETag`, `Range`, and `If-Range` support.
+    """
+
+    def __init__(self):
+        self.files={}
+        self.requests=[]
+        # a wrong start to answer ranges with, to emulate a misbehaving server
+        self.range_shift=0
+        # path -> the number of bytes after which the connection is dropped, to emulate an interrupted download
+        self.break_after={}
+        server=self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version='HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                content, etag=server.files[self.path]
+                server.requests.append(dict(self.headers))
+                match=re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+                if match and self.headers.get('If-Range') in (None, etag):
+                    start=int(match.group(1))+server.range_shift
+                    body=content[start:]
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{len(content)-1}/{len(content)}')
+                else:
+                    body=content
+                    self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.path in server.break_after:
+                    self.wfile.write(body[:server.break_after[self.path]])
+                    self.wfile.flush()
+                    self.close_connection=True
+                    return
+                self.wfile.write(body)
+
+        self.httpd=http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread=threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}{path}'
+
+    def set(self, path: str, content: bytes):
+        self.files[path]=(content, f'"{hashlib.sha1(content).hexdigest()}"')
+
+
+@pytest.fixture
+def server():
+    server=RangeServer()
+    server.thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+def make_partial(folder, file_name: str, content: bytes, validator: str = None):
+    partial_file_name=os.path.join(folder, file_name+transfer.partial_file_suffix)
+    with open(partial_file_name, 'wb') as file:
+        file.write(content)
+    transfer.save_validator(partial_file_name, validator)
+
+
+def download(server, folder, file_name: str) -> bytes:
+    digests=transfer.download_file(transfer.new_session(), server.url('/'+file_name), str(folder), ('sha256',))
+    with open(os.path.join(folder, file_name), 'rb') as file:
+        content=file.read()
+    assert digests['sha256']==hashlib.sha256(content).hexdigest()
+    assert not os.path.exists(os.path.join(folder, file_name+transfer.partial_file_suffix+transfer.validator_file_suffix))
+    return content
+
+
+def test_download_complete_file(server, tmp_path):
+    server.set('/a.bin', b'0123456789')
+    assert download(server, tmp_path, 'a.bin')==b'0123456789'
+    assert 'Range' not in server.requests[0]
+
+
+def test_resume_unchanged_file(server, tmp_path):
+    content=os.urandom(100000)
+    server.set('/a.bin', content)
+    make_partial(tmp_path, 'a.bin', content[:40000], server.files['/a.bin'][1])
+    assert download(server, tmp_path, 'a.bin')==content
+    assert server.requests[0]['Range']=='bytes=40000-'
+    assert server.requests[0]['If-Range']==server.files['/a.bin'][1]
+
+
+def test_restart_changed_file(server, tmp_path):
+    old=os.urandom(100000)
+    new=os.urandom(120000)
+    server.set('/a.bin', old)
+    validator=server.files['/a.bin'][1]
+    server.set('/a.bin', new)
+    make_partial(tmp_path, 'a.bin', old[:40000], validator)
+    assert download(server, tmp_path, 'a.bin')==new
+    assert len(server.requests)==1
+
+
+def test_restart_partial_without_validator(server, tmp_path):
+    content=os.urandom(50000)
+    server.set('/a.bin', content)
+    make_partial(tmp_path, 'a.bin', b'x'*1000)
+    assert download(server, tmp_path, 'a.bin')==content
+    assert 'Range' not in server.requests[0]
+
+
+def test_restart_unexpected_content_range(server, tmp_path):
+    content=os.urandom(50000)
+    server.set('/a.bin', content)
+    server.range_shift=10
+    make_partial(tmp_path, 'a.bin', content[:20000], server.files['/a.bin'][1])
+    assert download(server, tmp_path, 'a.bin')==content
+    assert len(server.requests)==2 and 'Range' not in server.requests[1]
+
+
+def test_interrupted_then_resumed(server, tmp_path):
+    content=os.urandom(100000)
+    server.set('/a.bin', content)
+    server.break_after['/a.bin']=30000
+    with pytest.raises(Exception):
+        download(server, tmp_path, 'a.bin')
+    partial_file_name=os.path.join(tmp_path, 'a.bin'+transfer.partial_file_suffix)
+    assert os.path.getsize(partial_file_name)==30000
+    assert transfer.load_validator(partial_file_name)==server.files['/a.bin'][1]
+
+    del server.break_after['/a.bin']
+    assert download(server, tmp_path, 'a.bin')==content
+    assert server.requests[1]['Range']=='bytes=30000-'
+
+
+def test_pool_with_one_file_failing(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer.settings, 'download_workers', 4)
+    contents={f'{i}.bin': os.urandom(50000+i) for i in range(6)}
+    for file_name, content in contents.items():
+        server.set('/'+file_name, content)
+    server.break_after['/3.bin']=20000
+    algorithms={file_name: ('sha256',) for file_name in contents}
+    with pytest.raises(Exception):
+        transfer.download_files(transfer.new_session(), server.url(''), str(tmp_path), list(contents), algorithms)
+    # the other files are complete, the failed one is left partial to be resumed
+    for file_name, content in contents.items():
+        if file_name!='3.bin':
+            assert (tmp_path/file_name).read_bytes()==content
+    assert not (tmp_path/'3.bin').exists()
+    assert os.path.getsize(tmp_path/('3.bin'+transfer.partial_file_suffix))==20000
+
+    del server.break_after['/3.bin']
+    server.requests.clear()
+    digests=transfer.download_files(transfer.new_session(), server.url(''), str(tmp_path), list(contents), algorithms)
+    for file_name, content in contents.items():
+        assert (tmp_path/file_name).read_bytes()==content
+        assert digests[file_name]['sha256']==hashlib.sha256(content).hexdigest()
+    assert [headers.get('Range') for headers in server.requests if headers.get('Range')]==['bytes=20000-']
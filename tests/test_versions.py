@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from concopilot.package import repo
+from concopilot.package.config import Settings, component_completion_flag
+from concopilot.util.config import versions
+
+
+def test_single_equal_is_exact():
+    assert versions.version_specifier('=1.0').select(['0.9', '1.0', '1.1'])=='1.0'
+
+
+def test_illegal_specifier_version():
+    with pytest.raises(ValueError, match='`abc`'):
+        versions.VersionSpecifier('==abc')
+
+
+def test_compare_with_non_version_string():
+    assert not versions.Version('1.0')=='latest'
+    assert versions.Version('1.0')!='latest'
+    assert versions.Version('1.0')=='1.0.0'
+    with pytest.raises(TypeError):
+        versions.Version('1.0')<'latest'
+
+
+def test_list_local_repo_versions_ignores_other_folders(tmp_path, monkeypatch):
+    monkeypatch.setattr(Settings(), 'local_repo_path', str(tmp_path))
+    artifact_folder=os.path.dirname(repo.get_config_folder(root=str(tmp_path), group_id='org.test', artifact_id='demo', version='_', instance_id=None))
+    for name in ('0.1.0', '0.2.0', 'tmp', '.cache'):
+        os.makedirs(os.path.join(artifact_folder, name))
+        open(os.path.join(artifact_folder, name, component_completion_flag), 'w').close()
+
+    local_versions=repo.list_local_repo_versions('org.test', 'demo')
+    assert sorted(local_versions)==['0.1.0', '0.2.0']
+    assert versions.version_specifier('>=0.1').select(local_versions)=='0.2.0'
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+from concopilot.package import warm
+from concopilot.util import ClassDict
+
+
+def test_preload_by_argv(tmp_path):
+    builds=[]
+
+    def build(param, *args):
+        builds.append(args)
+        return object()
+
+    server=warm.WarmServer(str(tmp_path/'warm.sock'), build_fn=build)
+    param=ClassDict(group_id='org.test', artifact_id='demo', version='0.1.0')
+    plain=server.preload(param)
+    assert server.preload(param, []) is plain
+    with_args=server.preload(param, ['--foo', 'a b'])
+    assert with_args is not plain
+    assert server.preload(param, ['--foo', 'a b']) is with_args
+    assert server.preload(param, ['--foo', 'a', 'b']) is not with_args
+    assert builds==[(), ('--foo', 'a b'), ('--foo', 'a', 'b')]
+
+
+def test_key_of_config_file(tmp_path):
+    param=ClassDict(config_file=str(tmp_path/'config.yaml'))
+    assert warm.get_key(param)==str(tmp_path/'config.yaml')
+    assert warm.get_key(param, ['--foo'])==f'{tmp_path/"config.yaml"} --foo'